@@ -0,0 +1,219 @@
+"""
+End-to-end benchmark of Algorithm.run on the alpaca backend, against the
+fake Alpaca server of pylivetrader.testing.fake_alpaca. The server runs
+in its own process with the given latency, jitter and rate limit, and
+serves the REST, market data and trade update endpoints.
+
+Each workload runs `--bars` minutes of a past session through
+Algorithm.run, with a clock that emits them without waiting:
+
+- history: data.history() of 30 minute bars on 500 symbols
+- current: data.current() prices of 100 symbols
+- rebalance: order_target_percent_batch() on 200 names
+- can_trade: data.can_trade() on every symbol
+
+For each workload, it reports the latency percentiles of the bars and the
+REST requests the server counted. The backend's order rate limit follows
+`--rate-limit`, so `--rate-limit 200` behaves like an Alpaca account.
+
+    python benchmarks/bench_alpaca_e2e.py [--bars 20] [--latency 0.02]
+        [--jitter 0.005] [--rate-limit 200] [--workload history ...]
+"""
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from unittest import mock
+from urllib.request import Request, urlopen
+
+import numpy as np
+import pandas as pd
+from logbook import NullHandler
+from trading_calendars import get_calendar
+
+from pylivetrader.algorithm import Algorithm
+from pylivetrader.executor import executor
+from pylivetrader.executor.realtimeclock import BAR, SESSION_START
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SESSION = pd.Timestamp('2021-03-09', tz='UTC')
+
+
+def symbols(context, n):
+    return [context.symbol('S{:04d}'.format(i)) for i in range(n)]
+
+
+class History:
+
+    def initialize(context):
+        context.assets = symbols(context, 500)
+
+    def handle_data(context, data):
+        data.history(context.assets, 'close', 30, '1m')
+
+
+class Current:
+
+    def initialize(context):
+        context.assets = symbols(context, 100)
+
+    def handle_data(context, data):
+        data.current(context.assets, 'price')
+
+
+class Rebalance:
+
+    def initialize(context):
+        context.assets = symbols(context, 200)
+
+    def handle_data(context, data):
+        context.order_target_percent_batch(
+            pd.Series(0.9 / len(context.assets), index=context.assets))
+
+
+class CanTrade:
+
+    def initialize(context):
+        context.assets = symbols(context, context.universe)
+
+    def handle_data(context, data):
+        data.can_trade(context.assets)
+
+
+WORKLOADS = {
+    'history': History,
+    'current': Current,
+    'rebalance': Rebalance,
+    'can_trade': CanTrade,
+}
+
+
+class BenchClock:
+    '''Emits `bars` minutes of SESSION from 10:00 ET without waiting, and
+    keeps how long each bar took.'''
+
+    def __init__(self, bars):
+        self.calendar = get_calendar('NYSE')
+        self.bars = bars
+        self.latencies = []
+
+    def session_minutes(self, session):
+        return self.calendar.minutes_for_session(session)[:-1]
+
+    def __iter__(self):
+        yield SESSION, SESSION_START
+        for dt in self.session_minutes(SESSION)[30:30 + self.bars]:
+            started = time.perf_counter()
+            yield dt, BAR
+            self.latencies.append(time.perf_counter() - started)
+
+
+def start_server(args):
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    command = [
+        sys.executable, '-m', 'pylivetrader.testing.fake_alpaca',
+        '--symbols', str(args.symbols),
+        '--latency', str(args.latency),
+        '--jitter', str(args.jitter),
+        '--seed', '0',
+    ]
+    if args.rate_limit:
+        command += ['--rate-limit', str(args.rate_limit),
+                    '--data-rate-limit', str(args.rate_limit)]
+    server = subprocess.Popen(command, stdout=subprocess.PIPE, env=env,
+                              universal_newlines=True)
+    return server, server.stdout.readline().strip()
+
+
+def server_stats(url, reset=False):
+    if reset:
+        urlopen(Request(url + '/_reset', method='POST')).close()
+        return None
+    with urlopen(url + '/_stats') as resp:
+        return json.loads(resp.read().decode())
+
+
+def run_workload(name, url, args, statefile):
+    workload = WORKLOADS[name]
+    clock = BenchClock(args.bars)
+    server_stats(url, reset=True)
+
+    def initialize(context):
+        context.universe = args.symbols
+        workload.initialize(context)
+
+    algo = Algorithm(
+        initialize=initialize,
+        handle_data=workload.handle_data,
+        backend='alpaca',
+        backend_options=dict(
+            key_id='key-id', secret='secret-key', base_url=url,
+            order_rate_limit=args.rate_limit or 10 ** 6,
+        ),
+        statefile=statefile,
+        log_level='WARNING',
+    )
+    with mock.patch.object(executor, 'RealtimeClock',
+                           lambda *args, **kwargs: clock):
+        algo.run(retry=False)
+    return clock.latencies, server_stats(url)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workload', nargs='*', choices=sorted(WORKLOADS),
+                        default=['history', 'current', 'rebalance',
+                                 'can_trade'])
+    parser.add_argument('--bars', type=int, default=20)
+    parser.add_argument('--symbols', type=int, default=1000)
+    parser.add_argument('--latency', type=float, default=0.02,
+                        help='mean seconds before a REST answer')
+    parser.add_argument('--jitter', type=float, default=0.005,
+                        help='standard deviation of the latency')
+    parser.add_argument('--rate-limit', type=int, default=None,
+                        help='REST requests per minute, per API')
+    args = parser.parse_args()
+
+    # the trade update streams reconnect noisily once the server stops
+    logging.getLogger('alpaca_trade_api').setLevel(logging.CRITICAL)
+    server, url = start_server(args)
+    os.environ.update({
+        'APCA_API_DATA_URL': url,
+        'APCA_API_STREAM_URL': url,
+    })
+    print('fake server at {}, latency {}s +/- {}s, rate limit {}'.format(
+        url, args.latency, args.jitter, args.rate_limit or 'none'))
+    print('{:<10} {:>5} {:>9} {:>9} {:>9} {:>9} {:>13}'.format(
+        'workload', 'bars', 'p50 ms', 'p90 ms', 'p99 ms', 'max ms',
+        'requests/bar'))
+
+    try:
+        with NullHandler(), tempfile.TemporaryDirectory() as tmp:
+            for name in args.workload:
+                latencies, stats = run_workload(
+                    name, url, args, os.path.join(tmp, name + '.pkl'))
+                p50, p90, p99 = np.percentile(latencies, [50, 90, 99]) * 1e3
+                requests = stats['requests']
+                print('{:<10} {:>5} {:>9.1f} {:>9.1f} {:>9.1f} {:>9.1f} '
+                      '{:>13.1f}'.format(
+                          name, len(latencies), p50, p90, p99,
+                          max(latencies) * 1e3,
+                          sum(requests.values()) / len(latencies)))
+                for route, count in sorted(requests.items(),
+                                           key=lambda item: -item[1]):
+                    limited = stats['rate_limited'].get(route)
+                    print('  {:<40} {:>6}{}'.format(
+                        route, count,
+                        '  ({} rate limited)'.format(limited)
+                        if limited else ''))
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == '__main__':
+    main()
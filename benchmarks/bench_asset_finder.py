@@ -0,0 +1,87 @@
+"""
+Micro-benchmark for symbol resolution in AssetFinder.
+
+Compares the indexed lookup tables against rebuilding the ownership map on
+every call (the previous behavior) on a synthetic universe.
+
+    python benchmarks/bench_asset_finder.py [--size 10000]
+"""
+import argparse
+import string
+import time
+
+from pylivetrader.assets import AssetFinder, Equity
+from pylivetrader.errors import SymbolNotFound
+from pylivetrader.misc.zipline_utils import split_delimited_symbol
+
+
+def _num_to_symbol(n):
+    buf = []
+    while n >= 0:
+        buf.append(string.ascii_uppercase[n % 26])
+        n = n // 26 - 1
+    return ''.join(reversed(buf))
+
+
+class SyntheticBackend:
+
+    def __init__(self, size):
+        self.equities = [
+            Equity('sid-{}'.format(i), 'NYSE', symbol=_num_to_symbol(i))
+            for i in range(size)
+        ]
+
+    def get_equities(self):
+        return self.equities
+
+
+class RebuildingAssetFinder(AssetFinder):
+    '''Rebuilds the ownership map on each lookup, as AssetFinder used to.'''
+
+    def _lookup_symbol_strict(self, symbol, as_of_date=None):
+        ownership_map = {
+            split_delimited_symbol(v.symbol): v
+            for v in self._asset_cache.values()
+        }
+        try:
+            return ownership_map[split_delimited_symbol(symbol)]
+        except KeyError:
+            raise SymbolNotFound(symbol=symbol)
+
+
+def measure(finder, symbols, min_duration):
+    finder.lookup_symbol(symbols[0])  # warm the caches
+
+    count = 0
+    start = time.perf_counter()
+    elapsed = 0
+    while elapsed < min_duration:
+        for symbol in symbols:
+            finder.lookup_symbol(symbol)
+        count += len(symbols)
+        elapsed = time.perf_counter() - start
+    return count / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size', type=int, default=10000)
+    parser.add_argument('--lookups', type=int, default=50)
+    parser.add_argument('--duration', type=float, default=1.0)
+    args = parser.parse_args()
+
+    backend = SyntheticBackend(args.size)
+    step = max(1, args.size // args.lookups)
+    symbols = [a.symbol for a in backend.equities[::step]]
+
+    before = measure(RebuildingAssetFinder(backend), symbols, args.duration)
+    after = measure(AssetFinder(backend), symbols, args.duration)
+
+    print('universe size: {}'.format(args.size))
+    print('rebuild per call: {:>14,.0f} lookups/sec'.format(before))
+    print('indexed:          {:>14,.0f} lookups/sec'.format(after))
+    print('speedup:          {:>14,.1f}x'.format(after / before))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+Counts backend calls and wall time per `BarData.current()` invocation
+against the smoke testing backend.
+
+The per-pair column is what `current()` used to cost: one
+`get_spot_value` call per (asset, field).
+
+    python benchmarks/bench_bardata_current.py [--assets 100]
+"""
+import argparse
+import time
+
+from pylivetrader.assets import AssetFinder
+from pylivetrader.data.bardata import BarData
+from pylivetrader.data.data_portal import DataPortal
+from pylivetrader.testing.smoke import backend, clock
+
+FIELDS = ['open', 'high', 'low', 'close', 'volume']
+
+
+def per_pair(data, assets, fields):
+    return {
+        (asset, field): data.current(asset, field)
+        for asset in assets for field in fields
+    }
+
+
+def batched(data, assets, fields):
+    return data.current(assets, fields)
+
+
+def measure(be, func, *args, repeat=5):
+    be.calls.clear()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func(*args)
+    elapsed = (time.perf_counter() - start) / repeat
+    return sum(be.calls.values()) / repeat, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--assets', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    fake_clock = clock.FaketimeClock()
+    be = backend.Backend(size=args.assets, clock=fake_clock)
+    finder = AssetFinder(be)
+    portal = DataPortal(be, finder, fake_clock.calendar, False)
+    data = BarData(portal, 'minute')
+    data.datetime = fake_clock.end_time
+
+    assets = finder.retrieve_all(finder.sids)
+    data.current(assets, FIELDS)  # populate the fake bars
+
+    print('{} assets x {} fields'.format(len(assets), len(FIELDS)))
+    print('{:<12}{:>14}{:>14}'.format('', 'calls/invoke', 'ms/invoke'))
+    for name, func in [('per pair', per_pair), ('batched', batched)]:
+        calls, elapsed = measure(
+            be, func, data, assets, FIELDS, repeat=args.repeat)
+        print('{:<12}{:>14.0f}{:>14.1f}'.format(name, calls, elapsed * 1e3))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""
+Compares the fetch executor modes of the Alpaca backend on
+`_fetch_bars_from_api`, against a local stub of the bars endpoint that
+answers every request after an injected latency.
+
+Each request carries up to 199 symbols, so 2000 symbols make 11 requests.
+The asyncio mode sends them as coroutines on the aiohttp data client.
+The first round of each mode is not timed, so process workers are already
+spawned.
+
+    python benchmarks/bench_fetch_executor.py [--symbols 2000] [--latency 0.2]
+"""
+import argparse
+import json
+import os
+import socketserver
+import time
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from threading import Thread
+from urllib.parse import urlparse, parse_qs
+
+import pandas as pd
+
+from pylivetrader.backend import alpaca
+
+MODES = ['thread', 'asyncio', 'process']
+
+
+class StubBarsHandler(BaseHTTPRequestHandler):
+
+    latency = 0.
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        query = parse_qs(urlparse(self.path).query)
+        symbols = query['symbols'][0].split(',')
+        bars = [{'t': '2021-03-0{}T05:00:00Z'.format(day),
+                 'o': 100, 'h': 101, 'l': 99, 'c': 100, 'v': 100,
+                 'n': 1, 'vw': 100} for day in range(1, 6)]
+        payload = json.dumps({
+            'bars': {symbol: bars for symbol in symbols},
+            'next_page_token': None,
+        }).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+class ThreadingHTTPServer(socketserver.ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+def fetch(backend, symbols):
+    return backend._fetch_bars_from_api(
+        symbols, 'day',
+        _from=pd.Timestamp('2021-03-01', tz='America/New_York'),
+        to=pd.Timestamp('2021-03-05', tz='America/New_York'),
+        limit=5,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--symbols', type=int, default=2000)
+    parser.add_argument('--latency', type=float, default=0.2)
+    parser.add_argument('--workers', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    StubBarsHandler.latency = args.latency
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubBarsHandler)
+    Thread(target=server.serve_forever, daemon=True).start()
+    # spawned process workers read it from the environment as well
+    os.environ['APCA_API_DATA_URL'] = 'http://127.0.0.1:{}'.format(
+        server.server_port)
+
+    symbols = ['S{}'.format(i) for i in range(args.symbols)]
+    requests = -(-len(symbols) // alpaca.ALPACA_MAX_SYMBOLS_PER_REQUEST)
+    print('{} symbols, {} requests, {:.0f}ms latency, {} workers'.format(
+        len(symbols), requests, args.latency * 1000, args.workers))
+    print('{:<10}{:>14}'.format('mode', 'ms/fetch'))
+
+    for mode in MODES:
+        backend = alpaca.Backend('key-id', 'secret-key', 'http://127.0.0.1:1',
+                                 fetch_executor=mode,
+                                 fetch_workers=args.workers)
+        try:
+            df = fetch(backend, symbols)
+            assert len(df.columns.levels[0]) == len(symbols)
+
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                fetch(backend, symbols)
+            elapsed = (time.perf_counter() - start) / args.repeat
+        finally:
+            backend.close()
+        print('{:<10}{:>14.1f}'.format(mode, elapsed * 1000))
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
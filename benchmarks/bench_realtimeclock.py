@@ -0,0 +1,78 @@
+"""
+Measures how late `RealtimeClock` emits bars relative to the minute
+boundary, and how often it wakes up to do so.
+
+The clock runs on the real NYSE calendar with a time skew that puts the
+broker clock just before a session open. Its wall clock is sped up
+`--speed` times, so a minute passes in 60 / speed seconds; latencies are
+converted back to real seconds, which is what the sleep overshoot is
+measured in.
+
+    python benchmarks/bench_realtimeclock.py [--bars 60] [--speed 60]
+"""
+import argparse
+import datetime
+import time
+from itertools import islice
+
+import numpy as np
+import pandas as pd
+from trading_calendars import get_calendar
+
+from pylivetrader.executor.realtimeclock import RealtimeClock, BAR
+
+
+class ScaledTime:
+
+    def __init__(self, speed):
+        self.speed = speed
+        self.origin = time.time()
+        self.wakeups = 0
+
+    def time(self):
+        return self.origin + (time.time() - self.origin) * self.speed
+
+    def sleep(self, seconds):
+        self.wakeups += 1
+        time.sleep(seconds / self.speed)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--bars', type=int, default=60)
+    parser.add_argument('--speed', type=float, default=60.)
+    args = parser.parse_args()
+
+    cal = get_calendar('NYSE')
+    session = cal.all_sessions[-30]
+    scaled = ScaledTime(args.speed)
+    # start 2 seconds (broker time) before the first bar
+    skew = (cal.session_open(session) - pd.Timedelta('2s') -
+            pd.Timestamp(scaled.time(), unit='s', tz='UTC'))
+
+    clock = RealtimeClock(
+        cal,
+        (datetime.time(8, 45), 'America/New_York'),
+        minute_emission=False,
+        time_skew=skew,
+        wall_time=scaled.time,
+        sleep=scaled.sleep,
+    )
+
+    latencies = []
+    events = iter(clock)
+    for dt, action in islice(events, 2 + args.bars):
+        if action == BAR:
+            broker_now = scaled.time() + skew.value / 1e9
+            latencies.append((broker_now - dt.value / 1e9) / args.speed)
+
+    ms = np.array(latencies) * 1e3
+    print('bars:        {}'.format(len(ms)))
+    print('latency ms:  mean {:.3f}  p50 {:.3f}  p99 {:.3f}  max {:.3f}'
+          .format(ms.mean(), np.percentile(ms, 50), np.percentile(ms, 99),
+                  ms.max()))
+    print('wakeups/bar: {:.2f}'.format(scaled.wakeups / len(ms)))
+
+
+if __name__ == '__main__':
+    main()
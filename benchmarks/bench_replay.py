@@ -0,0 +1,80 @@
+"""
+Measures how many bars per second the replay engine simulates.
+
+Random-walk minute bars for `--symbols` symbols over `--months` months
+are generated in memory. Two algorithms are replayed on them: one that
+rebalances once a day from a scheduled function, whose idle bars are
+skipped, and one with a handle_data that runs every bar.
+
+    python benchmarks/bench_replay.py [--symbols 10] [--months 6]
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+from logbook import NullHandler
+from trading_calendars import get_calendar
+
+from pylivetrader.api import date_rules, time_rules
+from pylivetrader.testing.replay import run_replay
+
+
+def make_frames(n, start, end, seed=0):
+    cal = get_calendar('NYSE')
+    sessions = cal.sessions_in_range(
+        pd.Timestamp(start, tz='UTC'), pd.Timestamp(end, tz='UTC'))
+    minutes = cal.minutes_for_sessions_in_range(sessions[0], sessions[-1])
+    rng = np.random.RandomState(seed)
+    frames = {}
+    for i in range(n):
+        close = 100 * np.exp(np.cumsum(
+            rng.normal(0, 0.001, len(minutes))))
+        frames['S{}'.format(i)] = pd.DataFrame({
+            'open': close, 'high': close * 1.001, 'low': close * 0.999,
+            'close': close, 'volume': 1000.,
+        }, index=minutes)
+    return frames
+
+
+class DailyRebalance:
+
+    def initialize(context):
+        context.schedule_function(
+            DailyRebalance.rebalance, date_rules.every_day(),
+            time_rules.market_open(minutes=30))
+
+    def rebalance(context, data):
+        assets = [context.symbol(s) for s in ('S0', 'S1')]
+        for asset in assets:
+            context.order_target_percent(asset, 0.4)
+
+
+class EveryBar:
+
+    def handle_data(context, data):
+        context.bars = getattr(context, 'bars', 0) + 1
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--symbols', type=int, default=10)
+    parser.add_argument('--months', type=int, default=6)
+    args = parser.parse_args()
+
+    start = pd.Timestamp('2021-01-04')
+    end = start + pd.DateOffset(months=args.months)
+    frames = make_frames(args.symbols, start, end)
+
+    with NullHandler():
+        for name, algo in [('daily rebalance', DailyRebalance),
+                           ('handle_data', EveryBar)]:
+            result = run_replay(algo, frames, start, end)
+            stats = result.stats()
+            print('{:<16} {:>8} bars in {:6.2f}s  {:>10,.0f} bars/s  '
+                  'return {:.2%}'.format(
+                      name, stats['bars'], stats['seconds'],
+                      stats['bars_per_second'], stats['total_return']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+Measures the cost of the scheduled function dispatch per bar, with the
+rules asked on every bar and with the session schedule compiled into a
+lookup table (`EventManager.compile_session`).
+
+200 functions with a mix of date and time rules run over a year of NYSE
+sessions. Asking every rule on every bar is slow enough that it only runs
+on the first `--check-sessions` sessions, where both must fire the same
+callbacks at the same minutes.
+
+    python benchmarks/bench_schedule.py [--functions 200] [--sessions 252]
+"""
+import argparse
+import time
+
+import pandas as pd
+from trading_calendars import get_calendar
+
+from pylivetrader.misc.events import (
+    Event, EventManager, date_rules, make_eventrule, time_rules,
+)
+
+
+def make_rule(i, cal):
+    date_rule = [
+        date_rules.every_day,
+        lambda: date_rules.week_start(days_offset=i % 3),
+        lambda: date_rules.week_end(days_offset=i % 2),
+        lambda: date_rules.month_start(days_offset=i % 5),
+        lambda: date_rules.month_end(days_offset=i % 4),
+    ][i % 5]()
+    time_rule = [
+        lambda: time_rules.market_open(minutes=1 + i % 120),
+        lambda: time_rules.market_close(minutes=i % 60),
+        time_rules.every_minute,
+    ][i % 3]()
+    return make_eventrule(date_rule, time_rule, cal, half_days=i % 7 != 0)
+
+
+def make_manager(n, cal, fired):
+    manager = EventManager()
+    for i in range(n):
+        def callback(context, data, i=i):
+            fired.append((i, data))
+        manager.add_event(Event(make_rule(i, cal), callback))
+    return manager
+
+
+def run(manager, cal, sessions, compiled):
+    bars = idle = 0
+    started = time.perf_counter()
+    for session in sessions:
+        minutes = cal.minutes_for_session(session)[:-1]
+        if compiled:
+            manager.compile_session(minutes)
+        for dt in minutes:
+            bars += 1
+            if compiled and not manager.has_due_events(dt):
+                idle += 1
+            manager.handle_data(None, dt, dt)
+    return time.perf_counter() - started, bars, idle
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--functions', type=int, default=200)
+    parser.add_argument('--sessions', type=int, default=252)
+    parser.add_argument('--check-sessions', type=int, default=5)
+    args = parser.parse_args()
+
+    cal = get_calendar('NYSE')
+    end = cal.all_sessions.searchsorted(pd.Timestamp('2021-12-31', tz='UTC'))
+    sessions = cal.all_sessions[end - args.sessions:end]
+    checked = sessions[:args.check_sessions]
+
+    expected, fired = [], []
+    elapsed, bars, _ = run(
+        make_manager(args.functions, cal, expected), cal, checked, False)
+    run(make_manager(args.functions, cal, fired), cal, checked, True)
+    assert fired == expected, 'the compiled schedule fired differently'
+    print('every rule, every bar:  {:8.1f}us/bar  ({} bars)'.format(
+        elapsed / bars * 1e6, bars))
+
+    fired = []
+    elapsed, bars, idle = run(
+        make_manager(args.functions, cal, fired), cal, sessions, True)
+    print('compiled schedule:      {:8.1f}us/bar  ({} bars, compile '
+          'included)'.format(elapsed / bars * 1e6, bars))
+    print('idle bars:              {:8.1%}'.format(idle / bars))
+    print('callbacks fired:        {:8d}'.format(len(fired)))
+
+
+if __name__ == '__main__':
+    main()
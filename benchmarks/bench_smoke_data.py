@@ -0,0 +1,55 @@
+"""
+Measures the smoke FakeDataBackend at realistic universe sizes.
+
+The minute bars of `--assets` assets are generated once, then the
+current prices of the whole universe and the history of a 500 asset
+slice are read as a strategy would on every bar.
+
+    python benchmarks/bench_smoke_data.py [--assets 3000] [--mmap DIR]
+"""
+import argparse
+import time
+
+import pandas as pd
+
+from pylivetrader.testing.smoke.backend import FakeDataBackend
+
+
+class Clock:
+
+    now = pd.Timestamp('2021-03-09 15:00', tz='America/New_York')
+    end_time = pd.Timestamp('2021-03-09 21:00', tz='UTC')
+
+
+def timeit(name, f, n):
+    started = time.perf_counter()
+    for _ in range(n):
+        f()
+    elapsed = (time.perf_counter() - started) / n
+    print('{:<28} {:>10.1f} us'.format(name, elapsed * 1e6))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--assets', type=int, default=3000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--mmap', default=None,
+                        help='directory to memory-map the bars in')
+    args = parser.parse_args()
+
+    data = FakeDataBackend(size=args.assets, clock=Clock(), seed=args.seed,
+                           mmap_dir=args.mmap)
+    assets = data.get_equities()
+    timeit('generate minute bars', lambda: data._populate('1m'), 1)
+    timeit('spot price, all assets',
+           lambda: data.get_spot_value(assets, 'price', None, '1m'), 1000)
+    timeit('bars_view 500 x 390',
+           lambda: data.bars_view(assets[:500], '1m', 390), 1000)
+    timeit('get_bars 1 asset x 390',
+           lambda: data.get_bars([assets[0]], '1m', 390), 100)
+    timeit('get_bars 500 assets x 390',
+           lambda: data.get_bars(assets[:500], '1m', 390), 3)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+Times FileStore save and load of a context of about 50MB (a float
+DataFrame, an int array and a dict of small objects) for each available
+serializer, with atomic and in-place writes.
+
+The last row keeps the DataFrame and the array in memory mapped .npy
+files (`mmap_threshold`) and goes through StateStore, as on a restart.
+
+Serializers whose modules are not installed (pickle protocol 5 before
+python 3.8 without pickle5, zstandard, lz4) are skipped.
+
+    python benchmarks/bench_statestore.py [--mb 50] [--repeat 3]
+"""
+import argparse
+import os
+import tempfile
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+
+from pylivetrader.statestore import CHECKSUM_KEY, FileStore, StateStore
+from pylivetrader.statestore.serializers import PickleSerializer
+
+
+def make_state(mb):
+    rows = int(mb * 2 ** 20 * 0.8 / 8 / 100)
+    return {
+        'prices': pd.DataFrame(
+            np.random.randn(rows, 100),
+            index=pd.date_range('2021-01-01', periods=rows, freq='min')),
+        'counts': np.random.randint(0, 1000, int(mb * 2 ** 20 * 0.2 / 8)),
+        'orders': {'order-{}'.format(i): ('AAPL', i, 'open')
+                   for i in range(1000)},
+        CHECKSUM_KEY: 'bench',
+    }
+
+
+def candidates():
+    for protocol in (3, 4, 5):
+        for compression in (None, 'lz4', 'zstd'):
+            try:
+                serializer = PickleSerializer(protocol, compression)
+            except ValueError:
+                continue
+            yield 'protocol {} {}'.format(protocol, compression or ''), \
+                serializer
+
+
+def best_of(repeat, func):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--mb', type=float, default=50)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    state = make_state(args.mb)
+    print('{:<20} {:>7} {:>10} {:>10} {:>10}'.format(
+        'serializer', 'MB', 'save', 'atomic', 'load'))
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench-state.pkl')
+        for name, serializer in candidates():
+            in_place = FileStore(path, serializer=serializer, atomic=False)
+            atomic = FileStore(path, serializer=serializer)
+            save = best_of(args.repeat, lambda: in_place.save(state))
+            save_atomic = best_of(args.repeat, lambda: atomic.save(state))
+            load = best_of(args.repeat, atomic.load)
+            print('{:<20} {:>7.1f} {:>9.3f}s {:>9.3f}s {:>9.3f}s'.format(
+                name, os.path.getsize(path) / 2 ** 20,
+                save, save_atomic, load))
+
+        # new StateStores, so that every save is a full snapshot
+        engine = FileStore(path, mmap_threshold=2 ** 20)
+        context = SimpleNamespace(**{
+            k: v for k, v in state.items() if k != CHECKSUM_KEY})
+        save = best_of(args.repeat, lambda: StateStore(
+            storage_engine=engine).save(context, 'bench', []))
+        load = best_of(args.repeat, lambda: StateStore(
+            storage_engine=engine).load(SimpleNamespace(), 'bench'))
+        print('{:<20} {:>7.1f} {:>10} {:>9.3f}s {:>9.3f}s'.format(
+            'mmap arrays', os.path.getsize(path) / 2 ** 20, '', save, load))
+
+
+if __name__ == '__main__':
+    main()
@@ -96,6 +96,40 @@ def run_parameters(f):
             default='file',
             show_default=True,
             help='The storage engine to use to persist context.'),
+        click.option(
+            '--state-write-behind',
+            is_flag=True,
+            default=False,
+            help='Persist context on a background thread.'),
+        click.option(
+            '--state-compression',
+            type=click.Choice({'zstd', 'lz4'}),
+            default=None,
+            help='Compress the persisted context.'),
+        click.option(
+            '--state-mmap-threshold',
+            type=int,
+            default=None,
+            help=('Size in bytes from which ndarray and DataFrame context '
+                  'fields are persisted to memory mapped files.')),
+        click.option(
+            '--state-fencing',
+            is_flag=True,
+            default=False,
+            help=('With redis, stop persisting context once another '
+                  'instance of the algorithm started.')),
+        click.option(
+            '--metrics-sink',
+            multiple=True,
+            help=('Where to report the order latency spans: memory, '
+                  'statsd://host:port or prometheus://addr:port. '
+                  'Can be given more than once.')),
+        click.option(
+            '--profile-bars',
+            is_flag=True,
+            default=False,
+            help=('Time the stages and scheduled functions of each bar. '
+                  'The report is logged on exit and on SIGUSR1.')),
         click.option(
             '-q', '--quantopian-compatible',
             default=True,
@@ -172,6 +206,12 @@ def process_algo_params(
         log_level,
         timezone,
         storage_engine,
+        state_write_behind,
+        state_compression,
+        state_mmap_threshold,
+        state_fencing,
+        metrics_sink,
+        profile_bars,
         quantopian_compatible):
     if len(algofile) > 0:
         algofile = algofile[0]
@@ -201,6 +241,12 @@ def process_algo_params(
         statefile=statefile,
         log_level=log_level,
         storage_engine=storage_engine,
+        state_write_behind=state_write_behind,
+        state_compression=state_compression,
+        state_mmap_threshold=state_mmap_threshold,
+        state_fencing=state_fencing,
+        metrics_sinks=list(metrics_sink),
+        profile_bars=profile_bars,
         quantopian_compatible=quantopian_compatible,
         **functions,
     )
@@ -290,6 +336,64 @@ def shell(ctx, **kwargs):
         start_shell(algorithm, algomodule)
 
 
+@click.command(help="Replay an algorithm over historical minute bars")
+@click.option(
+    '-f', '--file',
+    required=True,
+    type=click.Path(
+        exists=True, file_okay=True, dir_okay=False,
+        readable=True, resolve_path=True),
+    help='Path to the file that contains algorithm to replay.')
+@click.option(
+    '--bars',
+    required=True,
+    type=click.Path(exists=True, resolve_path=True),
+    help=('Directory of <SYMBOL>.csv or .parquet minute bar files, or '
+          'a single file with a symbol column.'))
+@click.option('--start', required=True, help='First session to replay.')
+@click.option('--end', required=True, help='Last session to replay.')
+@click.option(
+    '--capital',
+    type=float,
+    default=1e6,
+    show_default=True,
+    help='Starting cash.')
+@click.option(
+    '--bar-label',
+    type=click.Choice(['start', 'end']),
+    default='start',
+    show_default=True,
+    help='Whether the bar times are the start (as Alpaca) or the end of '
+         'their minute.')
+@click.option(
+    '-o', '--output',
+    type=click.Path(dir_okay=False, writable=True),
+    default=None,
+    help='CSV file to write the daily portfolio values to.')
+@click.option(
+    '-l', '--log-level',
+    type=click.Choice({'DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'}),
+    default='WARNING',
+    show_default=True,
+    help='The minimum level of log to be written.')
+def replay(file, bars, start, end, capital, bar_label, output, log_level):
+    from pylivetrader.testing.replay import load_bars, run_replay
+
+    algomodule = get_algomodule_by_path(file)
+    result = run_replay(
+        get_api_functions(algomodule),
+        load_bars(bars, label=bar_label),
+        start,
+        end,
+        capital=capital,
+        algoname=extract_filename(file),
+        log_level=log_level,
+    )
+    if output is not None:
+        result.daily.to_csv(output)
+    click.echo(result.report())
+
+
 @click.command()
 def version():
     from ._version import VERSION
@@ -354,6 +458,7 @@ def extract_filename(algofile):
 
 main.add_command(run)
 main.add_command(shell)
+main.add_command(replay)
 main.add_command(version)
 main.add_command(migrate)
 
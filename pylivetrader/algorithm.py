@@ -14,6 +14,8 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 import os
+import signal
+import threading
 import warnings
 import pytz
 import numpy as np
@@ -30,6 +32,7 @@ from pylivetrader.assets import AssetFinder, Asset
 from pylivetrader.data.bardata import handle_non_market_minutes
 from pylivetrader.data.data_portal import DataPortal
 from pylivetrader.executor.executor import AlgorithmExecutor
+from pylivetrader.executor.profiler import BarProfiler
 from pylivetrader.errors import (
     APINotSupported, CannotOrderDelistedAsset, UnsupportedOrderParameters,
     ScheduleFunctionInvalidCalendar, OrderDuringInitialize,
@@ -54,6 +57,8 @@ from pylivetrader.finance.asset_restrictions import (
     SecurityListRestrictions,
 )
 
+from pylivetrader.misc.context_tricks import nop_context
+from pylivetrader.misc.functional import is_noop
 from pylivetrader.misc.security_list import SecurityList
 from pylivetrader.misc import events
 from pylivetrader.misc.events import (
@@ -65,7 +70,19 @@ from pylivetrader.misc.events import (
     AfterOpen,
     BeforeClose
 )
+from pylivetrader.misc.parallel_utils import (
+    ThreadPool,
+    get_shared_thread_pool,
+    set_shared_thread_pool,
+)
 from pylivetrader.misc.math_utils import round_if_near_integer, tolerant_equals
+from pylivetrader.misc.tracing import (
+    Tracer,
+    get_tracer,
+    make_sink,
+    set_tracer,
+    span,
+)
 from pylivetrader.misc.api_context import (
     api_method,
     LiveTraderAPI,
@@ -82,6 +99,7 @@ from pylivetrader.misc.input_validation import (
     optional,
 )
 from pylivetrader.statestore import StateStore, FileStore, RedisStore
+from pylivetrader.statestore.serializers import PickleSerializer
 
 from logbook import Logger, lookup_level
 
@@ -89,6 +107,30 @@ from logbook import Logger, lookup_level
 log = Logger('Algorithm')
 
 
+def _exit_on_signal(signum, frame):
+    raise SystemExit(128 + signum)
+
+
+class _BatchPrices(object):
+    '''
+    BarData stand-in for the trading controls of a batch order, answering
+    the prices already fetched for the batch.
+    '''
+
+    def __init__(self, current_data, prices):
+        self._current_data = current_data
+        self._prices = prices
+
+    def current(self, assets, fields):
+        if fields == 'price' and isinstance(assets, Asset) and \
+                assets in self._prices:
+            return self._prices[assets]
+        return self._current_data.current(assets, fields)
+
+    def __getattr__(self, name):
+        return getattr(self._current_data, name)
+
+
 class Algorithm(object):
     """Provides algorithm compatible with zipline.
     """
@@ -116,9 +158,26 @@ class Algorithm(object):
         before_trading_start: before_trading_start function
         log_level: 'DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'
         storage_engine: 'file', 'redis'
+        state_write_behind: True to save the context on a background
+                            thread, off the trading thread
+        state_compression: None, 'zstd' or 'lz4' to compress the saved
+                           context
+        state_mmap_threshold: size in bytes from which ndarray and
+                              DataFrame fields are saved to memory mapped
+                              files, None to pickle them with the rest
+        state_fencing: True to stop saving to redis once another instance
+                       of the algorithm started
         pipeline_hook: pipeline_output hook function to enable smoke like
                        functionality. it is not meant to be used by the
                        CLI
+        num_workers: size of the thread pool shared by the data fetches,
+                     defaults to PYLT_NUM_WORKERS or 10
+        metrics_sinks: list of sinks for the timing spans of the order
+                       path, as objects (see misc.tracing) or specs such
+                       as 'memory', 'statsd://host:8125' or
+                       'prometheus://:9100'. None to not time them
+        profile_bars: True to time the stages and scheduled functions of
+                      each bar, see executor.profiler
         '''
         log.level = lookup_level(kwargs.pop('log_level', 'INFO'))
         self._recorded_vars = {}
@@ -130,18 +189,47 @@ class Algorithm(object):
 
         self.quantopian_compatible = kwargs.pop('quantopian_compatible', True)
 
+        serializer = PickleSerializer(
+            compression=kwargs.pop('state_compression', None))
         storage_engine = kwargs.pop('storage_engine', 'file')
         if storage_engine == 'redis':
-            storage_engine = RedisStore()
+            storage_engine = RedisStore(
+                algoname=self._algoname,
+                serializer=serializer,
+                fencing=kwargs.pop('state_fencing', False),
+            )
         else:
             storage_engine = FileStore(
                 kwargs.pop('statefile', None) or
-                '{}-state.pkl'.format(self._algoname)
+                '{}-state.pkl'.format(self._algoname),
+                serializer=serializer,
+                mmap_threshold=kwargs.pop('state_mmap_threshold', None),
             )
-        self._state_store = StateStore(storage_engine=storage_engine)
+        self._state_store = StateStore(
+            storage_engine=storage_engine,
+            write_behind=kwargs.pop('state_write_behind', False),
+        )
 
         self._pipelines = {}
 
+        # one pool for the lifetime of the algorithm, shut down by run()
+        self._thread_pool = ThreadPool(
+            kwargs.pop('num_workers', None),
+            name='{}-worker'.format(self._algoname),
+        )
+        set_shared_thread_pool(self._thread_pool)
+
+        sinks = [
+            make_sink(sink) if isinstance(sink, str) else sink
+            for sink in kwargs.pop('metrics_sinks', None) or ()
+        ]
+        self._tracer = Tracer(sinks) if sinks else None
+        if self._tracer is not None:
+            set_tracer(self._tracer)
+
+        self._bar_profiler = BarProfiler() \
+            if kwargs.pop('profile_bars', False) else None
+
         backend_param = kwargs.pop('backend', 'alpaca')
         if not isinstance(backend_param, str):
             self._backend = backend_param
@@ -191,14 +279,17 @@ class Algorithm(object):
         self._before_trading_start = kwargs.pop('before_trading_start', noop)
         self._pipeline_hook = kwargs.get('pipeline_hook')
 
-        self.event_manager.add_event(
-            events.Event(
-                events.Always(),
-                # We pass handle_data.__func__ to get the unbound method.
-                self.handle_data.__func__,
-            ),
-            prepend=True,
-        )
+        # a noop handle_data is left out, so that the minutes without a
+        # scheduled function can be skipped by the executor
+        if not self.handle_data_is_noop:
+            self.event_manager.add_event(
+                events.Event(
+                    events.Always(),
+                    # We pass handle_data.__func__ to get the unbound method.
+                    self.handle_data.__func__,
+                ),
+                prepend=True,
+            )
 
         self._account_needs_update = True
         self._portfolio_needs_update = True
@@ -213,9 +304,10 @@ class Algorithm(object):
 
         self.initialized = False
 
-        self.api_methods = [func for func in dir(Algorithm) if callable(
-            getattr(Algorithm, func)
-        )]
+        # a set, as __setattr__ looks every assignment up in it
+        self.api_methods = frozenset(
+            func for func in dir(Algorithm)
+            if callable(getattr(Algorithm, func)))
 
     def initialize(self, *args, **kwargs):
         self._context_persistence_excludes = (
@@ -226,14 +318,26 @@ class Algorithm(object):
 
         with LiveTraderAPI(self):
             self._initialize(self, *args, **kwargs)
-            self._state_store.save(
-                self, self._algoname, self._context_persistence_excludes)
+            self._save_state()
 
         self.initialized = True
 
     def handle_data(self, data):
         if self._handle_data:
             self._handle_data(self, data)
+            if not self._state_store.write_behind:
+                # otherwise saved by the executor after the scheduled
+                # functions ran
+                self._save_state()
+
+    @property
+    def handle_data_is_noop(self):
+        return is_noop(self._handle_data)
+
+    def _save_state(self):
+        profiler = self._bar_profiler
+        with profiler.stage('state_save') if profiler is not None \
+                else nop_context:
             self._state_store.save(
                 self, self._algoname, self._context_persistence_excludes)
 
@@ -246,8 +350,7 @@ class Algorithm(object):
         with handle_non_market_minutes(data) if \
                 self.data_frequency == "minute" else ExitStack():
             self._before_trading_start(self, data)
-            self._state_store.save(
-                self, self._algoname, self._context_persistence_excludes)
+            self._save_state()
 
         self._in_before_trading_start = False
 
@@ -272,7 +375,41 @@ class Algorithm(object):
             self.data_portal,
         )
 
-        return self.executor.run(retry=retry)
+        main_thread = threading.current_thread() is threading.main_thread()
+        if self._state_store.write_behind and main_thread:
+            # unwind through the finally below, which writes the state
+            signal.signal(signal.SIGTERM, _exit_on_signal)
+        if self._bar_profiler is not None and main_thread:
+            signal.signal(signal.SIGUSR1, self._bar_profiler.log_report)
+
+        try:
+            return self.executor.run(retry=retry)
+        finally:
+            log.debug('state store metrics: {}'.format(
+                self._state_store.metrics()))
+            self._state_store.close()
+            self._backend.close()
+            self._shutdown_thread_pool()
+            self._shutdown_tracer()
+            if self._bar_profiler is not None:
+                self._bar_profiler.log_report()
+
+    def _shutdown_thread_pool(self):
+        log.debug('thread pool metrics: {}'.format(
+            self._thread_pool.metrics()))
+        if get_shared_thread_pool() is self._thread_pool:
+            set_shared_thread_pool(None)
+        self._thread_pool.shutdown()
+
+    def _shutdown_tracer(self):
+        if self._tracer is None:
+            return
+        self._tracer.log_summary()
+        if get_tracer() is self._tracer:
+            set_tracer(None)
+        for sink in self._tracer.sinks:
+            if hasattr(sink, 'close'):
+                sink.close()
 
     @api_method
     def get_environment(self, field='platform'):
@@ -303,26 +440,29 @@ class Algorithm(object):
             stop_price=None,
             style=None):
 
-        if not self._can_order_asset(asset):
-            return None
+        with span('order'):
+            with span('order.can_order_asset'):
+                if not self._can_order_asset(asset):
+                    return None
 
-        amount, style = self._calculate_order(
-            asset, amount, limit_price, stop_price, style)
+            amount, style = self._calculate_order(
+                asset, amount, limit_price, stop_price, style)
 
-        if amount == 0:
-            return None
+            if amount == 0:
+                return None
 
-        if amount > self._max_shares:
-            # Arbitrary limit of 100 billion (US) shares will never be
-            # exceeded except by a buggy algorithm.
-            raise OverflowError("Can't order more than %d shares" %
-                                self._max_shares)
+            if amount > self._max_shares:
+                # Arbitrary limit of 100 billion (US) shares will never be
+                # exceeded except by a buggy algorithm.
+                raise OverflowError("Can't order more than %d shares" %
+                                    self._max_shares)
 
-        o = self._backend.order(
-            asset, amount, style, self.quantopian_compatible
-        )
-        if o:
-            return o.id
+            with span('order.backend'):
+                o = self._backend.order(
+                    asset, amount, style, self.quantopian_compatible
+                )
+            if o:
+                return o.id
 
     @api_method
     def add_event(self, rule=None, callback=None):
@@ -624,6 +764,71 @@ class Algorithm(object):
                           stop_price=stop_price,
                           style=style)
 
+    @api_method
+    @disallowed_in_before_trading_start(OrderInBeforeTradingStart())
+    @expect_types(weights=pd.Series)
+    def order_target_percent_batch(
+            self,
+            weights,
+            limit_price=None,
+            stop_price=None,
+            style=None):
+        '''
+        order_target_percent() for many assets at once. The prices and the
+        portfolio are read once for all the assets, and the orders are
+        submitted together with the backend's batch_order().
+
+        weights: pd.Series of target percents indexed by Asset
+        return: dict of Asset -> order id, None for the assets which
+                were not ordered
+        '''
+        order_ids = dict.fromkeys(weights.index)
+
+        weights = weights[[
+            self._can_order_asset(asset) for asset in weights.index
+        ]].astype(float)
+        if weights.empty:
+            return order_ids
+        assets = list(weights.index)
+
+        prices = self._calculate_batch_prices(assets)
+        portfolio = self.portfolio
+        positions = portfolio.positions
+        current = np.array([
+            positions[asset].amount if asset in positions else 0
+            for asset in assets
+        ], dtype=float)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            target = weights.values * portfolio.portfolio_value / prices
+        # Price of 0 means we can't infer the value. Like
+        # order_target_percent(), the target is then no shares.
+        target = np.where(
+            np.isclose(prices, 0, atol=10e-7, rtol=10e-7), 0, target)
+        amounts = self.round_orders(target - current)
+
+        if (amounts > self._max_shares).any():
+            raise OverflowError("Can't order more than %d shares" %
+                                self._max_shares)
+
+        self.validate_order_params_batch(assets, amounts, prices,
+                                         limit_price, stop_price, style,
+                                         positions=current)
+        style = self.__convert_order_params_for_blotter(limit_price,
+                                                        stop_price,
+                                                        style)
+
+        order_args = [
+            (asset, int(amount), style, self.quantopian_compatible)
+            for asset, amount in zip(assets, amounts)
+            if amount
+        ]
+        orders = self._backend.batch_order(order_args)
+        for (asset, _, _, _), o in zip(order_args, orders):
+            if o:
+                order_ids[asset] = o.id
+        return order_ids
+
     @api_method
     @expect_types(share_counts=pd.Series)
     @expect_dtypes(share_counts=np.dtype('float64'))
@@ -726,11 +931,12 @@ class Algorithm(object):
         amount = self.round_order(amount)
 
         # Raises a ZiplineError if invalid parameters are detected.
-        self.validate_order_params(asset,
-                                   amount,
-                                   limit_price,
-                                   stop_price,
-                                   style)
+        with span('order.controls'):
+            self.validate_order_params(asset,
+                                       amount,
+                                       limit_price,
+                                       stop_price,
+                                       style)
 
         # Convert deprecated limit_price and stop_price parameters to use
         # ExecutionStyle objects.
@@ -774,6 +980,88 @@ class Algorithm(object):
                              self.get_datetime(),
                              self.executor.current_data)
 
+    def validate_order_params_batch(self,
+                                    assets,
+                                    amounts,
+                                    prices,
+                                    limit_price,
+                                    stop_price,
+                                    style,
+                                    positions=None):
+        """
+        validate_order_params() for a batch of orders. Each trading control
+        checks the whole batch at once with validate_batch(), given the
+        prices of the batch and one snapshot of the positions, and records
+        it only once no control failed it. Controls without
+        validate_batch() validate the orders one by one afterwards, as
+        their validate() records the orders it passes.
+
+        positions: share counts held in the assets, read from the
+                   portfolio if None
+        """
+        if not self.initialized:
+            raise OrderDuringInitialize(
+                msg="order() can only be called from within handle_data()"
+            )
+
+        if style:
+            if limit_price:
+                raise UnsupportedOrderParameters(
+                    msg="Passing both limit_price and style is not supported."
+                )
+
+            if stop_price:
+                raise UnsupportedOrderParameters(
+                    msg="Passing both stop_price and style is not supported."
+                )
+
+        if not self.trading_controls:
+            return
+
+        amounts = np.asarray(amounts)
+
+        ordered = np.flatnonzero(amounts)
+        assets = [assets[i] for i in ordered]
+        amounts = amounts[ordered].astype(np.int64)
+        prices = np.asarray(prices, dtype=float)[ordered]
+        if positions is None:
+            held = self.portfolio.positions
+            positions = np.array([
+                held[asset].amount if asset in held else 0
+                for asset in assets
+            ], dtype=np.int64)
+        else:
+            positions = np.asarray(positions)[ordered]
+
+        dt = self.get_datetime()
+        current_data = _BatchPrices(self.executor.current_data,
+                                    dict(zip(assets, prices)))
+
+        masks = []
+        for control in self.trading_controls:
+            try:
+                masks.append(control.validate_batch(
+                    assets, amounts, prices, positions, dt, current_data))
+            except NotImplementedError:
+                masks.append(None)
+
+        for control, mask in zip(self.trading_controls, masks):
+            if mask is not None and mask.any():
+                control.handle_violations(assets, amounts, mask, dt)
+
+        for control, mask in zip(self.trading_controls, masks):
+            if mask is None:
+                portfolio = self.portfolio
+                for asset, amount in zip(assets, amounts):
+                    control.validate(asset,
+                                     int(amount),
+                                     portfolio,
+                                     dt,
+                                     current_data)
+
+        for control in self.trading_controls:
+            control.record_batch(assets, amounts, dt)
+
     @staticmethod
     def round_order(amount):
         """
@@ -786,6 +1074,16 @@ class Algorithm(object):
         """
         return int(round_if_near_integer(amount))
 
+    @staticmethod
+    def round_orders(amounts):
+        """
+        round_order() for an array of share counts.
+        """
+        amounts = np.asarray(amounts, dtype=float)
+        rounded = np.round(amounts)
+        near = np.abs(amounts - rounded) <= 1e-4
+        return np.trunc(np.where(near, rounded, amounts)).astype(np.int64)
+
     @staticmethod
     def __convert_order_params_for_blotter(limit_price, stop_price, style):
         """
@@ -852,6 +1150,47 @@ class Algorithm(object):
 
         return value / last_price
 
+    def _calculate_batch_prices(self, assets):
+        """
+        _calculate_order_value_amount() checks for many assets.
+
+        return: np.ndarray of the last prices, in the order of assets
+        """
+        current_data = self.executor.current_data
+        tradable = current_data.can_trade(assets)
+        if not tradable.all():
+            asset = tradable.index[~tradable.values][0]
+            raise CannotOrderDelistedAsset(
+                msg="Cannot order {0}, as it not tradable".format(asset.symbol)
+            )
+
+        prices = current_data.current(assets, "price").values.astype(float)
+
+        retries = 0
+        missing = np.isnan(prices)
+        while missing.any() and retries < 3:
+            retry_assets = [a for a, m in zip(assets, missing) if m]
+            prices[missing] = current_data.current(
+                retry_assets, "price").values.astype(float)
+            missing = np.isnan(prices)
+            retries += 1
+        if missing.any():
+            asset = assets[int(np.argmax(missing))]
+            raise CannotOrderDelistedAsset(
+                msg="Cannot order {0} on {1} as there is no last "
+                    "price for the security.".format(asset.symbol,
+                                                     self.datetime)
+            )
+
+        for asset, zero in zip(
+                assets, np.isclose(prices, 0, atol=10e-7, rtol=10e-7)):
+            if zero:
+                log.debug("Price of 0 for {psid}; can't infer value".format(
+                    psid=asset
+                ))
+
+        return prices
+
     def _calculate_order_percent_amount(self, asset, percent):
         value = self.portfolio.portfolio_value * percent
         return self._calculate_order_value_amount(asset, value)
@@ -27,6 +27,7 @@ class AssetFinder:
 
     def clear_cache(self):
         del self.asset_cache
+        self._symbol_indexes = None
 
     @property
     def _asset_cache(self):
@@ -37,22 +38,56 @@ class AssetFinder:
             asset.sid: asset
             for asset in self.backend.get_equities()
         }
+        self._symbol_indexes = None
 
         return self.asset_cache
 
+    def _build_symbol_indexes(self):
+        """
+        Build the symbol lookup tables from the asset cache. They are kept
+        until the next `clear_cache()` so that each lookup is a single dict
+        access instead of a scan over the whole universe.
+
+        Returns
+        -------
+        indexes : tuple(dict, dict, dict)
+            (company symbol, share class symbol) -> Asset,
+            fuzzy symbol -> Asset and raw symbol -> Asset.
+        """
+        strict = {}
+        for asset in self._asset_cache.values():
+            strict[split_delimited_symbol(asset.symbol)] = asset
+
+        fuzzy = {}
+        for (cs, scs), asset in strict.items():
+            fuzzy[cs + scs] = asset
+
+        # resolve the raw symbols through the strict map so that a
+        # delimiter variant always yields the same asset as the split key.
+        raw = {
+            asset.symbol: strict[split_delimited_symbol(asset.symbol)]
+            for asset in self._asset_cache.values()
+        }
+
+        self._symbol_indexes = (strict, fuzzy, raw)
+        return self._symbol_indexes
+
+    @property
+    def _indexes(self):
+        # touch the asset cache first; refreshing it drops stale indexes.
+        self._asset_cache
+        indexes = getattr(self, '_symbol_indexes', None)
+        if indexes is None:
+            indexes = self._build_symbol_indexes()
+        return indexes
+
     @property
     def symbol_ownership_map(self):
-        return {
-            split_delimited_symbol(v.symbol): v
-            for k, v in self._asset_cache.items()
-        }
+        return self._indexes[0]
 
     @property
     def fuzzy_symbol_ownership_map(self):
-        m = {}
-        for (cs, scs), v in self.symbol_ownership_map.items():
-            m[cs + scs] = v
-        return m
+        return self._indexes[1]
 
     def retrieve_all(self, sids, default_none=False):
         """
@@ -150,11 +185,16 @@ class AssetFinder:
         return self._lookup_symbol_strict(symbol, as_of_date)
 
     def _lookup_symbol_strict(self, symbol, as_of_date=None):
+        strict, _, raw = self._indexes
+        asset = raw.get(symbol)
+        if asset is not None:
+            return asset
+
         # split the symbol into the components, if there are no
         # company/share class parts then share_class_symbol will be empty
         company_symbol, share_class_symbol = split_delimited_symbol(symbol)
         try:
-            return self.symbol_ownership_map[
+            return strict[
                 company_symbol,
                 share_class_symbol,
             ]
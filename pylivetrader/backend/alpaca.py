@@ -28,13 +28,24 @@ from trading_calendars.calendar_utils import (
     global_calendar_dispatcher as default_calendar,
 )
 from datetime import timedelta
+import time
 import uuid
 
 from .base import BaseBackend
+from .alpaca_async import (
+    ALPACA_RATE_LIMIT,
+    AsyncDataClient,
+    BlockingTokenBucket,
+)
+from .alpaca_stream import MarketDataStream
 
 from pylivetrader.api import symbol as symbol_lookup
 
-from pylivetrader.misc.api_context import set_context
+from pylivetrader.misc.api_context import (
+    LiveTraderAPI,
+    get_context,
+    set_context,
+)
 import pylivetrader.protocol as zp
 from pylivetrader.finance.order import (
     Order as ZPOrder,
@@ -46,9 +57,15 @@ from pylivetrader.finance.execution import (
     StopOrder,
     StopLimitOrder,
 )
+from pylivetrader.data.bar_store import StreamingBarStore
+from pylivetrader.finance.ledger import LedgerPosition, PositionLedger
 from pylivetrader.misc.pd_utils import normalize_date
-from pylivetrader.misc.parallel_utils import parallelize, \
-    parallelize_with_multi_process
+from pylivetrader.misc.parallel_utils import (
+    ThreadPool,
+    get_map_executor,
+    parallelize,
+)
+from pylivetrader.misc.tracing import span
 from pylivetrader.errors import SymbolNotFound
 from pylivetrader.assets import Equity
 
@@ -101,23 +118,110 @@ class Backend(BaseBackend):
         secret=None,
         base_url=None,
         api_version='v2',
-        feed='iex'
-
+        feed='iex',
+        tradability_refresh_interval=None,
+        fetch_executor='thread',
+        fetch_workers=None,
+        data_client='rest',
+        data_rate_limit=ALPACA_RATE_LIMIT,
+        stream_data=False,
+        position_ledger=False,
+        ledger_reconcile_interval=60,
+        order_workers=None,
+        order_rate_limit=ALPACA_RATE_LIMIT,
+        order_max_retries=3,
     ):
         self._key_id = key_id
         self._secret = secret
         self._base_url = base_url
         self._feed = feed
 
+        # how the bar requests of `_fetch_bars_from_api` are run concurrently
+        # ('thread', 'asyncio' or 'process'). 'asyncio' runs them as
+        # coroutines on the async data client below, as data_client='async'
+        # does.
+        if fetch_executor == 'process':
+            # the workers build their own backend once, instead of
+            # receiving this one (and its session) pickled with every call
+            self._fetch_executor = get_map_executor(
+                'process', fetch_workers,
+                initializer=_init_fetch_worker,
+                initargs=(dict(key_id=key_id, secret=secret,
+                               base_url=base_url, api_version=api_version,
+                               feed=feed),),
+            )
+            self._fetch_bars_func = _fetch_bars_in_worker
+        else:
+            self._fetch_executor = get_map_executor(
+                'thread' if fetch_executor == 'asyncio' else fetch_executor,
+                fetch_workers)
+            self._fetch_bars_func = self._fetch_bars_from_api_internal
+
+        # seconds between refreshes of the tradable asset snapshot. it is
+        # always refreshed on the first use of a new day.
+        self._tradability_refresh_interval = (
+            pd.Timedelta(seconds=tradability_refresh_interval)
+            if tradability_refresh_interval is not None else None
+        )
+        self._tradable_symbols = None
+        self._tradability_updated_at = None
+
         self._api = tradeapi.REST(
             key_id, secret, base_url, api_version=api_version
         )
+
+        # 'async' serves bars, latest trades and assets from an asyncio
+        # client with one pooled session and a rate limiter, 'rest' from
+        # the blocking REST client above
+        if data_client not in ('rest', 'async'):
+            raise ValueError(
+                "data_client must be 'rest' or 'async', not {!r}".format(
+                    data_client))
+        self._data = None
+        if data_client == 'async' or fetch_executor == 'asyncio':
+            data = AsyncDataClient(
+                key_id, secret, base_url,
+                max_concurrency=fetch_workers or 10,
+                rate_limit=data_rate_limit,
+            )
+            if data_client == 'async':
+                self._data = data
+        # the client the bars are requested with, None for the fetch
+        # executor
+        self._bars_data = data if fetch_executor == 'asyncio' else self._data
         self._cal = get_calendar('NYSE')
 
+        # minute bars and trades of the symbols asked for are streamed into
+        # memory and served from there while the stream is healthy
+        self._bar_store = None
+        self._data_stream = None
+        if stream_data:
+            self._bar_store = StreamingBarStore(self._cal)
+            self._data_stream = MarketDataStream(
+                self._bar_store, key_id, secret, feed=feed)
+
+        # positions and cash are kept from the trade update stream, and
+        # reconciled with REST every ledger_reconcile_interval seconds
+        self._ledger = PositionLedger() if position_ledger else None
+        self._ledger_reconcile_interval = pd.Timedelta(
+            seconds=ledger_reconcile_interval)
+
+        # batch_order() submits on up to order_workers threads, with the
+        # submissions held to order_rate_limit per minute
+        self._order_pool = ThreadPool(order_workers,
+                                      name='pylivetrader-order')
+        self._order_rate = BlockingTokenBucket(order_rate_limit)
+        self._order_max_retries = order_max_retries
+        self._order_retry_wait = 1.
+        self.last_batch_latencies = []
+
         self._open_orders = {}
         self._orders_pending_submission = {}
 
     def initialize_data(self, context):
+        if self._data_stream is not None:
+            self._data_stream.start()
+
         # Open a websocket stream to get updates in real time
         stream_process = Thread(
             target=self._get_stream, daemon=True, args=(context,)
@@ -132,32 +236,58 @@ class Backend(BaseBackend):
             else:
                 self._open_orders[k] = v
 
-    def _get_stream(self, context):
-        async def handle_trade_update(data):
-            # Check for any pending orders
-            waiting_order = self._orders_pending_submission.get(
-                data.order['client_order_id']
+    def close(self):
+        if self._data_stream is not None:
+            self._data_stream.stop()
+        if self._bars_data is not None:
+            self._bars_data.close()
+        if self._data is not None:
+            self._data.close()
+        self._fetch_executor.shutdown()
+        self._order_pool.shutdown()
+
+    def _on_trade_update(self, data):
+        if self._ledger is not None and \
+                data.event in ('fill', 'partial_fill'):
+            position_qty = getattr(data, 'position_qty', None)
+            self._ledger.on_fill(
+                data.order['symbol'],
+                data.order['side'],
+                int(float(data.qty)),
+                float(data.price),
+                pd.Timestamp(data.timestamp),
+                int(float(position_qty)) if position_qty is not None
+                else None,
             )
-            if waiting_order is not None:
-                if data.event == 'fill':
-                    # Submit the waiting order
-                    self.order(*waiting_order)
-                    self._orders_pending_submission.pop(
-                        data.order['client_order_id'], None
-                    )
-                elif data.event in ['canceled', 'rejected']:
-                    # Remove the waiting order
-                    self._orders_pending_submission.pop(
-                        data.order['client_order_id'], None
-                    )
 
-            if data.event in ['canceled', 'rejected', 'fill']:
-                self._open_orders.pop(data.order['client_order_id'], None)
-            else:
-                self._open_orders[data.order['client_order_id']] = (
-                    self._order2zp(Order(data.order))
+        # Check for any pending orders
+        waiting_order = self._orders_pending_submission.get(
+            data.order['client_order_id']
+        )
+        if waiting_order is not None:
+            if data.event == 'fill':
+                # Submit the waiting order
+                self.order(*waiting_order)
+                self._orders_pending_submission.pop(
+                    data.order['client_order_id'], None
+                )
+            elif data.event in ['canceled', 'rejected']:
+                # Remove the waiting order
+                self._orders_pending_submission.pop(
+                    data.order['client_order_id'], None
                 )
 
+        if data.event in ['canceled', 'rejected', 'fill']:
+            self._open_orders.pop(data.order['client_order_id'], None)
+        else:
+            self._open_orders[data.order['client_order_id']] = (
+                self._order2zp(Order(data.order))
+            )
+
+    def _get_stream(self, context):
+        async def handle_trade_update(data):
+            self._on_trade_update(data)
+
         set_context(context)
         asyncio.set_event_loop(asyncio.new_event_loop())
         conn = Stream(self._key_id,
@@ -172,6 +302,9 @@ class Backend(BaseBackend):
                 conn.run()
                 log.info("Connection reestablished")
             except Exception:
+                if self._ledger is not None:
+                    # fills may have been missed while disconnected
+                    self._ledger.invalidate()
                 from time import sleep
                 sleep(5)
                 asyncio.set_event_loop(asyncio.new_event_loop())
@@ -187,7 +320,8 @@ class Backend(BaseBackend):
     def get_equities(self):
         assets = []
         t = normalize_date(pd.Timestamp('now', tz=NY))
-        raw_assets = self._api.list_assets(asset_class='us_equity')
+        raw_assets = self._list_assets()
+        self._update_tradability(raw_assets)
         for raw_asset in raw_assets:
 
             asset = Equity(
@@ -229,8 +363,92 @@ class Backend(BaseBackend):
 
         return assets
 
+    def _list_assets(self):
+        if self._data is not None:
+            return self._data.run(
+                self._data.list_assets(asset_class='us_equity'))
+        return self._api.list_assets(asset_class='us_equity')
+
+    def _update_tradability(self, raw_assets):
+        self._tradable_symbols = pd.Index(
+            {raw_asset.symbol for raw_asset in raw_assets
+             if raw_asset.tradable})
+        self._tradability_updated_at = pd.Timestamp('now', tz=NY)
+
+    def _tradability_is_stale(self, now):
+        updated_at = self._tradability_updated_at
+        if updated_at is None or now.date() != updated_at.date():
+            return True
+        interval = self._tradability_refresh_interval
+        return interval is not None and now - updated_at >= interval
+
+    def get_tradability(self, assets):
+        """
+        Answers from the snapshot of the `list_assets` response that
+        `get_equities` downloads, refreshing it once a day or every
+        `tradability_refresh_interval` seconds.
+
+        return: np.ndarray[bool] in the same order as `assets`
+        """
+        if self._tradability_is_stale(pd.Timestamp('now', tz=NY)):
+            self._update_tradability(self._list_assets())
+        return pd.Index(
+            [asset.symbol for asset in assets]
+        ).isin(self._tradable_symbols)
+
+    def reconcile(self):
+        '''
+        Replaces the position ledger with the account and positions from
+        REST.
+        '''
+        account = self._api.get_account()
+        positions = self._api.list_positions()
+        now = pd.Timestamp('now', tz=NY)
+        self._ledger.reconcile(float(account.cash), [
+            LedgerPosition(
+                pos.symbol,
+                int(pos.qty),
+                float(pos.cost_basis) / float(pos.qty),
+                float(pos.current_price),
+                now,
+            ) for pos in positions
+        ], now)
+
+    def _get_ledger(self):
+        ledger = self._ledger
+        reconciled_at = ledger.reconciled_at
+        now = pd.Timestamp('now', tz=NY)
+        if reconciled_at is None or \
+                now - reconciled_at >= self._ledger_reconcile_interval:
+            self.reconcile()
+        if self._bar_store is not None:
+            for pos in ledger.positions():
+                trade = self._bar_store.last_trade(pos.symbol)
+                if trade is not None:
+                    ledger.on_trade(
+                        pos.symbol, float(trade.price), trade.timestamp)
+        return ledger
+
+    def _ledger_positions(self):
+        z_positions = zp.Positions()
+        for pos in self._get_ledger().positions():
+            try:
+                asset = symbol_lookup(pos.symbol)
+            except SymbolNotFound:
+                continue
+            z_position = zp.Position(asset)
+            z_position.amount = pos.amount
+            z_position.cost_basis = pos.cost_basis
+            z_position.last_sale_price = pos.last_sale_price
+            z_position.last_sale_date = pos.last_sale_date
+            z_positions[asset] = z_position
+        return z_positions
+
     @property
     def positions(self):
+        if self._ledger is not None:
+            return self._ledger_positions()
+
         z_positions = zp.Positions()
         positions = self._api.list_positions()
         position_map = {}
@@ -238,14 +456,15 @@ class Backend(BaseBackend):
         for pos in positions:
             symbol = pos.symbol
             try:
-                z_position = zp.Position(symbol_lookup(symbol))
+                asset = symbol_lookup(symbol)
             except SymbolNotFound:
                 continue
+            z_position = zp.Position(asset)
             z_position.amount = int(pos.qty)
             z_position.cost_basis = float(pos.cost_basis) / float(pos.qty)
             z_position.last_sale_price = None
             z_position.last_sale_date = None
-            z_positions[symbol_lookup(symbol)] = z_position
+            z_positions[asset] = z_position
             symbols.append(symbol)
             position_map[symbol] = z_position
 
@@ -262,6 +481,17 @@ class Backend(BaseBackend):
 
     @property
     def portfolio(self):
+        if self._ledger is not None:
+            z_portfolio = zp.Portfolio()
+            z_portfolio.positions = self._ledger_positions()
+            z_portfolio.cash = self._ledger.cash
+            z_portfolio.positions_value = sum(
+                pos.amount * pos.last_sale_price
+                for pos in z_portfolio.positions.values())
+            z_portfolio.portfolio_value = \
+                z_portfolio.cash + z_portfolio.positions_value
+            return z_portfolio
+
         account = self._api.get_account()
         z_portfolio = zp.Portfolio()
         z_portfolio.cash = float(account.cash)
@@ -300,30 +530,111 @@ class Backend(BaseBackend):
             zp_order.filled = int(order.filled_qty)
         return zp_order
 
+    def _submit_order(self, **params):
+        '''
+        submit_order() held to the order rate limit, and retried with
+        backoff when the broker answers 429 anyway.
+        '''
+        attempt = 0
+        while True:
+            with span('order.rate_limit'):
+                self._order_rate.acquire()
+            try:
+                with span('order.submit'):
+                    return self._api.submit_order(**params)
+            except (APIError, HTTPError) as e:
+                if isinstance(e, APIError):
+                    status_code = e.status_code
+                else:
+                    status_code = getattr(e.response, 'status_code', None)
+                if status_code != 429 or attempt >= self._order_max_retries:
+                    raise
+                wait = self._order_retry_wait * 2 ** attempt
+                log.warning(
+                    'order for symbol {} is rate limited, retrying in '
+                    '{}s'.format(params['symbol'], wait))
+                time.sleep(wait)
+                attempt += 1
+
+    def _position_amount(self, symbol):
+        if self._ledger is not None:
+            return self._get_ledger().amount(symbol)
+        try:
+            return int(self._api.get_position(symbol).qty)
+        except APIError as e:
+            if e.status_code == 404:
+                # no position
+                return 0
+            raise
+
     def _new_order_id(self):
         return uuid.uuid4().hex
 
     def batch_order(self, args):
-        return [self.order(*order) for order in args]
+        '''
+        Submits the orders concurrently. If an order raises, the exception
+        is raised once the other orders are submitted.
+
+        The submit latency of each order, in seconds, is kept in
+        `last_batch_latencies`, in the order of args.
+
+        return: list of the orders (None for the rejected ones), in the
+                order of args
+        '''
+        args = list(args)
+        if not args:
+            return []
+
+        algo = get_context()
+        latencies = [None] * len(args)
+        errors = [None] * len(args)
+
+        def submit(i, order_args):
+            started = time.monotonic()
+            try:
+                with LiveTraderAPI(algo):
+                    return self.order(*order_args)
+            except Exception as e:
+                # kept until all the orders are submitted
+                errors[i] = e
+            finally:
+                latencies[i] = time.monotonic() - started
+
+        started = time.monotonic()
+        orders = self._order_pool.map(submit, list(enumerate(args)))
+
+        self.last_batch_latencies = latencies
+        done = sorted(latencies)
+        log.info(
+            'submitted {} orders in {:.3f}s, submit latency '
+            'median {:.3f}s max {:.3f}s'.format(
+                len(args), time.monotonic() - started,
+                done[len(done) // 2], done[-1]))
+
+        for e in errors:
+            if e is not None:
+                raise e
+        return orders
 
     def order(self, asset, amount, style, quantopian_compatible=True):
         symbol = asset.symbol
         zp_order_id = self._new_order_id()
 
         if quantopian_compatible:
-            current_position = self.positions[asset]
+            with span('order.positions'):
+                current_amount = self._position_amount(symbol)
             if (
-                abs(amount) > abs(current_position.amount) and
-                amount * current_position.amount < 0
+                abs(amount) > abs(current_amount) and
+                amount * current_amount < 0
             ):
                 # The order would take us from a long position to a short
                 # position or vice versa and needs to be broken up
                 self._orders_pending_submission[zp_order_id] = (
                     asset,
-                    amount + current_position.amount,
+                    amount + current_amount,
                     style
                 )
-                amount = -1 * current_position.amount
+                amount = -1 * current_amount
 
         qty = amount if amount > 0 else -amount
 
@@ -353,7 +664,7 @@ class Backend(BaseBackend):
             )
         )
         try:
-            order = self._api.submit_order(
+            order = self._submit_order(
                 symbol=symbol,
                 qty=qty,
                 side=side,
@@ -446,6 +757,15 @@ class Backend(BaseBackend):
             return
 
     def get_last_traded_dt(self, asset):
+        if self._data_stream is not None:
+            self._data_stream.subscribe([asset.symbol])
+            trade = self._bar_store.last_trade(asset.symbol)
+            if trade is not None:
+                return trade.timestamp
+        if self._data is not None:
+            trade = self._get_symbols_last_trade_value(
+                [asset.symbol]).get(asset.symbol)
+            return trade.timestamp if trade is not None else pd.NaT
         trade = self._api.get_latest_trade(asset.symbol)
         return trade.timestamp
 
@@ -493,6 +813,30 @@ class Backend(BaseBackend):
         return in dict.
         symbols: list[str]
         """
+        if self._data_stream is not None:
+            self._data_stream.subscribe(symbols)
+            result = {}
+            for symbol in symbols:
+                trade = self._bar_store.last_trade(symbol)
+                if trade is not None:
+                    result[symbol] = trade
+            missing = [s for s in symbols if s not in result]
+            if missing:
+                result.update(self._get_symbols_last_trade_value_from_api(
+                    missing))
+            return result
+        return self._get_symbols_last_trade_value_from_api(symbols)
+
+    def _get_symbols_last_trade_value_from_api(self, symbols):
+        if self._data is not None:
+            # one request per chunk of symbols rather than per symbol
+            result = {}
+            for trades in self._data.run_all([
+                self._data.get_latest_trades(part)
+                for part in self._chunk_symbols(symbols)
+            ], skip_statuses=(404, 504)):
+                result.update(trades or {})
+            return result
 
         @skip_http_error((404, 504))
         def fetch(symbol):
@@ -501,9 +845,7 @@ class Backend(BaseBackend):
         return parallelize(fetch)(symbols)
 
     def _get_spot_bars(self, symbols, field):
-        symbol_bars = self._fetch_bars_from_api(symbols,
-                                                'minute',
-                                                limit=1)
+        symbol_bars = self._fetch_minute_bars(symbols, limit=1)
 
         def get_for_symbol(symbol_bars, symbol, field):
             bars = symbol_bars.get(symbol)
@@ -531,11 +873,11 @@ class Backend(BaseBackend):
         else:
             symbols = [asset.symbol for asset in assets]
 
-        df = self._fetch_bars_from_api(
-            symbols,
-            'day' if is_daily else 'minute',
-            to=end_dt,
-            limit=bar_count)
+        if is_daily:
+            df = self._fetch_bars_from_api(
+                symbols, 'day', to=end_dt, limit=bar_count)
+        else:
+            df = self._fetch_minute_bars(symbols, bar_count, end_dt)
 
         # change the index values to assets to compatible with zipline
         symbol_asset = {a.symbol: a for a in assets} if not assets_is_scalar \
@@ -549,6 +891,24 @@ class Backend(BaseBackend):
         #     pass
         return df
 
+    def _fetch_minute_bars(self, symbols, limit, end_dt=None):
+        """
+        Minute bars from the streamed bar store where it can serve them,
+        and from the API for the rest (which seeds the store).
+        """
+        if self._data_stream is None:
+            return self._fetch_bars_from_api(
+                symbols, 'minute', to=end_dt, limit=limit)
+
+        self._data_stream.subscribe(symbols)
+        df, missing = self._bar_store.get_bars(symbols, limit, end_dt)
+        if missing:
+            fetched = self._fetch_bars_from_api(
+                missing, 'minute', to=end_dt, limit=limit)
+            self._bar_store.seed(fetched, end_dt)
+            df = fetched if df is None else pd.concat([df, fetched], axis=1)
+        return df
+
     def _fetch_bars_from_api(
             self,
             symbols,
@@ -585,22 +945,40 @@ class Backend(BaseBackend):
 
         if not (_from and to):
             _from, to = self._get_from_and_to(size, limit, end_dt=to)
-        # alpaca support get real-time data of multi stocks(<200) at once
-        parts = []
-        for i in range(0, len(symbols), ALPACA_MAX_SYMBOLS_PER_REQUEST):
-            part = symbols[i:i + ALPACA_MAX_SYMBOLS_PER_REQUEST]
-            parts.append(part)
+        parts = self._chunk_symbols(symbols)
+        if self._bars_data is not None:
+            timeframe = TimeFrame.Minute if size == "minute" else TimeFrame.Day
+            responses = self._bars_data.run_all([
+                self._bars_data.get_bars(part,
+                                         timeframe=timeframe,
+                                         start=_from.isoformat(),
+                                         end=to.isoformat(),
+                                         adjustment='raw')
+                for part in parts
+            ], skip_statuses=(404, 504))
+            result = [
+                self._format_bars(bars, part, size, limit)
+                for part, bars in zip(parts, responses) if bars is not None
+            ]
+            return pd.concat(result, axis=1)
+
         args = [{'symbols': part,
                  '_from': _from,
                  "to": to,
                  "size": size,
                  "limit": limit} for part in parts]
-        # result2 = parallelize(self._fetch_bars_from_api_internal)(args)
-        result = parallelize_with_multi_process(
-            self._fetch_bars_from_api_internal)(args)
+        result = self._fetch_executor.map(self._fetch_bars_func, args)
 
         return pd.concat(result, axis=1)
 
+    @staticmethod
+    def _chunk_symbols(symbols):
+        # alpaca support get real-time data of multi stocks(<200) at once
+        return [
+            symbols[i:i + ALPACA_MAX_SYMBOLS_PER_REQUEST]
+            for i in range(0, len(symbols), ALPACA_MAX_SYMBOLS_PER_REQUEST)
+        ]
+
     def _get_from_and_to(self, size, limit, end_dt=None):
         """
         this method returns the trading time range. if end_dt is not
@@ -636,8 +1014,8 @@ class Backend(BaseBackend):
 
     def _fetch_bars_from_api_internal(self, params):
         """
-        this method is used by parallelize_with_multi_process or parallelize.
-        params: dict with keys in ['symbols', '_from', 'to', 'size']
+        this method is mapped on the fetch executor.
+        params: dict with keys in ['symbols', '_from', 'to', 'size', 'limit']
         """
         @skip_http_error((404, 504))
         def wrapper():
@@ -645,33 +1023,86 @@ class Backend(BaseBackend):
             _from = params['_from']
             to = params['to']
             size = params['size']
+            limit = params['limit']
+
+            if isinstance(symbols, str):
+                symbols = [symbols]
 
             timeframe = TimeFrame.Minute if size == "minute" else TimeFrame.Day
 
-            # Using V2 api to get the data. we cannot do 1 api call for all
-            # symbols because the v1 `limit` was per symbol, where v2 it's for
-            # overall response size; so we will iterate over each symbol with
-            # the limit for each to replicate that behaviour
-            r = {}
-            for sym in symbols:
-                r[sym] = self._api.get_bars(sym,
-                                            limit=params['limit'],
-                                            timeframe=timeframe,
-                                            start=_from.isoformat(),
-                                            end=to.isoformat(),
-                                            adjustment='raw').df
-            df = pd.concat(r, axis=1)
-            # data is received in UTC tz but without tz (naive)
-            df.index = df.index.tz_localize("UTC")
-
-            if size == 'minute':
-                df.index += pd.Timedelta('1min')
-
-                if not df.empty:
-                    # mask out bars outside market hours
-                    mask = self._cal.minutes_in_range(
-                        df.index[0], df.index[-1],
-                    ).tz_convert(NY)
-                    df = df.reindex(mask)
-            return df
+            # The v2 `limit` caps the overall response size rather than the
+            # bars per symbol, so we request the whole [_from, to] window for
+            # all symbols in one call (the client pages through it with
+            # next_page_token) and cap each symbol to its latest `limit` bars
+            # ourselves, like the v1 api used to.
+            bars = self._api.get_bars(symbols,
+                                      timeframe=timeframe,
+                                      start=_from.isoformat(),
+                                      end=to.isoformat(),
+                                      adjustment='raw').df
+            return self._format_bars(bars, symbols, size, limit)
         return wrapper()
+
+    def _format_bars(self, bars, symbols, size, limit):
+        df = self._split_bars_by_symbol(bars, symbols, limit)
+
+        if size == 'minute':
+            df.index += pd.Timedelta('1min')
+
+            if not df.empty:
+                # mask out bars outside market hours
+                mask = self._cal.minutes_in_range(
+                    df.index[0], df.index[-1],
+                ).tz_convert(NY)
+                df = df.reindex(mask)
+        return df
+
+    @staticmethod
+    def _split_bars_by_symbol(bars, symbols, limit=None):
+        """
+        Split a multi-symbol v2 bars frame (one row per symbol and
+        timestamp, with a `symbol` column) into the MultiIndex frame
+        that `get_bars` promises, with the symbols in the order they were
+        requested. Symbols without bars are left out.
+
+        return: DataFrame with UTC DatetimeIndex and columns
+                MultiIndex [symbol -> OHLCV]
+        """
+        if bars.empty:
+            return pd.DataFrame(
+                index=pd.DatetimeIndex([], tz='UTC'),
+                columns=pd.MultiIndex.from_product([[], []]),
+            )
+
+        if limit:
+            # keep the latest `limit` bars of each symbol
+            position = bars.groupby('symbol').cumcount(ascending=False)
+            bars = bars[position.values < int(limit)]
+
+        # pivot in one pass rather than slicing out every symbol
+        fields = [c for c in bars.columns if c != 'symbol']
+        df = bars.set_index('symbol', append=True).unstack('symbol')
+        df.columns = df.columns.swaplevel(0, 1)
+        received = set(bars['symbol'])
+        df = df.reindex(columns=pd.MultiIndex.from_product(
+            [[s for s in symbols if s in received], fields]))
+
+        # data is received in UTC tz but may come without tz (naive)
+        if df.index.tz is None:
+            df.index = df.index.tz_localize('UTC')
+        else:
+            df.index = df.index.tz_convert('UTC')
+        return df
+
+
+# state of the worker processes of the 'process' fetch executor
+_worker_backend = None
+
+
+def _init_fetch_worker(backend_kwargs):
+    global _worker_backend
+    _worker_backend = Backend(**backend_kwargs)
+
+
+def _fetch_bars_in_worker(params):
+    return _worker_backend._fetch_bars_from_api_internal(params)
@@ -0,0 +1,292 @@
+#
+# Copyright 2018 Alpaca
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import atexit
+import threading
+import time
+
+import aiohttp
+import pandas as pd
+from requests import Response
+from requests.exceptions import HTTPError
+
+from alpaca_trade_api.common import (
+    get_base_url,
+    get_credentials,
+    get_data_url,
+)
+from alpaca_trade_api.entity import Asset
+from alpaca_trade_api.entity_v2 import TradeV2, bar_mapping_v2
+
+from logbook import Logger
+
+log = Logger('AlpacaAsync')
+
+# Alpaca allows 200 requests per minute per account
+ALPACA_RATE_LIMIT = 200
+
+
+class TokenBucket:
+    '''
+    Allows `rate` acquisitions per `per` seconds on average, and bursts of
+    up to `capacity` (defaults to `rate`). Meant to be used from a single
+    event loop.
+    '''
+
+    def __init__(self, rate=ALPACA_RATE_LIMIT, per=60., capacity=None,
+                 clock=time.monotonic):
+        self._fill_rate = rate / per
+        self.capacity = capacity if capacity is not None else rate
+        self._tokens = float(self.capacity)
+        self._clock = clock
+        self._updated_at = clock()
+
+    def try_acquire(self):
+        '''
+        Takes a token if there is one.
+
+        Return: 0 on success, otherwise the seconds until a token is
+                available
+        '''
+        now = self._clock()
+        self._tokens = min(
+            self.capacity,
+            self._tokens + (now - self._updated_at) * self._fill_rate)
+        self._updated_at = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0
+        return (1 - self._tokens) / self._fill_rate
+
+    async def acquire(self):
+        while True:
+            wait = self.try_acquire()
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+
+class BlockingTokenBucket(TokenBucket):
+    '''
+    TokenBucket shared by threads. `acquire()` blocks the calling thread
+    until a token is available.
+    '''
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._lock = threading.Lock()
+
+    def try_acquire(self):
+        with self._lock:
+            return super().try_acquire()
+
+    def acquire(self):
+        while True:
+            wait = self.try_acquire()
+            if not wait:
+                return
+            time.sleep(wait)
+
+
+def _http_error(status, text, url):
+    # raised as the same exception as the REST client's, so callers such
+    # as `skip_http_error` handle both alike
+    response = Response()
+    response.status_code = status
+    response.url = str(url)
+    response._content = text.encode()
+    return HTTPError(
+        '{} Error: {} for url: {}'.format(status, text, url),
+        response=response)
+
+
+class AsyncDataClient:
+    '''
+    asyncio client for the market data and asset endpoints that
+    `alpaca.Backend` polls.
+
+    All requests share one keep-alive session, with at most
+    `max_concurrency` of them in flight and a token bucket holding them to
+    `rate_limit` requests per minute. 429 responses are retried after the
+    Retry-After delay instead of being dropped.
+
+    The client runs its own event loop in a background thread. `run()`
+    and `run_all()` are the synchronous entry points.
+    '''
+
+    def __init__(
+        self,
+        key_id=None,
+        secret=None,
+        base_url=None,
+        data_url=None,
+        max_concurrency=10,
+        rate_limit=ALPACA_RATE_LIMIT,
+        max_retries=3,
+    ):
+        key_id, secret, _ = get_credentials(key_id, secret)
+        self._headers = {
+            'APCA-API-KEY-ID': key_id,
+            'APCA-API-SECRET-KEY': secret,
+        }
+        self._base_url = base_url
+        self._data_url = data_url
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self._bucket = TokenBucket(rate_limit)
+
+        self._lock = threading.Lock()
+        self._loop = None
+        self._thread = None
+        self._session = None
+        self._semaphore = None
+
+    @property
+    def base_url(self):
+        return (self._base_url or get_base_url()).rstrip('/')
+
+    @property
+    def data_url(self):
+        return (self._data_url or get_data_url()).rstrip('/')
+
+    def _get_loop(self):
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(
+                    target=loop.run_forever, daemon=True,
+                    name='pylivetrader-alpaca-async')
+                self._thread.start()
+                asyncio.run_coroutine_threadsafe(
+                    self._open(), loop).result()
+                self._loop = loop
+                atexit.register(self.close)
+            return self._loop
+
+    async def _open(self):
+        connector = aiohttp.TCPConnector(limit=self.max_concurrency)
+        self._session = aiohttp.ClientSession(
+            connector=connector, headers=self._headers)
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    def run(self, coro):
+        '''Runs the coroutine on the client's loop and waits for it.'''
+        return asyncio.run_coroutine_threadsafe(
+            coro, self._get_loop()).result()
+
+    def run_all(self, coros, skip_statuses=()):
+        '''
+        Runs the coroutines concurrently and waits for all of them.
+        HTTP errors with a status in skip_statuses are logged and give
+        None.
+
+        Return: list of the results, in the order of coros
+        '''
+        async def skipping(coro):
+            try:
+                return await coro
+            except HTTPError as e:
+                if e.response.status_code in skip_statuses:
+                    log.warn(str(e))
+                    return None
+                raise
+
+        async def gather():
+            return await asyncio.gather(*[skipping(c) for c in coros])
+
+        return self.run(gather())
+
+    def close(self):
+        with self._lock:
+            loop, self._loop = self._loop, None
+            if loop is None:
+                return
+            asyncio.run_coroutine_threadsafe(
+                self._session.close(), loop).result()
+            loop.call_soon_threadsafe(loop.stop)
+            self._thread.join()
+            loop.close()
+
+    async def _get(self, url, params=None):
+        params = {k: str(v) for k, v in (params or {}).items()
+                  if v is not None}
+        for attempt in range(self.max_retries + 1):
+            await self._bucket.acquire()
+            async with self._semaphore:
+                async with self._session.get(url, params=params) as resp:
+                    if resp.status == 429 and attempt < self.max_retries:
+                        wait = float(resp.headers.get('Retry-After', 1))
+                        log.warn('rate limited, retrying {} in {}s'.format(
+                            url, wait))
+                    elif resp.status >= 400:
+                        raise _http_error(resp.status, await resp.text(), url)
+                    else:
+                        return await resp.json()
+            await asyncio.sleep(wait)
+
+    async def get_bars(self, symbols, timeframe, start=None, end=None,
+                       adjustment='raw'):
+        '''
+        Same as `REST.get_bars(symbols, ...).df`, paging through
+        next_page_token.
+
+        return: DataFrame indexed by timestamp, with a `symbol` column
+        '''
+        url = self.data_url + '/v2/stocks/bars'
+        params = {
+            'symbols': ','.join(symbols),
+            'timeframe': timeframe,
+            'start': start,
+            'end': end,
+            'adjustment': adjustment,
+            'limit': 10000,
+        }
+        items = []
+        while True:
+            resp = await self._get(url, params)
+            for symbol, bars in sorted((resp.get('bars') or {}).items()):
+                for bar in bars or []:
+                    bar['S'] = symbol
+                    items.append(bar)
+            params['page_token'] = resp.get('next_page_token')
+            if not params['page_token']:
+                break
+
+        df = pd.DataFrame(items)
+        df.columns = [bar_mapping_v2.get(c, c) for c in df.columns]
+        if not df.empty:
+            df.set_index('timestamp', inplace=True)
+            df.index = pd.DatetimeIndex(df.index)
+        return df
+
+    async def get_latest_trades(self, symbols):
+        '''
+        return: dict[symbol -> TradeV2]. symbols without a trade are left
+                out.
+        '''
+        resp = await self._get(
+            self.data_url + '/v2/stocks/trades/latest',
+            {'symbols': ','.join(symbols)})
+        return {
+            symbol: TradeV2(trade)
+            for symbol, trade in (resp.get('trades') or {}).items()
+        }
+
+    async def list_assets(self, status=None, asset_class=None):
+        resp = await self._get(
+            self.base_url + '/v2/assets',
+            {'status': status, 'asset_class': asset_class})
+        return [Asset(o) for o in resp]
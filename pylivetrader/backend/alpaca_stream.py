@@ -0,0 +1,165 @@
+#
+# Copyright 2018 Alpaca
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import re
+import threading
+
+import msgpack
+import pandas as pd
+import websockets
+
+from alpaca_trade_api.common import get_credentials, get_data_stream_url
+
+from logbook import Logger
+
+log = Logger('AlpacaStream')
+
+
+def _to_ns(t):
+    # msgpack Timestamp ext type, or RFC-3339 string for json peers
+    if hasattr(t, 'nanoseconds'):
+        return t.seconds * 10 ** 9 + t.nanoseconds
+    return pd.Timestamp(t).value
+
+
+class MarketDataStream:
+    '''
+    Subscribes to the minute bars and trades of a growing set of symbols
+    on the Alpaca data stream and feeds them into a StreamingBarStore.
+
+    Symbols can be added with `subscribe()` from any thread while the
+    stream runs. The store is reset on every disconnect, so nothing is
+    served from it until the stream has resubscribed.
+    '''
+
+    def __init__(self, store, key_id=None, secret=None, stream_url=None,
+                 feed='iex', reconnect_wait=5):
+        self.store = store
+        self._key_id, self._secret, _ = get_credentials(key_id, secret)
+        self._stream_url = stream_url
+        self._feed = feed
+        self.reconnect_wait = reconnect_wait
+
+        self._symbols = set()
+        self._lock = threading.Lock()
+        self._loop = None
+        self._ws = None
+        self._thread = None
+        self._stopped = False
+
+    @property
+    def endpoint(self):
+        url = (self._stream_url or get_data_stream_url()).rstrip('/')
+        return re.sub(r'^http', 'ws', url) + '/v2/' + self._feed
+
+    def start(self):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self._loop.run_until_complete, args=(self._run_forever(),),
+            daemon=True, name='pylivetrader-data-stream')
+        self._thread.start()
+
+    def stop(self):
+        self._stopped = True
+        if self._loop is not None and self._ws is not None:
+            asyncio.run_coroutine_threadsafe(self._ws.close(), self._loop)
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+
+    def subscribe(self, symbols):
+        with self._lock:
+            new = [s for s in symbols if s not in self._symbols]
+            self._symbols.update(new)
+        if not new:
+            return
+        self.store.track(new)
+        if self._loop is not None and self._ws is not None:
+            asyncio.run_coroutine_threadsafe(
+                self._send_subscribe(new), self._loop)
+
+    async def _send_subscribe(self, symbols):
+        ws = self._ws
+        if ws is None:
+            # resubscribed with everything on the next connection
+            return
+        try:
+            await ws.send(msgpack.packb({
+                'action': 'subscribe',
+                'bars': list(symbols),
+                'trades': list(symbols),
+            }))
+        except websockets.WebSocketException as e:
+            log.warn('could not subscribe: {}'.format(e))
+
+    async def _connect(self):
+        ws = await websockets.connect(
+            self.endpoint,
+            extra_headers={'Content-Type': 'application/msgpack'})
+        msg = msgpack.unpackb(await ws.recv())
+        if msg[0]['T'] != 'success' or msg[0]['msg'] != 'connected':
+            raise ValueError('connected message not received')
+        await ws.send(msgpack.packb({
+            'action': 'auth',
+            'key': self._key_id,
+            'secret': self._secret,
+        }))
+        msg = msgpack.unpackb(await ws.recv())
+        if msg[0]['T'] != 'success' or msg[0]['msg'] != 'authenticated':
+            raise ValueError(msg[0].get('msg', 'failed to authenticate'))
+        return ws
+
+    async def _run_forever(self):
+        while not self._stopped:
+            if not self._symbols:
+                # don't connect until there is something to subscribe to
+                await asyncio.sleep(0.1)
+                continue
+            try:
+                self._ws = await self._connect()
+                log.info('connected to {}'.format(self.endpoint))
+                with self._lock:
+                    symbols = list(self._symbols)
+                await self._send_subscribe(symbols)
+                async for message in self._ws:
+                    for msg in msgpack.unpackb(message):
+                        self._dispatch(msg)
+            except (websockets.WebSocketException, OSError, ValueError) as e:
+                log.warn('data stream error, reconnecting: {}'.format(e))
+            except Exception as e:
+                log.exception('error during data stream communication: '
+                              '{}'.format(e))
+            finally:
+                self.store.reset()
+                ws, self._ws = self._ws, None
+                if ws is not None:
+                    await ws.close()
+            if not self._stopped:
+                await asyncio.sleep(self.reconnect_wait)
+
+    def _dispatch(self, msg):
+        msg_type = msg.get('T')
+        if msg_type == 'b':
+            self.store.on_bar(msg['S'], _to_ns(msg['t']), (
+                msg['o'], msg['h'], msg['l'], msg['c'], msg['v'],
+                msg.get('n', float('nan')), msg.get('vw', float('nan')),
+            ))
+        elif msg_type == 't':
+            self.store.on_trade(msg['S'], msg['p'], msg['s'], _to_ns(msg['t']))
+        elif msg_type == 'subscription':
+            self.store.on_subscribed(msg.get('bars', []))
+        elif msg_type == 'error':
+            log.error('data stream error: {} ({})'.format(
+                msg.get('msg'), msg.get('code')))
@@ -17,6 +17,7 @@
 import abc
 from abc import abstractmethod
 
+import numpy as np
 import pandas as pd
 
 
@@ -82,6 +83,15 @@ class BaseBackend(abc.ABC):
     def get_bars(self, assets, data_frequency, bar_count=500, end_dt=None):
         pass
 
+    def get_tradability(self, assets):
+        '''
+        Returns:
+            tradable (np.ndarray[bool]):
+                Whether each of the assets can be traded with the broker,
+                in the same order as `assets`. All True by default.
+        '''
+        return np.ones(len(assets), dtype=bool)
+
     @property
     def time_skew(self):
         '''
@@ -93,3 +103,8 @@ class BaseBackend(abc.ABC):
 
     def initialize_data(self, context):
         pass
+
+    def close(self):
+        '''Releases the threads and connections of the backend, once the
+        algorithm stopped running.'''
+        pass
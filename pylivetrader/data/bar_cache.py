@@ -0,0 +1,163 @@
+#
+# Copyright 2018 Alpaca
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from collections import defaultdict
+
+from logbook import Logger
+import pandas as pd
+
+log = Logger('BarCache')
+
+
+class _Entry:
+    __slots__ = ('bars', 'end_dt', 'capacity', 'epoch')
+
+    def __init__(self, bars, end_dt, capacity, epoch):
+        self.bars = bars
+        self.end_dt = end_dt
+        self.capacity = capacity
+        self.epoch = epoch
+
+
+class RollingBarCache:
+    '''Keeps a rolling window of bars per (asset, frequency) between bars.
+
+    On each request only the bars since the last cached end_dt are fetched
+    from the backend and appended to the window, which is trimmed to the
+    largest bar_count ever requested for that key. The last cached bar is
+    always refetched with the tail, since it may have been incomplete.
+
+    `invalidate()` is meant to be called once per bar. Within the same bar
+    and end_dt the cached window is served without any backend call.
+    '''
+
+    def __init__(self, backend, trading_calendar):
+        self.backend = backend
+        self.trading_calendar = trading_calendar
+        self._entries = {}
+        self._epoch = 0
+
+    def invalidate(self):
+        '''Mark all windows stale. History is kept, only the tail is
+        refreshed on the next request.'''
+        self._epoch += 1
+
+    def clear(self):
+        self._entries = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get_bars(self, assets, frequency, bar_count, end_dt):
+        """
+        Same contract as `Backend.get_bars()`.
+
+        Return: pd.DataFrame() with columns MultiIndex [asset -> OHLCV]
+        """
+        if end_dt is None:
+            # without a reference time we can't tell which bars are missing
+            return self.backend.get_bars(
+                list(assets), frequency, bar_count=bar_count, end_dt=end_dt)
+
+        full_fetch = []
+        tail_fetches = defaultdict(list)
+        for asset in assets:
+            entry = self._entries.get((asset, frequency))
+            count = self._bars_to_fetch(entry, frequency, bar_count, end_dt)
+            if count is None:
+                full_fetch.append(asset)
+            elif count > 0:
+                tail_fetches[count].append(asset)
+
+        if full_fetch:
+            self._fetch(full_fetch, frequency, bar_count, end_dt, full=True)
+        for count, tail_assets in tail_fetches.items():
+            self._fetch(tail_assets, frequency, count, end_dt, full=False)
+
+        frames = []
+        keys = []
+        for asset in assets:
+            entry = self._entries.get((asset, frequency))
+            if entry is not None:
+                frames.append(entry.bars.iloc[-bar_count:])
+                keys.append(asset)
+        if not frames:
+            return self.backend.get_bars(
+                list(assets), frequency, bar_count=bar_count, end_dt=end_dt)
+        return pd.concat(frames, axis=1, keys=keys)
+
+    def _bars_to_fetch(self, entry, frequency, bar_count, end_dt):
+        '''
+        Returns None when the whole window needs to be fetched, otherwise
+        the number of most recent bars to refetch (0 means cache hit).
+        '''
+        if entry is None or entry.capacity < bar_count:
+            return None
+        if end_dt < entry.end_dt:
+            return None
+        if end_dt == entry.end_dt and entry.epoch == self._epoch:
+            return 0
+
+        try:
+            count = self._bars_between(entry.end_dt, end_dt, frequency)
+        except Exception as e:
+            log.debug('falling back to full fetch: {}'.format(e))
+            return None
+
+        if count >= bar_count:
+            return None
+        return count
+
+    def _bars_between(self, start_dt, end_dt, frequency):
+        '''Number of bars in [start_dt, end_dt], at least one.'''
+        cal = self.trading_calendar
+        if 'd' in frequency:  # 'daily' or '1d'
+            count = len(cal.sessions_in_range(
+                cal.minute_to_session_label(start_dt),
+                cal.minute_to_session_label(end_dt),
+            ))
+        else:
+            count = len(cal.minutes_in_range(start_dt, end_dt))
+        return max(count, 1)
+
+    def _fetch(self, assets, frequency, bar_count, end_dt, full):
+        df = self.backend.get_bars(
+            assets, frequency, bar_count=bar_count, end_dt=end_dt)
+        fetched = set(df.columns.get_level_values(0)) if df is not None \
+            else set()
+
+        for asset in assets:
+            key = (asset, frequency)
+            entry = self._entries.get(key)
+            if asset not in fetched:
+                # nothing new for this asset; keep what we have
+                if entry is not None and not full:
+                    entry.end_dt = end_dt
+                    entry.epoch = self._epoch
+                continue
+
+            new = df[asset]
+            if full or entry is None:
+                capacity = max(bar_count, entry.capacity if entry else 0)
+                bars = new
+            else:
+                capacity = entry.capacity
+                # fresh bars replace the cached ones with the same timestamp
+                old = entry.bars
+                bars = pd.concat(
+                    [old[~old.index.isin(new.index)], new]).sort_index()
+
+            self._entries[key] = _Entry(
+                bars.iloc[-capacity:], end_dt, capacity, self._epoch)
@@ -0,0 +1,302 @@
+#
+# Copyright 2018 Alpaca
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from collections import namedtuple
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+FIELDS = ('open', 'high', 'low', 'close', 'volume', 'trade_count', 'vwap')
+
+MINUTE = 60 * 10 ** 9
+
+StreamTrade = namedtuple('StreamTrade', ['price', 'size', 'timestamp'])
+
+
+class _SymbolBars:
+    '''Minute bars of one symbol in columnar arrays, sorted by label.'''
+
+    __slots__ = ('times', 'values', 'size', 'covered_from', 'seeded',
+                 'trade')
+
+    def __init__(self):
+        self.times = np.empty(64, dtype=np.int64)
+        self.values = np.empty((64, len(FIELDS)), dtype=np.float64)
+        self.size = 0
+        # the first label from which the bars here are known to be
+        # complete, None while that is not known
+        self.covered_from = None
+        # (first label, end label) of the last REST bars merged in
+        self.seeded = None
+        self.trade = None
+
+    def put(self, label, row, capacity):
+        n = self.size
+        if n and self.times[n - 1] >= label:
+            i = np.searchsorted(self.times[:n], label)
+            if self.times[i] == label:
+                self.values[i] = row
+                return
+            # out of order; rare enough to just insert
+            self.times = np.insert(self.times[:n], i, label)
+            self.values = np.insert(self.values[:n], i, row, axis=0)
+            self.size = n + 1
+            self._trim(capacity)
+            return
+
+        if n == len(self.times):
+            self._grow()
+        self.times[n] = label
+        self.values[n] = row
+        self.size = n + 1
+        self._trim(capacity)
+
+    def _grow(self):
+        n = len(self.times)
+        self.times = np.concatenate([self.times, np.empty(n, np.int64)])
+        self.values = np.concatenate(
+            [self.values, np.empty((n, len(FIELDS)), np.float64)])
+
+    def _trim(self, capacity):
+        # drop the oldest bars once twice the capacity is held, so that
+        # the copy is amortized over many appends
+        if self.size > 2 * capacity:
+            keep = slice(self.size - capacity, self.size)
+            self.times = self.times[keep].copy()
+            self.values = self.values[keep].copy()
+            self.size = capacity
+
+    def window(self, labels):
+        '''Bars reindexed on labels, NaN where there is no bar.'''
+        times = self.times[:self.size]
+        out = np.full((len(labels), len(FIELDS)), np.nan)
+        pos = np.searchsorted(times, labels)
+        pos[pos >= len(times)] = 0
+        hit = times[pos] == labels if len(times) else \
+            np.zeros(len(labels), dtype=bool)
+        out[hit] = self.values[pos[hit]]
+        return out
+
+
+class StreamingBarStore:
+    '''
+    In-memory minute bars and last trades, fed by the real-time data
+    stream.
+
+    Bars are labeled by their close time, like the REST bars the backend
+    returns. A window is only served when the store knows it is complete
+    for each symbol: the symbol was subscribed (or seeded from REST) before
+    the window starts, no stream gap or reconnect happened since, and the
+    stream already delivered the bars of its last minute. Otherwise
+    `get_bars()` reports the symbol as missing so the caller can fall back
+    to REST and `seed()` the store with the result.
+
+    The bar of a minute streams in a few seconds after the minute, when the
+    algorithm asks for it, so `get_bars()` waits up to `bar_wait` seconds
+    for the bar of the window's last minute when it is the only one the
+    stream hasn't delivered yet.
+    '''
+
+    def __init__(self, trading_calendar, capacity=2000, clock=None,
+                 bar_wait=5.):
+        self.trading_calendar = trading_calendar
+        self.capacity = capacity
+        self.bar_wait = bar_wait
+        self._clock = clock or (lambda: pd.Timestamp.utcnow())
+        self._minutes = trading_calendar.all_minutes.asi8
+        self._symbols = {}
+        self._watermark = None
+        self._lock = threading.Lock()
+        self._delivered = threading.Condition(self._lock)
+
+    def _next_minute(self, ns):
+        '''The first market minute strictly after ns.'''
+        return self._minutes[np.searchsorted(self._minutes, ns, 'right')]
+
+    def _last_minute(self, ns):
+        '''The last market minute at or before ns.'''
+        return self._minutes[np.searchsorted(self._minutes, ns, 'right') - 1]
+
+    def _now(self):
+        return self._clock().value
+
+    def track(self, symbols):
+        '''Starts keeping bars for the symbols. They are not served until
+        the stream confirms the subscription.'''
+        with self._lock:
+            for symbol in symbols:
+                if symbol not in self._symbols:
+                    self._symbols[symbol] = _SymbolBars()
+
+    def tracked(self):
+        with self._lock:
+            return list(self._symbols)
+
+    def on_subscribed(self, symbols):
+        '''The stream confirmed the subscription; bars are complete from the
+        minute in progress.'''
+        covered_from = self._next_minute(self._now() // MINUTE * MINUTE)
+        with self._lock:
+            for symbol in symbols:
+                entry = self._symbols.get(symbol)
+                if entry is not None and entry.covered_from is None:
+                    entry.covered_from = covered_from
+                    self._extend_coverage(entry)
+
+    def _extend_coverage(self, entry):
+        # REST bars that reach the stream coverage extend it backwards
+        if entry.covered_from is None or entry.seeded is None:
+            return
+        start, end = entry.seeded
+        if self._next_minute(end) >= entry.covered_from:
+            entry.covered_from = min(entry.covered_from, start)
+
+    def reset(self):
+        '''The stream disconnected; nothing is served until resubscribed.'''
+        with self._lock:
+            self._watermark = None
+            for entry in self._symbols.values():
+                entry.covered_from = None
+                entry.seeded = None
+                entry.trade = None
+            self._delivered.notify_all()
+
+    def on_bar(self, symbol, start, row):
+        '''
+        start: bar start time in ns since epoch (UTC)
+        row:   values in the order of FIELDS
+        '''
+        label = start + MINUTE
+        with self._lock:
+            entry = self._symbols.get(symbol)
+            if entry is None:
+                return
+            i = np.searchsorted(self._minutes, label)
+            if i == len(self._minutes) or self._minutes[i] != label:
+                # outside market hours
+                return
+
+            watermark = self._watermark
+            if watermark is not None and label > self._next_minute(watermark):
+                # a minute went by without any bar: the stream may have
+                # dropped messages, so trust it again from here
+                for other in self._symbols.values():
+                    other.seeded = None
+                    if other.covered_from is not None:
+                        other.covered_from = max(other.covered_from, label)
+            entry.put(label, row, self.capacity)
+
+            if watermark is None or label > watermark:
+                self._watermark = label
+                self._delivered.notify_all()
+
+    def on_trade(self, symbol, price, size, timestamp):
+        with self._lock:
+            entry = self._symbols.get(symbol)
+            if entry is not None and (
+                    entry.trade is None or entry.trade[2] <= timestamp):
+                entry.trade = (price, size, timestamp)
+
+    def last_trade(self, symbol):
+        '''
+        return: StreamTrade or None if the stream can't tell
+        '''
+        with self._lock:
+            entry = self._symbols.get(symbol)
+            if entry is None or entry.covered_from is None or \
+                    entry.trade is None:
+                return None
+            price, size, timestamp = entry.trade
+        return StreamTrade(price, size, pd.Timestamp(timestamp, tz='UTC'))
+
+    def _window(self, bar_count, end_dt):
+        end = self._now() if end_dt is None else pd.Timestamp(end_dt).value
+        end = self._last_minute(end)
+        idx = np.searchsorted(self._minutes, end, 'right')
+        return self._minutes[max(idx - bar_count, 0):idx]
+
+    def _wait_for_minute(self, label):
+        '''Waits up to bar_wait seconds for the stream to deliver the bars
+        of the minute label, if it is the next one due. Called with the
+        lock held.'''
+        deadline = time.monotonic() + self.bar_wait
+        while (self._watermark is not None and self._watermark < label and
+               self._next_minute(self._watermark) == label):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            self._delivered.wait(remaining)
+
+    def get_bars(self, symbols, bar_count, end_dt=None):
+        '''
+        The last bar_count minute bars up to end_dt, for the symbols that
+        can be served.
+
+        return: tuple(DataFrame or None, list of the missing symbols).
+                The frame is laid out like `Backend._fetch_bars_from_api`.
+        '''
+        labels = self._window(bar_count, end_dt)
+        served = {}
+        missing = []
+        with self._lock:
+            if len(labels):
+                self._wait_for_minute(labels[-1])
+            watermark = self._watermark
+            for symbol in symbols:
+                entry = self._symbols.get(symbol)
+                if (entry is None or entry.covered_from is None or
+                        watermark is None or len(labels) == 0 or
+                        labels[0] < entry.covered_from or
+                        labels[-1] > watermark):
+                    missing.append(symbol)
+                else:
+                    served[symbol] = entry.window(labels)
+
+        if not served:
+            return None, missing
+
+        index = pd.DatetimeIndex(labels, tz='UTC').tz_convert(
+            'America/New_York')
+        columns = pd.MultiIndex.from_product([list(served), FIELDS])
+        values = np.concatenate([served[s] for s in served], axis=1)
+        return pd.DataFrame(values, index=index, columns=columns), missing
+
+    def seed(self, df, end_dt=None):
+        '''
+        Merges minute bars fetched from REST, laid out like
+        `Backend._fetch_bars_from_api`, up to end_dt. When they reach the
+        minute the stream coverage starts from, the symbol is served from
+        the start of these bars on.
+        '''
+        if df is None or df.empty:
+            return
+        end = self._last_minute(
+            self._now() if end_dt is None else pd.Timestamp(end_dt).value)
+        labels = df.index.asi8
+        with self._lock:
+            for symbol in df.columns.get_level_values(0).unique():
+                entry = self._symbols.get(symbol)
+                if entry is None:
+                    continue
+                bars = df[symbol].reindex(columns=list(FIELDS))
+                values = bars.values.astype(np.float64)
+                present = ~np.isnan(values[:, :4]).all(axis=1)
+                for label, row in zip(labels[present], values[present]):
+                    entry.put(label, row, self.capacity)
+
+                entry.seeded = (labels[0], end)
+                self._extend_coverage(entry)
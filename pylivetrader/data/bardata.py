@@ -13,6 +13,7 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import numpy as np
 import pandas
 import pandas as pd
 
@@ -55,26 +56,18 @@ class BarData:
         multiple_assets = _is_iterable(assets)
         multiple_fields = _is_iterable(fields)
 
-        asset_list = assets if _is_iterable(assets) else [assets]
-        field_list = fields if _is_iterable(fields) else [fields]
-
-        fetch_args = []
-        for asset in asset_list:
-            for field in field_list:
-                fetch_args.append((asset, field))
-
         if not self._adjust_minutes:
-            def fetch(asset, field):
+            def fetch(assets, field):
                 return self.data_portal.get_spot_value(
-                    asset,
+                    assets,
                     field,
                     self._get_current_minute(),
                     self.data_frequency
                 )
         else:
-            def fetch(asset, field):
+            def fetch(assets, field):
                 return self.data_portal.get_adjusted_value(
-                    asset,
+                    assets,
                     field,
                     self._get_current_minute(),
                     None,  # this is used to be self.simulation_dt_func(). but
@@ -83,43 +76,45 @@ class BarData:
                     self.data_frequency
                 )
 
-        results = parallelize(fetch)(fetch_args)
-
         if not multiple_assets and not multiple_fields:
             # Return scalar value
-            return results[(assets, fields)]
-        elif multiple_assets and multiple_fields:
+            return fetch(assets, fields)
+
+        asset_list = list(assets) if multiple_assets else [assets]
+        field_list = list(fields) if multiple_fields else [fields]
+
+        # One backend call per field for all the assets. The backends
+        # return a list (or a Series) aligned with asset_list.
+        if len(field_list) == 1:
+            results = {
+                field_list[0]: list(fetch(asset_list, field_list[0]))
+            }
+        else:
+            results = parallelize(
+                lambda field: list(fetch(asset_list, field)),
+                workers=len(field_list),
+            )(field_list)
+
+        if multiple_assets and multiple_fields:
             # Return DataFrame indexed on field
-            field_results = {field: {} for field in fields}
-            for args, result in results.items():
-                (asset, field) = args
-                field_results[field][asset] = result
-            data = {}
-            for field in fields:
-                series = pd.Series(
-                    data=field_results[field], index=assets, name=field
-                )
-                data[field] = series
-            return pd.DataFrame(data)
+            return pd.DataFrame(
+                {field: results[field] for field in field_list},
+                index=asset_list,
+                columns=field_list,
+            )
         elif multiple_assets:
             # Multiple assets, single field
             # Return Series indexed on assets
-            asset_results = {}
-            for args, result in results.items():
-                (asset, field) = args
-                asset_results[asset] = result
             return pd.Series(
-                data=asset_results, index=assets, name=fields
+                data=results[fields], index=asset_list, name=fields
             )
         else:
             # Single asset, multiple fields
             # Return Series indexed on fields
-            field_results = {}
-            for args, result in results.items():
-                (asset, field) = args
-                field_results[field] = result
             return pd.Series(
-                data=field_results, index=fields, name=assets.symbol
+                data=[results[field][0] for field in field_list],
+                index=field_list,
+                name=assets.symbol,
             )
 
     def history(self, assets, fields, bar_count, frequency):
@@ -218,81 +213,50 @@ class BarData:
         """
         dt = self.datetime
 
-        if self._adjust_minutes:
-            adjusted_dt = self._get_current_minute()
+        if isinstance(assets, Asset):
+            asset_list = [assets]
         else:
-            adjusted_dt = dt
+            asset_list = list(assets)
 
-        data_portal = self.data_portal
+        # the broker side tradability is answered from the backend's
+        # snapshot of the asset list, in one pass for all the assets.
+        # is_alive_for_session() and auto_close_date are not checked, as
+        # they sometimes fail even though the asset is trade-able (e.g. VXX
+        # is listed twice by Alpaca, once tradable and once not).
+        tradeable = np.asarray(
+            self.data_portal.get_tradability(asset_list), dtype=bool)
+
+        if not self._daily_mode and tradeable.any():
+            tradeable &= self._exchange_open_mask(asset_list, dt)
+
+        # spot value doesn't always exist even though the asset is
+        # trade-able, so we don't fail for a missing last price and allow
+        # the user the option to try trading anyway.
 
         if isinstance(assets, Asset):
-            return self._can_trade_for_asset(
-                assets, dt, adjusted_dt, data_portal
-            )
-        else:
-            def fetch(asset):
-                return self._can_trade_for_asset(
-                    asset, dt, adjusted_dt, data_portal
-                )
-            tradeable = parallelize(fetch)(assets)
-            return pd.Series(data=tradeable, index=assets, dtype=bool)
+            return bool(tradeable[0])
+        return pd.Series(data=tradeable, index=asset_list, dtype=bool)
 
     @property
     def calendar(self):
         return self.data_portal.trading_calendar
 
-    def _can_trade_for_asset(self, asset, dt, adjusted_dt, data_portal):
-        # if self._is_restricted(asset, adjusted_dt):
-        #     return False
-
-        if not self.data_portal.backend._api.get_asset(asset.symbol).tradable:
-            return False
-
-        # this sometimes fail even though the asset is trade-able. I cancelled
-        # this check, and added the one above it
-
-        # session_label = self.calendar.minute_to_session_label(dt)
-        # if not asset.is_alive_for_session(session_label):
-        #     # asset isn't alive
-        #     return False
-
-        # this condition is being commented out because of the asset VXX
-        # as it turns out, there are 2 VXX assets in the Alpaca asset list.
-        # one is tradable, one is not. the auto_close_date is set (first for
-        # the tradable one then for the not tradable one, casuing this to fail
-        # it's set in alpaca.backend.get_equities() (asset.end_date)
-        # if asset.auto_close_date and session_label >= asset.auto_close_date:
-        #     return False
-
-        if not self._daily_mode:
-            # Find the next market minute for this calendar, and check if this
-            # asset's exchange is open at that minute.
-            if self.calendar.is_open_on_minute(dt):
-                dt_to_use_for_exchange_check = dt
-            else:
-                dt_to_use_for_exchange_check = \
-                    self.calendar.next_open(dt)
-
-            if not asset.is_exchange_open(dt_to_use_for_exchange_check):
-                return False
-
-        # spot value doesn't always exist even though the asset is trade-able
-        # you could get previous prices by doing
-        # data_portal.get_history_window([Equity("AAPL", "NYSE")],
-        #                                adjusted_dt, 120, 'minute',
-        #                                'price', '1m')
-        # but it won't always contain the lasy minute.
-        # I will not fail the "can_trade" method for that, and will allow the
-        # user the option to try trading even though, spot price doesn't exist
-
-        # # is there a last price?
-        # return not np.isnan(
-        #     data_portal.get_spot_value(
-        #         asset, "price", adjusted_dt, self.data_frequency
-        #     )
-        # )
-
-        return True
+    def _exchange_open_mask(self, assets, dt):
+        # Find the next market minute for this calendar, and check if each
+        # asset's exchange is open at that minute.
+        if self.calendar.is_open_on_minute(dt):
+            dt_to_use_for_exchange_check = dt
+        else:
+            dt_to_use_for_exchange_check = self.calendar.next_open(dt)
+
+        is_open = {}
+        mask = np.empty(len(assets), dtype=bool)
+        for i, asset in enumerate(assets):
+            if asset.exchange not in is_open:
+                is_open[asset.exchange] = asset.is_exchange_open(
+                    dt_to_use_for_exchange_check)
+            mask[i] = is_open[asset.exchange]
+        return mask
 
     def is_stale(self, assets):
         """
@@ -13,10 +13,11 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific la
 
-from functools import lru_cache
 from logbook import Logger
 import math
 
+from .bar_cache import RollingBarCache
+
 log = Logger('DataPortal')
 
 
@@ -33,6 +34,8 @@ class DataPortal:
         self.trading_calendar = trading_calendar
         self.quantopian_compatible = quantopian_compatible
 
+        self._bar_cache = RollingBarCache(backend, trading_calendar)
+
     def get_last_traded_dt(self, asset, dt, data_frequency):
         return self.backend.get_last_traded_dt(asset)
 
@@ -56,13 +59,19 @@ class DataPortal:
             assets, field, dt, data_frequency, self.quantopian_compatible
         )
 
-    @lru_cache(10)
+    def get_tradability(self, assets):
+        return self.backend.get_tradability(assets)
+
     def _get_realtime_bars(self, assets, frequency, bar_count, end_dt):
-        return self.backend.get_bars(
+        return self._bar_cache.get_bars(
             assets, frequency, bar_count=bar_count, end_dt=end_dt)
 
     def cache_clear(self):
-        return self._get_realtime_bars.cache_clear()
+        '''
+        Called on every bar. The rolling bar history is kept and only the
+        bars since the last request are fetched next time.
+        '''
+        self._bar_cache.invalidate()
 
     def get_history_window(self,
                            assets,
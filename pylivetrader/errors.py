@@ -158,3 +158,14 @@ class OrderInBeforeTradingStart(LiveTraderError):
     Raised when an algorithm calls an order method in before_trading_start.
     """
     msg = "Cannot place orders inside before_trading_start."
+
+
+class StateStoreFenced(LiveTraderError):
+    """
+    Raised when saving the state of an algorithm whose state another
+    instance took over.
+    """
+    msg = (
+        "Another instance of '{algoname}' took over its state. "
+        "The state is not saved by this one anymore."
+    )
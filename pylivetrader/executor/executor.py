@@ -20,10 +20,12 @@ from logbook import Logger
 
 from pylivetrader.executor.realtimeclock import (
     RealtimeClock,
-    BAR, SESSION_START, BEFORE_TRADING_START_BAR
+    BAR, SESSION_START, SESSION_END, BEFORE_TRADING_START_BAR
 )
 from pylivetrader.data.bardata import BarData
 from pylivetrader.misc.api_context import LiveTraderAPI
+from pylivetrader.misc.context_tricks import nop_context
+from pylivetrader.misc.tracing import get_tracer
 
 log = Logger('Executor')
 
@@ -73,21 +75,65 @@ class AlgorithmExecutor:
 
             return wrapper
 
+        state_store = algo._state_store
+        event_manager = algo.event_manager
+
+        profiler = algo._bar_profiler
+        if profiler is not None:
+            profiler.instrument(algo)
+            event_manager.profiler = profiler
+            stage = profiler.stage
+        else:
+            def stage(name):
+                return nop_context
+
+        # without handle_data, only the minutes with a scheduled function
+        # due need to run; the rest skip the bar entirely
+        skip_idle_bars = algo.handle_data_is_noop
+        if skip_idle_bars:
+            log.info('handle_data is a noop, skipping the bars without '
+                     'a scheduled function')
+
         @handle_retry
         def every_bar(dt_to_use, current_data=self.current_data,
-                      handle_data=algo.event_manager.handle_data):
+                      handle_data=event_manager.handle_data):
+
+            if skip_idle_bars and not event_manager.has_due_events(dt_to_use):
+                if profiler is not None:
+                    profiler.skip_bar()
+                return
+
+            if profiler is not None:
+                profiler.start_bar(dt_to_use)
+            try:
+                # the previous save must be done reading the context
+                with stage('state_wait'):
+                    state_store.wait_serialized()
 
-            # clear data portal cache.
-            self.data_portal.cache_clear()
+                # mark the data portal caches stale for this bar.
+                with stage('cache_clear'):
+                    self.data_portal.cache_clear()
 
-            # called every tick (minute or day).
-            algo.on_dt_changed(dt_to_use)
+                # called every tick (minute or day).
+                with stage('on_dt_changed'):
+                    algo.on_dt_changed(dt_to_use)
 
-            self.current_data.datetime = dt_to_use
+                self.current_data.datetime = dt_to_use
 
-            handle_data(algo, current_data, dt_to_use)
+                with stage('handle_data'):
+                    handle_data(algo, current_data, dt_to_use)
 
-            algo.portfolio_needs_update = True
+                # Algorithm.handle_data saves unless it is a noop or the
+                # store writes behind
+                if state_store.write_behind or skip_idle_bars:
+                    algo._save_state()
+
+                algo.portfolio_needs_update = True
+            finally:
+                if profiler is not None:
+                    profiler.end_bar()
+
+        session_minutes = getattr(self.clock, 'session_minutes', None)
 
         def once_a_day(midnight_dt, current_data=self.current_data,
                        data_portal=self.data_portal):
@@ -96,6 +142,10 @@ class AlgorithmExecutor:
             algo.on_dt_changed(midnight_dt)
             self.current_data.datetime = midnight_dt
 
+            # look the scheduled functions of the session up by minute
+            if session_minutes is not None:
+                event_manager.compile_session(session_minutes(midnight_dt))
+
         def on_exit():
             # Remove references to algo, data portal, et al to break cycles
             # and ensure deterministic cleanup of these objects when the
@@ -114,6 +164,9 @@ class AlgorithmExecutor:
                 elif action == SESSION_START:
                     once_a_day(dt)
                 elif action == BEFORE_TRADING_START_BAR:
+                    state_store.wait_serialized()
                     algo.on_dt_changed(dt)
                     self.current_data.datetime = dt
                     algo.before_trading_start(self.current_data)
+                elif action == SESSION_END:
+                    get_tracer().log_summary()
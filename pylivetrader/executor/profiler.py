@@ -0,0 +1,261 @@
+#
+# Copyright 2018 Alpaca
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import collections
+import time
+from contextlib import contextmanager
+
+import numpy as np
+from logbook import Logger
+
+from pylivetrader.misc.context_tricks import nop_context
+
+log = Logger('BarProfiler')
+
+
+class _Bar(object):
+
+    __slots__ = ('dt', 'started_wall', 'started', 'duration', 'stages',
+                 'callbacks', 'calls', 'overrun')
+
+    def __init__(self, dt, started_wall, started):
+        self.dt = dt
+        self.started_wall = started_wall
+        self.started = started
+        self.duration = None
+        self.stages = collections.defaultdict(float)
+        self.callbacks = collections.defaultdict(float)
+        self.calls = collections.Counter()
+        self.overrun = False
+
+
+class BarProfiler(object):
+    '''
+    Records where the time of each bar goes: the executor's stages, each
+    scheduled callback and the backend calls made by the algorithm. The
+    last `window` bars are kept for `report()`.
+
+    Stages nest: in the default (not write-behind) mode the state save
+    runs within handle_data, and is counted in both.
+
+    A bar overruns when it ends `budget` seconds or more after its minute
+    started, i.e. it delays the next bar.
+    '''
+
+    def __init__(self, window=390, budget=60., wall_time=time.time):
+        self.budget = budget
+        self.bars = 0
+        self.overruns = 0
+        self.skipped = 0
+        self._window = collections.deque(maxlen=window)
+        self._current = None
+        self._wall_time = wall_time
+
+    def start_bar(self, dt):
+        self._current = _Bar(dt, self._wall_time(), time.perf_counter())
+
+    def skip_bar(self):
+        '''Counts a bar the executor skipped, having nothing to run.'''
+        self.skipped += 1
+
+    def end_bar(self):
+        bar = self._current
+        if bar is None:
+            return
+        self._current = None
+        bar.duration = time.perf_counter() - bar.started
+
+        # time from the start of the minute, when the bar was emitted in
+        # it. a clock replaying the past only has the duration
+        minute = bar.dt.value / 1e9
+        lateness = bar.started_wall - minute
+        if 0 <= lateness < self.budget:
+            bar.overrun = self._wall_time() - minute >= self.budget
+        else:
+            lateness = 0
+            bar.overrun = bar.duration >= self.budget
+
+        self.bars += 1
+        self._window.append(bar)
+        if bar.overrun:
+            self.overruns += 1
+            log.warning(
+                'bar {} overran into the next minute: {:.2f}s '
+                '(started {:.2f}s late) {}'.format(
+                    bar.dt, bar.duration, lateness, self._format_bar(bar)))
+
+    def stage(self, name):
+        '''Context manager timing a stage of the current bar.'''
+        if self._current is None:
+            return nop_context
+        return self._timed(self._current.stages, name)
+
+    def callback(self, func):
+        '''Context manager timing a scheduled callback.'''
+        if self._current is None:
+            return nop_context
+        name = getattr(func, '__name__', None) or repr(func)
+        return self._timed(self._current.callbacks, name)
+
+    @contextmanager
+    def _timed(self, totals, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            totals[name] += time.perf_counter() - started
+
+    def count_call(self, name):
+        bar = self._current
+        if bar is not None:
+            bar.calls[name] += 1
+
+    def instrument(self, algo):
+        '''
+        Counts the backend calls of the algorithm and its data portal.
+        '''
+        backend = algo._backend
+        if isinstance(backend, _CountingBackend):
+            return
+        counting = _CountingBackend(backend, self)
+        algo._backend = counting
+        data_portal = algo.data_portal
+        data_portal.backend = counting
+        data_portal._bar_cache.backend = counting
+
+    def summary(self):
+        '''
+        return: dict of the bars in the window, with bars, overruns,
+                duration, stages and callbacks (dicts of name -> mean, p50,
+                p99 and max seconds) and backend_calls (per bar mean and
+                max, and the total of each method)
+        '''
+        bars = list(self._window)
+
+        def stats(values):
+            values = np.array(values)
+            p50, p99 = np.percentile(values, [50, 99])
+            return {
+                'count': len(values),
+                'mean': values.mean(),
+                'p50': p50,
+                'p99': p99,
+                'max': values.max(),
+            }
+
+        def collect(attr):
+            values = collections.defaultdict(list)
+            for bar in bars:
+                for name, seconds in getattr(bar, attr).items():
+                    values[name].append(seconds)
+            return {name: stats(v) for name, v in values.items()}
+
+        calls = collections.Counter()
+        for bar in bars:
+            calls.update(bar.calls)
+        per_bar = [sum(bar.calls.values()) for bar in bars]
+
+        return {
+            'bars': len(bars),
+            'overruns': sum(bar.overrun for bar in bars),
+            'duration': stats([bar.duration for bar in bars])
+            if bars else None,
+            'stages': collect('stages'),
+            'callbacks': collect('callbacks'),
+            'backend_calls': {
+                'mean': float(np.mean(per_bar)) if bars else 0.,
+                'max': max(per_bar) if bars else 0,
+                'methods': dict(calls),
+            },
+        }
+
+    def report(self):
+        summary = self.summary()
+        lines = ['last {} bars, {} overran ({} of {} since start, {} idle '
+                 'bars skipped)'.format(
+                     summary['bars'], summary['overruns'], self.overruns,
+                     self.bars, self.skipped)]
+        if not summary['bars']:
+            return lines[0]
+
+        def row(name, s):
+            return '  {:<32} mean {:>9.2f}ms  p50 {:>9.2f}ms  ' \
+                'p99 {:>9.2f}ms  max {:>9.2f}ms  n={}'.format(
+                    name, s['mean'] * 1e3, s['p50'] * 1e3, s['p99'] * 1e3,
+                    s['max'] * 1e3, s['count'])
+
+        lines.append(row('bar', summary['duration']))
+        lines.append('stages:')
+        for name, s in sorted(summary['stages'].items(),
+                              key=lambda item: -item[1]['mean']):
+            lines.append(row(name, s))
+        if summary['callbacks']:
+            lines.append('callbacks:')
+            for name, s in sorted(summary['callbacks'].items(),
+                                  key=lambda item: -item[1]['mean']):
+                lines.append(row(name, s))
+        calls = summary['backend_calls']
+        lines.append('backend calls per bar: mean {:.1f} max {}'.format(
+            calls['mean'], calls['max']))
+        for name, count in sorted(calls['methods'].items(),
+                                  key=lambda item: -item[1]):
+            lines.append('  {:<32} {}'.format(name, count))
+        return '\n'.join(lines)
+
+    def log_report(self, *args):
+        '''Logs report(). Takes the arguments of a signal handler.'''
+        log.info('bar profile\n{}'.format(self.report()))
+
+    @staticmethod
+    def _format_bar(bar):
+        parts = ['{}={:.2f}s'.format(name, seconds)
+                 for name, seconds in bar.stages.items()]
+        parts += ['{}()={:.2f}s'.format(name, seconds)
+                  for name, seconds in bar.callbacks.items()]
+        parts.append('backend_calls={}'.format(sum(bar.calls.values())))
+        return ' '.join(parts)
+
+
+class _CountingBackend(object):
+    '''
+    Proxy counting the calls of the backend's public methods, and the
+    reads of its properties (e.g. portfolio), to the profiler.
+    '''
+
+    def __init__(self, backend, profiler):
+        object.__setattr__(self, '_backend', backend)
+        object.__setattr__(self, '_profiler', profiler)
+
+    def __getattr__(self, name):
+        backend = self._backend
+        if name.startswith('_'):
+            return getattr(backend, name)
+
+        profiler = self._profiler
+        if isinstance(getattr(type(backend), name, None), property):
+            profiler.count_call(name)
+            return getattr(backend, name)
+
+        attr = getattr(backend, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            profiler.count_call(name)
+            return attr(*args, **kwargs)
+        return call
+
+    def __setattr__(self, name, value):
+        setattr(self._backend, name, value)
@@ -14,9 +14,10 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from time import sleep
+import time
 
 from logbook import Logger
+import numpy as np
 import pandas as pd
 
 BAR = 0
@@ -25,6 +26,8 @@ SESSION_END = 2
 MINUTE_END = 3
 BEFORE_TRADING_START_BAR = 4
 
+MINUTE = 60 * 10 ** 9
+
 
 log = Logger('Realtime Clock')
 
@@ -41,6 +44,12 @@ class RealtimeClock(object):
 
     The :param:`time_skew` parameter represents the time difference between
     the Broker and the live trading machine's clock.
+
+    The emission times of a session are computed once when it starts, and
+    the clock sleeps until the next one instead of polling. Sleeps are cut
+    into :param:`max_sleep` second chunks so that a wall clock adjustment
+    is picked up within that time. When the consumer falls behind, the
+    bars it missed are skipped and the latest one is emitted.
     """
 
     def __init__(self,
@@ -48,73 +57,94 @@ class RealtimeClock(object):
                  before_trading_start_minute,
                  minute_emission,
                  time_skew=pd.Timedelta("0s"),
-                 is_broker_alive=None):
+                 is_broker_alive=None,
+                 wall_time=time.time,
+                 sleep=time.sleep,
+                 max_sleep=60.):
         self.calendar = calendar
         self.before_trading_start_minute = before_trading_start_minute
         self.minute_emission = minute_emission
         self.time_skew = time_skew
         self.is_broker_alive = is_broker_alive or (lambda: True)
-        self._last_emit = None
-        self._before_trading_start_bar_yielded = False
+        self.max_sleep = max_sleep
+        self._wall_time = wall_time
+        self._sleep = sleep
+
+    def _now(self):
+        '''Broker time in ns since epoch.'''
+        return int(self._wall_time() * 1e9) + self.time_skew.value
+
+    def _sleep_until(self, target):
+        '''Sleeps until the broker time reaches target (ns).'''
+        while True:
+            remaining = (target - self._now()) / 1e9
+            if remaining <= 0:
+                return
+            self._sleep(min(remaining, self.max_sleep))
+
+    def _first_session(self):
+        # the session of the current broker day, or the next one
+        sessions = self.calendar.all_sessions
+        today = self._now() // (24 * 60 * MINUTE) * (24 * 60 * MINUTE)
+        return sessions[np.searchsorted(sessions.asi8, today)]
+
+    def session_schedule(self, session):
+        '''
+        Emission times of the session in ns since epoch (UTC).
+
+        return: tuple(before_trading_start, bar minutes, close minute)
+        '''
+        start_time, tz = self.before_trading_start_minute
+        before_trading_start = (
+            session.tz_localize(None).tz_localize(tz) +
+            pd.Timedelta(hours=start_time.hour, minutes=start_time.minute)
+        ).value
+        minutes = self.calendar.minutes_for_session(session).asi8
+        return before_trading_start, minutes[:-1], minutes[-1]
+
+    def session_minutes(self, session):
+        '''
+        return: pd.DatetimeIndex (UTC) of the bars of the session
+        '''
+        bars = self.session_schedule(session)[1]
+        return pd.DatetimeIndex(bars).tz_localize('UTC')
 
     def __iter__(self):
+        session = self._first_session()
+        while True:
+            for event in self._session_events(session):
+                yield event
+            session = self.calendar.next_session_label(session)
+
+    def _session_events(self, session):
+        before_trading_start, bars, close = self.session_schedule(session)
+
+        self._sleep_until(session.value)
+        yield session, SESSION_START
 
-        current_session = None
+        self._sleep_until(before_trading_start)
+        now = self._now() // MINUTE * MINUTE
+        yield pd.Timestamp(now, tz='UTC'), BEFORE_TRADING_START_BAR
 
+        i = 0
         while True:
-            current_time = pd.to_datetime('now', utc=True)
-            server_time = (current_time + self.time_skew).floor('1 min')
-
-            session_label = server_time.floor('1D')
-            if not self.calendar.is_session(session_label):
-                # wait until next session
-                sleep(1)
-                continue
-
-            if current_session is None or current_session != session_label:
-                yield session_label, SESSION_START
-                current_session = session_label
-                self._before_trading_start_bar_yielded = False
-
-            delta = pd.Timedelta(
-                hours=self.before_trading_start_minute[0].hour,
-                minutes=self.before_trading_start_minute[0].minute,
-            )
-
-            before_trading_start = (
-                current_session
-                .tz_localize(None)
-                .tz_localize(self.before_trading_start_minute[1])
-            ) + delta
-
-            session_open = self.calendar.session_open(current_session)
-            session_close = self.calendar.session_close(current_session)
-
-            if (server_time >= before_trading_start and
-                    not self._before_trading_start_bar_yielded):
-                self._last_emit = server_time
-                self._before_trading_start_bar_yielded = True
-                yield server_time, BEFORE_TRADING_START_BAR
-            elif server_time < session_open:
-                sleep(1)
-            elif (session_open <= server_time < session_close):
-                if (self._last_emit is None or
-                        server_time - self._last_emit >=
-                        pd.Timedelta('1 minute')):
-                    self._last_emit = server_time
-                    yield server_time, BAR
-                    if self.minute_emission:
-                        yield server_time, MINUTE_END
-                else:
-                    sleep(1)
-            elif server_time == session_close:
-                if server_time != self._last_emit:
-                    self._last_emit = server_time
-                    if self.minute_emission:
-                        yield server_time, MINUTE_END
-                    yield server_time, SESSION_END
-            elif server_time > session_close:
-                sleep(1)
-            else:
-                # We should never end up in this branch
-                raise RuntimeError("Invalid state in RealtimeClock")
+            now = self._now()
+            if now >= close:
+                break
+            # skip the bars that went by while the consumer was busy
+            i = max(i, np.searchsorted(bars, now, 'right') - 1)
+            self._sleep_until(bars[i])
+            dt = pd.Timestamp(bars[i], tz='UTC')
+            yield dt, BAR
+            if self.minute_emission:
+                yield dt, MINUTE_END
+            i += 1
+            if i == len(bars):
+                break
+
+        self._sleep_until(close)
+        if self._now() < close + MINUTE:
+            dt = pd.Timestamp(close, tz='UTC')
+            if self.minute_emission:
+                yield dt, MINUTE_END
+            yield dt, SESSION_END
@@ -15,6 +15,7 @@
 import abc
 import logbook
 
+import numpy as np
 import pandas as pd
 
 from six import with_metaclass
@@ -27,6 +28,13 @@ from pylivetrader.errors import (
 log = logbook.Logger('TradingControl')
 
 
+def _asset_mask(asset, assets):
+    '''True for the assets a control of `asset` (None for all) applies to.'''
+    if asset is None:
+        return np.ones(len(assets), dtype=bool)
+    return np.array([a == asset for a in assets], dtype=bool)
+
+
 class TradingControl(with_metaclass(abc.ABCMeta)):
     """
     Abstract base class representing a fail-safe control on the behavior of any
@@ -61,6 +69,53 @@ class TradingControl(with_metaclass(abc.ABCMeta)):
         """
         raise NotImplementedError
 
+    def validate_batch(self,
+                       assets,
+                       amounts,
+                       prices,
+                       positions,
+                       algo_datetime,
+                       algo_current_data):
+        """
+        validate() for a batch of orders at once. Unlike validate(), the
+        violations are returned rather than handled, and nothing is
+        recorded until record_batch().
+
+        Controls which don't implement it are validated order by order.
+
+        Parameters
+        ----------
+        assets : list[Asset]
+        amounts : np.ndarray[int]
+            The share counts to order, none of them 0.
+        prices : np.ndarray[float]
+            The current prices of the assets.
+        positions : np.ndarray[int]
+            The share counts held before the orders, from one snapshot of
+            the portfolio.
+
+        Returns
+        -------
+        violations : np.ndarray[bool]
+            True for the orders violating this control.
+        """
+        raise NotImplementedError('validate_batch')
+
+    def handle_violations(self, assets, amounts, violations, algo_datetime):
+        """
+        handle_violation() for the orders of a batch that validate_batch()
+        found in violation.
+        """
+        for i in np.flatnonzero(violations):
+            self.handle_violation(assets[i], int(amounts[i]), algo_datetime)
+
+    def record_batch(self, assets, amounts, algo_datetime):
+        """
+        Called once no trading control failed a batch of orders, before it
+        is placed.
+        """
+        pass
+
     def _constraint_msg(self, metadata):
         constraint = repr(self)
         if metadata:
@@ -130,6 +185,28 @@ class MaxOrderCount(TradingControl):
             self.handle_violation(asset, amount, algo_datetime)
         self.orders_placed += 1
 
+    def validate_batch(self,
+                       assets,
+                       amounts,
+                       prices,
+                       positions,
+                       algo_datetime,
+                       algo_current_data):
+        """
+        Fail the whole batch if it doesn't fit in what is left of today's
+        self.max_count orders.
+        """
+        algo_date = algo_datetime.date()
+        if self.current_date and self.current_date != algo_date:
+            self.orders_placed = 0
+        self.current_date = algo_date
+
+        return np.full(len(assets),
+                       self.orders_placed + len(assets) > self.max_count)
+
+    def record_batch(self, assets, amounts, algo_datetime):
+        self.orders_placed += len(assets)
+
 
 class RestrictedListOrder(TradingControl):
     """TradingControl representing a restricted list of assets that
@@ -157,6 +234,17 @@ class RestrictedListOrder(TradingControl):
         if self.restrictions.is_restricted(asset, algo_datetime):
             self.handle_violation(asset, amount, algo_datetime)
 
+    def validate_batch(self,
+                       assets,
+                       amounts,
+                       prices,
+                       positions,
+                       algo_datetime,
+                       algo_current_data):
+        return np.asarray(
+            self.restrictions.is_restricted(list(assets), algo_datetime),
+            dtype=bool)
+
 
 class MaxOrderSize(TradingControl):
     """
@@ -216,6 +304,21 @@ class MaxOrderSize(TradingControl):
         if too_much_value:
             self.handle_violation(asset, amount, algo_datetime)
 
+    def validate_batch(self,
+                       assets,
+                       amounts,
+                       prices,
+                       positions,
+                       algo_datetime,
+                       algo_current_data):
+        violations = np.zeros(len(assets), dtype=bool)
+        if self.max_shares is not None:
+            violations |= np.abs(amounts) > self.max_shares
+        if self.max_notional is not None:
+            with np.errstate(invalid='ignore'):
+                violations |= np.abs(amounts * prices) > self.max_notional
+        return violations & _asset_mask(self.asset, assets)
+
 
 class MaxPositionSize(TradingControl):
     """
@@ -280,6 +383,23 @@ class MaxPositionSize(TradingControl):
         if too_much_value:
             self.handle_violation(asset, amount, algo_datetime)
 
+    def validate_batch(self,
+                       assets,
+                       amounts,
+                       prices,
+                       positions,
+                       algo_datetime,
+                       algo_current_data):
+        shares_post_order = positions + amounts
+        violations = np.zeros(len(assets), dtype=bool)
+        if self.max_shares is not None:
+            violations |= np.abs(shares_post_order) > self.max_shares
+        if self.max_notional is not None:
+            with np.errstate(invalid='ignore'):
+                violations |= np.abs(
+                    shares_post_order * prices) > self.max_notional
+        return violations & _asset_mask(self.asset, assets)
+
 
 class LongOnly(TradingControl):
     """
@@ -302,6 +422,15 @@ class LongOnly(TradingControl):
         if portfolio.positions[asset].amount + amount < 0:
             self.handle_violation(asset, amount, algo_datetime)
 
+    def validate_batch(self,
+                       assets,
+                       amounts,
+                       prices,
+                       positions,
+                       algo_datetime,
+                       algo_current_data):
+        return positions + amounts < 0
+
 
 class AssetDateBounds(TradingControl):
     """
@@ -347,6 +476,28 @@ class AssetDateBounds(TradingControl):
                 self.handle_violation(
                     asset, amount, algo_datetime, metadata=metadata)
 
+    def validate_batch(self,
+                       assets,
+                       amounts,
+                       prices,
+                       positions,
+                       algo_datetime,
+                       algo_current_data):
+        normalized_algo_dt = pd.Timestamp(algo_datetime).normalize()
+        return np.array([
+            bool(asset.start_date) and normalized_algo_dt <
+            pd.Timestamp(asset.start_date).normalize() or
+            bool(asset.end_date) and normalized_algo_dt >
+            pd.Timestamp(asset.end_date).normalize()
+            for asset in assets
+        ], dtype=bool)
+
+    def handle_violations(self, assets, amounts, violations, algo_datetime):
+        # validate() handles them with the dates in the metadata
+        for i in np.flatnonzero(violations):
+            self.validate(assets[i], int(amounts[i]), None, algo_datetime,
+                          None)
+
 
 class AccountControl(with_metaclass(abc.ABCMeta)):
     """
@@ -0,0 +1,115 @@
+#
+# Copyright 2018 Alpaca
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from collections import namedtuple
+import threading
+
+LedgerPosition = namedtuple('LedgerPosition', [
+    'symbol', 'amount', 'cost_basis', 'last_sale_price', 'last_sale_date',
+])
+
+
+class PositionLedger(object):
+    '''
+    Cash and positions of the account, kept up to date from the broker's
+    fill events between snapshots taken with `reconcile()`.
+
+    A fill racing a reconcile may be counted twice in the cash until the
+    next reconcile; the position amounts are taken from the fills'
+    resulting position quantity where the broker reports it, so they
+    don't drift.
+    '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cash = 0.
+        # symbol -> [amount, cost_basis, last_sale_price, last_sale_date]
+        self._positions = {}
+        self.reconciled_at = None
+
+    def reconcile(self, cash, positions, now):
+        '''
+        Replaces the ledger with a snapshot of the account.
+
+        positions: iterable of LedgerPosition
+        '''
+        with self._lock:
+            self._cash = cash
+            self._positions = {
+                p.symbol: [p.amount, p.cost_basis, p.last_sale_price,
+                           p.last_sale_date]
+                for p in positions if p.amount
+            }
+            self.reconciled_at = now
+
+    def invalidate(self):
+        '''Fills may have been missed; reconcile on the next read.'''
+        with self._lock:
+            self.reconciled_at = None
+
+    def on_fill(self, symbol, side, qty, price, timestamp,
+                position_qty=None):
+        '''
+        qty: shares of this execution
+        position_qty: the position after it, if the broker reports it
+        '''
+        signed = qty if side == 'buy' else -qty
+        with self._lock:
+            self._cash -= signed * price
+            amount, cost_basis, _, _ = self._positions.get(
+                symbol, (0, 0., None, None))
+            new_amount = position_qty if position_qty is not None \
+                else amount + signed
+
+            if amount == 0 or amount * new_amount < 0:
+                # opened, or flipped sides
+                cost_basis = price
+            elif abs(new_amount) > abs(amount):
+                added = abs(new_amount) - abs(amount)
+                cost_basis = (cost_basis * abs(amount) + price * added) / \
+                    abs(new_amount)
+
+            if new_amount == 0:
+                self._positions.pop(symbol, None)
+            else:
+                self._positions[symbol] = [
+                    new_amount, cost_basis, price, timestamp]
+
+    def on_trade(self, symbol, price, timestamp):
+        '''Marks a held position to the last trade.'''
+        with self._lock:
+            position = self._positions.get(symbol)
+            if position is not None and (
+                    position[3] is None or position[3] <= timestamp):
+                position[2] = price
+                position[3] = timestamp
+
+    def amount(self, symbol):
+        with self._lock:
+            position = self._positions.get(symbol)
+            return position[0] if position is not None else 0
+
+    @property
+    def cash(self):
+        with self._lock:
+            return self._cash
+
+    def positions(self):
+        '''
+        return: list of LedgerPosition
+        '''
+        with self._lock:
+            return [LedgerPosition(symbol, *position)
+                    for symbol, position in self._positions.items()]
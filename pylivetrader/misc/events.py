@@ -200,6 +200,18 @@ class EventManager(object):
             lambda *_: nop_context
         )
 
+        # per session index, see compile_session()
+        self._session_minutes = None
+        self._session_bounds = None
+        self._fires = {}
+        self._schedule = None
+        self._dynamic = []
+        self._last_dt = None
+        self._joined = False
+
+        # optional BarProfiler timing each callback
+        self.profiler = None
+
     def add_event(self, event, prepend=False):
         """
         Adds an event to the manager.
@@ -209,14 +221,116 @@ class EventManager(object):
         else:
             self._events.append(event)
 
+        if self._schedule is not None:
+            # resolve the new event for the rest of the session
+            minutes = self._session_minutes
+            if self._last_dt is not None:
+                minutes = minutes[minutes > self._last_dt]
+            self._fires[id(event)] = self._fire_minutes(event, minutes)
+            self._build_index()
+
+    def compile_session(self, minutes):
+        """
+        Resolves the events to the minutes of the session they trigger at,
+        so that handle_data() looks the due callbacks up instead of asking
+        every rule on every bar. Events whose rule can't tell its minutes
+        in advance (see EventRule.trigger_mask) are still checked on each
+        bar.
+
+        minutes: pd.DatetimeIndex (UTC) of the session's bars
+        """
+        self._session_minutes = minutes
+        self._session_bounds = (minutes.asi8[0], minutes.asi8[-1]) \
+            if len(minutes) else (1, 0)
+        self._joined = False
+        self._resolve(minutes)
+
+    def _resolve(self, minutes):
+        self._fires = {
+            id(event): self._fire_minutes(event, minutes)
+            for event in self._events
+        }
+        self._build_index()
+
+    def _join(self, dt):
+        # the first bar of the session may come after its first minute when
+        # the algorithm starts mid-session. Resolve the events again from
+        # that bar on, so that the once a day rules due earlier in the
+        # session fire at it, like should_trigger() does.
+        if self._joined:
+            return
+        self._joined = True
+        minutes = self._session_minutes
+        if dt.value > minutes.asi8[0]:
+            self._resolve(minutes[minutes >= dt])
+
+    @staticmethod
+    def _fire_minutes(event, minutes):
+        if not len(minutes):
+            return minutes.asi8
+        mask = event.rule.trigger_mask(minutes)
+        return None if mask is None else minutes.asi8[mask]
+
+    def _build_index(self):
+        # minute (ns) -> positions of the events due, in the order they
+        # were added
+        schedule = {}
+        dynamic = []
+        for i, event in enumerate(self._events):
+            fires = self._fires[id(event)]
+            if fires is None:
+                dynamic.append(i)
+                continue
+            for value in fires:
+                schedule.setdefault(value, []).append(i)
+        self._schedule = schedule
+        self._dynamic = dynamic
+
+    def has_due_events(self, dt):
+        """
+        False if no event triggers at dt. Only known after compile_session()
+        for a session without dynamic events; True otherwise.
+        """
+        if self._schedule is None or self._dynamic or \
+                not self._in_session(dt):
+            return True
+        self._join(dt)
+        return dt.value in self._schedule
+
     def handle_data(self, context, data, dt):
+        self._last_dt = dt
         with self._create_context(data):
-            for event in self._events:
-                event.handle_data(
-                    context,
-                    data,
-                    dt,
-                )
+            schedule = self._schedule
+            if schedule is None or not self._in_session(dt):
+                for event in self._events:
+                    self._dispatch(event, context, data, dt, False)
+                return
+
+            self._join(dt)
+            due = self._schedule.get(dt.value, ())
+            if self._dynamic:
+                due = sorted(list(due) + self._dynamic)
+                dynamic = set(self._dynamic)
+            else:
+                dynamic = ()
+            for i in due:
+                self._dispatch(self._events[i], context, data, dt,
+                               i not in dynamic)
+
+    def _in_session(self, dt):
+        first, last = self._session_bounds
+        return first <= dt.value <= last
+
+    def _dispatch(self, event, context, data, dt, due):
+        profiler = self.profiler
+        if profiler is None:
+            if due:
+                event.callback(context, data)
+            else:
+                event.handle_data(context, data, dt)
+        elif due or event.rule.should_trigger(dt):
+            with profiler.callback(event.callback):
+                event.callback(context, data)
 
 
 class Event(namedtuple('Event', ['rule', 'callback'])):
@@ -246,6 +360,13 @@ class EventRule(six.with_metaclass(ABCMeta)):
         """
         raise NotImplementedError('should_trigger')
 
+    def trigger_mask(self, minutes):
+        """
+        The minutes of a session the rule triggers at, as a boolean array
+        aligned with minutes, or None if that can't be known in advance.
+        """
+        return None
+
 
 class StatelessRule(EventRule):
     """
@@ -263,6 +384,15 @@ class StatelessRule(EventRule):
         return ComposedRule(self, rule, ComposedRule.lazy_and)
     __and__ = and_
 
+    def trigger_mask(self, minutes):
+        # pure, so asking ahead gives the same answers
+        return np.fromiter(
+            (bool(self.should_trigger(dt)) for dt in minutes),
+            dtype=bool, count=len(minutes))
+
+    def _session_label(self, minutes, **kwargs):
+        return self.cal.minute_to_session_label(minutes[-1], **kwargs)
+
 
 class ComposedRule(StatelessRule):
     """
@@ -305,6 +435,14 @@ class ComposedRule(StatelessRule):
         """
         return first_should_trigger(dt) and second_should_trigger(dt)
 
+    def trigger_mask(self, minutes):
+        if self.composer is not ComposedRule.lazy_and:
+            return super(ComposedRule, self).trigger_mask(minutes)
+        mask = self.first.trigger_mask(minutes)
+        if not mask.any():
+            return mask
+        return mask & self.second.trigger_mask(minutes)
+
 
 class Always(StatelessRule):
     """
@@ -318,6 +456,9 @@ class Always(StatelessRule):
         return True
     should_trigger = always_trigger
 
+    def trigger_mask(self, minutes):
+        return np.ones(len(minutes), dtype=bool)
+
 
 class Never(StatelessRule):
     """
@@ -331,6 +472,9 @@ class Never(StatelessRule):
         return False
     should_trigger = never_trigger
 
+    def trigger_mask(self, minutes):
+        return np.zeros(len(minutes), dtype=bool)
+
 
 class AfterOpen(StatelessRule):
     """
@@ -388,6 +532,13 @@ class AfterOpen(StatelessRule):
 
         return dt == self._period_end
 
+    def trigger_mask(self, minutes):
+        period_start = self.cal.open_and_close_for_session(
+            self._session_label(minutes))[0]
+        period_end = self.cal.execution_time_from_open(period_start) + \
+            self.offset - self._one_minute
+        return minutes.asi8 == pd.Timestamp(period_end).value
+
 
 class BeforeClose(StatelessRule):
     """
@@ -442,6 +593,13 @@ class BeforeClose(StatelessRule):
 
         return self._period_start == dt
 
+    def trigger_mask(self, minutes):
+        period_end = self.cal.open_and_close_for_session(
+            self._session_label(minutes))[1]
+        period_start = self.cal.execution_time_from_close(period_end) - \
+            self.offset
+        return minutes.asi8 == pd.Timestamp(period_start).value
+
 
 class NotHalfDay(StatelessRule):
     """
@@ -452,6 +610,12 @@ class NotHalfDay(StatelessRule):
         return self.cal.minute_to_session_label(dt) \
             not in self.cal.early_closes
 
+    def trigger_mask(self, minutes):
+        return np.full(
+            len(minutes),
+            self._session_label(minutes) not in self.cal.early_closes,
+            dtype=bool)
+
 
 class TradingDayOfWeekRule(six.with_metaclass(ABCMeta, StatelessRule)):
     @preprocess(n=lossless_float_to_int('TradingDayOfWeekRule'))
@@ -466,6 +630,11 @@ class TradingDayOfWeekRule(six.with_metaclass(ABCMeta, StatelessRule)):
         val = self.cal.minute_to_session_label(dt, direction="none").value
         return val in self.execution_period_values
 
+    def trigger_mask(self, minutes):
+        val = self._session_label(minutes, direction="none").value
+        return np.full(len(minutes), val in self.execution_period_values,
+                       dtype=bool)
+
     @lazyval
     def execution_period_values(self):
         # calculate the list of periods that match the given criteria
@@ -513,6 +682,11 @@ class TradingDayOfMonthRule(six.with_metaclass(ABCMeta, StatelessRule)):
         value = self.cal.minute_to_session_label(dt, direction="none").value
         return value in self.execution_period_values
 
+    def trigger_mask(self, minutes):
+        value = self._session_label(minutes, direction="none").value
+        return np.full(len(minutes), value in self.execution_period_values,
+                       dtype=bool)
+
     @lazyval
     def execution_period_values(self):
         # calculate the list of periods that match the given criteria
@@ -588,6 +762,15 @@ class OncePerDay(StatefulRule):
             self.triggered = True
             return True
 
+    def trigger_mask(self, minutes):
+        # the first minute of the session the rule triggers at
+        mask = self.rule.trigger_mask(minutes)
+        if mask is None or not mask.any():
+            return mask
+        first = np.zeros(len(minutes), dtype=bool)
+        first[np.argmax(mask)] = True
+        return first
+
 
 # Factory API
 
@@ -12,6 +12,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import dis
 from functools import reduce
 from pprint import pformat
 
@@ -404,3 +405,32 @@ def foldr(f, seq, default=_no_default):
         reversed(seq),
         *(default,) if default is not _no_default else ()
     )
+
+
+def is_noop(f):
+    """Whether a function does nothing, i.e. its body is only ``pass`` (or a
+    docstring) and it returns None.
+
+    Parameters
+    ----------
+    f : callable or None
+        The function to check. None counts as a noop.
+
+    Returns
+    -------
+    noop : bool
+        False for callables that aren't plain functions.
+    """
+    if f is None:
+        return True
+    code = getattr(f, '__code__', None)
+    if code is None:
+        return False
+    ops = [
+        (ins.opname, ins.argval) for ins in dis.get_instructions(code)
+        if ins.opname not in ('RESUME', 'NOP')
+    ]
+    return ops in (
+        [('LOAD_CONST', None), ('RETURN_VALUE', None)],
+        [('RETURN_CONST', None)],
+    )
@@ -1,8 +1,12 @@
+import atexit
+import bisect
 import concurrent.futures
+import multiprocessing
 import os
-from multiprocessing import Pool
+import threading
+import time
 
-PROCESS_POOL = None
+SHARED_THREAD_POOL = None
 
 
 def _get_default_workers():
@@ -10,6 +14,111 @@ def _get_default_workers():
     return int(workers) if workers else 10
 
 
+class ThreadPool:
+    """
+    Long-lived thread pool shared by the `parallelize` calls of an algorithm,
+    so that the worker threads are not created and torn down on every call.
+
+    A map issued from one of the pool's own workers (e.g. a backend call
+    parallelized inside a parallelized `BarData.current`) runs the tasks
+    that no worker has picked up yet in the calling thread, so nested maps
+    can't deadlock on a saturated pool.
+
+    `metrics()` reports the queue depth, active workers and a histogram of
+    the task latency from submission to completion.
+    """
+
+    # upper bounds in seconds of the latency histogram buckets
+    LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, float('inf'))
+
+    def __init__(self, workers=None, name='pylivetrader'):
+        self.workers = workers if workers else _get_default_workers()
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix=name)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._active = 0
+        self._submitted = 0
+        self._completed = 0
+        self._latency_counts = [0] * len(self.LATENCY_BUCKETS)
+
+    def _submit(self, fn, args):
+        submitted_at = time.monotonic()
+
+        def call():
+            with self._lock:
+                self._queued -= 1
+                self._active += 1
+            nested = getattr(self._local, 'in_worker', False)
+            self._local.in_worker = True
+            try:
+                return fn(*args)
+            finally:
+                self._local.in_worker = nested
+                latency = time.monotonic() - submitted_at
+                bucket = bisect.bisect_left(self.LATENCY_BUCKETS, latency)
+                with self._lock:
+                    self._active -= 1
+                    self._completed += 1
+                    self._latency_counts[bucket] += 1
+
+        with self._lock:
+            self._queued += 1
+            self._submitted += 1
+        return self._executor.submit(call), call
+
+    def map(self, fn, args_list):
+        """
+        Calls fn(*args) for each args tuple in args_list.
+
+        Return: list of the results, in the order of args_list
+        """
+        tasks = [self._submit(fn, args) for args in args_list]
+        in_worker = getattr(self._local, 'in_worker', False)
+
+        results = []
+        for future, call in tasks:
+            if in_worker and future.cancel():
+                # no worker has taken it; run it here instead of waiting
+                results.append(call())
+            else:
+                results.append(future.result())
+        return results
+
+    def metrics(self):
+        """
+        Return: dict with queue_depth, active_workers, submitted, completed
+                and latency_histogram (dict[bucket upper bound -> count])
+        """
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'queue_depth': self._queued,
+                'active_workers': self._active,
+                'submitted': self._submitted,
+                'completed': self._completed,
+                'latency_histogram': dict(
+                    zip(self.LATENCY_BUCKETS, self._latency_counts)),
+            }
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+
+def set_shared_thread_pool(pool):
+    """
+    Sets the ThreadPool used by `parallelize`. None goes back to a new
+    executor for each call.
+    """
+    global SHARED_THREAD_POOL
+    SHARED_THREAD_POOL = pool
+
+
+def get_shared_thread_pool():
+    return SHARED_THREAD_POOL
+
+
 def parallelize(mapfunc, workers=None):
     """
     Parallelize the mapfunc with multithreading. mapfunc calls will be
@@ -17,18 +126,37 @@ def parallelize(mapfunc, workers=None):
     will represent one call's arguments. They can be tuples if the function
     takes multiple arguments, but one-tupling is not necessary.
 
-    If workers argument is not provided, workers will be pulled from an
+    The calls run on the shared ThreadPool if one is set (see
+    `set_shared_thread_pool`), in which case the workers argument is
+    ignored. Otherwise a new executor is created for the call, and if
+    workers argument is not provided, workers will be pulled from an
     environment variable PYLT_NUM_WORKERS. If the environment variable is not
     found, it will default to 10 workers.
 
     Return: func(args_list: list[arg]) => dict[arg -> result]
     """
-    workers = workers if workers else _get_default_workers()
+
+    def key_of(args):
+        if isinstance(args, list) or isinstance(args, dict):
+            return str(args)
+        return args
 
     def wrapper(args_list):
+        args_list = list(args_list)
+        pool = SHARED_THREAD_POOL
+        if pool is not None:
+            results = pool.map(mapfunc, [
+                args if isinstance(args, tuple) else (args,)
+                for args in args_list
+            ])
+            return {
+                key_of(args): task_result
+                for args, task_result in zip(args_list, results)
+            }
+
         result = {}
         with concurrent.futures.ThreadPoolExecutor(
-                max_workers=workers) as executor:
+                max_workers=workers or _get_default_workers()) as executor:
             tasks = {}
             for args in args_list:
                 if isinstance(args, tuple):
@@ -38,30 +166,97 @@ def parallelize(mapfunc, workers=None):
                 tasks[task] = args
 
             for task in concurrent.futures.as_completed(tasks):
-                args = tasks[task]
-                task_result = task.result()
-                if isinstance(args, list) or isinstance(args, dict):
-                    args = str(args)
-                result[args] = task_result
+                result[key_of(tasks[task])] = task.result()
         return result
 
     return wrapper
 
 
-def parallelize_with_multi_process(mapfunc, workers=10):
+class ThreadMapExecutor:
     """
-    Parallelize the mapfunc with multiprocessing. Multi-process can make better
-    use of multi-core than multi-thread
-    Attention: the mapfun and args_list must be pickled， which means the
-    mapfun can not be Closure or lambda
+    Maps on the shared ThreadPool if one is set, otherwise on a pool of
+    its own that is kept for the lifetime of the executor. Results are
+    returned as is, without any serialization.
+    """
+
+    def __init__(self, workers=None):
+        self.workers = workers
+        self._pool = None
+        self._lock = threading.Lock()
 
-    Return: func(args_list) => list[func[arg]]
+    def _get_pool(self):
+        pool = SHARED_THREAD_POOL
+        if pool is not None:
+            return pool
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPool(self.workers, name='pylivetrader-map')
+            return self._pool
+
+    def map(self, mapfunc, args_list):
+        """
+        Return: list[mapfunc(arg)] in the order of args_list
+        """
+        return self._get_pool().map(mapfunc, [(args,) for args in args_list])
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+
+
+class ProcessMapExecutor:
+    """
+    Maps on a pool of processes started with `spawn`, so the workers don't
+    inherit the threads and sockets of the parent. mapfunc, its arguments
+    and results are pickled; use `initializer` to build any heavy state,
+    such as an API client, once per worker.
     """
-    global PROCESS_POOL
-    if not PROCESS_POOL:
-        PROCESS_POOL = Pool(workers)
 
-    def wrapper(args_list):
-        return PROCESS_POOL.map(mapfunc, args_list)
+    def __init__(self, workers=None, initializer=None, initargs=()):
+        self.workers = workers if workers else _get_default_workers()
+        self._initializer = initializer
+        self._initargs = initargs
+        self._pool = None
+        self._lock = threading.Lock()
 
-    return wrapper
+    def map(self, mapfunc, args_list):
+        """
+        Return: list[mapfunc(arg)] in the order of args_list
+        """
+        with self._lock:
+            if self._pool is None:
+                self._pool = multiprocessing.get_context('spawn').Pool(
+                    self.workers, self._initializer, self._initargs)
+                atexit.register(self.shutdown)
+            pool = self._pool
+        return pool.map(mapfunc, args_list)
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+
+MAP_EXECUTORS = {
+    'thread': ThreadMapExecutor,
+    'process': ProcessMapExecutor,
+}
+
+
+def get_map_executor(mode, workers=None, **kwargs):
+    """
+    mode: 'thread' or 'process'
+
+    Return: executor with map(mapfunc, args_list) and shutdown()
+    """
+    try:
+        executor_class = MAP_EXECUTORS[mode]
+    except KeyError:
+        raise ValueError(
+            'unknown executor mode {!r}, expected one of {}'.format(
+                mode, sorted(MAP_EXECUTORS)))
+    return executor_class(workers, **kwargs)
@@ -0,0 +1,312 @@
+#
+# Copyright 2018 Alpaca
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+'''Timing spans of the order path, reported to pluggable metrics sinks.
+
+    with span('order.submit'):
+        api.submit_order(...)
+
+Spans are recorded by the tracer set with `set_tracer()`. Without one,
+`span()` returns a shared no-op context manager.
+'''
+
+import bisect
+import collections
+import socket
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import urlparse
+
+import numpy as np
+from logbook import Logger
+
+log = Logger('Tracing')
+
+
+class _NullSpan(object):
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _NullTracer(object):
+
+    sinks = ()
+
+    def span(self, name):
+        return _NULL_SPAN
+
+    def log_summary(self):
+        pass
+
+
+NULL_TRACER = _NullTracer()
+
+
+class _Span(object):
+
+    __slots__ = ('_tracer', '_name', '_started')
+
+    def __init__(self, tracer, name):
+        self._tracer = tracer
+        self._name = name
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self._tracer.record(self._name, time.perf_counter() - self._started)
+
+
+class Tracer(object):
+    '''
+    Records the duration of spans to each of the sinks.
+
+    sinks: objects with `record(name, seconds)`. Sinks with `summary()`
+           (see HistogramSink) are logged by `log_summary()`.
+    '''
+
+    def __init__(self, sinks):
+        self.sinks = list(sinks)
+
+    def span(self, name):
+        return _Span(self, name)
+
+    def record(self, name, seconds):
+        for sink in self.sinks:
+            sink.record(name, seconds)
+
+    def log_summary(self):
+        '''Logs the spans since the last summary, e.g. once a session.'''
+        for sink in self.sinks:
+            if not hasattr(sink, 'summary'):
+                continue
+            summary = sink.summary(reset=True)
+            for name in sorted(summary):
+                s = summary[name]
+                log.info(
+                    '{}: count={} mean={:.2f}ms p50={:.2f}ms p99={:.2f}ms '
+                    'max={:.2f}ms'.format(
+                        name, s['count'], s['mean'] * 1e3, s['p50'] * 1e3,
+                        s['p99'] * 1e3, s['max'] * 1e3))
+
+
+_TRACER = NULL_TRACER
+
+
+def set_tracer(tracer):
+    '''
+    Sets the Tracer recording the spans. None goes back to not recording.
+    '''
+    global _TRACER
+    _TRACER = tracer if tracer is not None else NULL_TRACER
+
+
+def get_tracer():
+    return _TRACER
+
+
+def span(name):
+    return _TRACER.span(name)
+
+
+class HistogramSink(object):
+    '''
+    Keeps the spans in memory: cumulative bucket counts for each span name,
+    and the recent samples for the percentiles of `summary()`.
+    '''
+
+    # upper bounds in seconds of the histogram buckets
+    BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+               1, 2.5, 5, 10, float('inf'))
+
+    def __init__(self, buckets=None, max_samples=10000):
+        self.buckets = tuple(buckets) if buckets else self.BUCKETS
+        self._max_samples = max_samples
+        self._lock = threading.Lock()
+        # name -> [bucket counts, sum, count]
+        self._histograms = {}
+        self._samples = {}
+
+    def record(self, name, seconds):
+        bucket = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = [
+                    [0] * len(self.buckets), 0., 0]
+                self._samples[name] = collections.deque(
+                    maxlen=self._max_samples)
+            histogram[0][bucket] += 1
+            histogram[1] += seconds
+            histogram[2] += 1
+            self._samples[name].append(seconds)
+
+    def histograms(self):
+        '''
+        return: dict of name -> (bucket counts, sum, count), counted since
+                the sink was created
+        '''
+        with self._lock:
+            return {
+                name: (list(counts), total, count)
+                for name, (counts, total, count) in self._histograms.items()
+            }
+
+    def summary(self, reset=False):
+        '''
+        return: dict of name -> dict of count, mean, p50, p90, p99 and max
+                in seconds, over the samples since the last reset
+        '''
+        with self._lock:
+            samples = {
+                name: np.array(values)
+                for name, values in self._samples.items() if values
+            }
+            if reset:
+                for values in self._samples.values():
+                    values.clear()
+        summary = {}
+        for name, values in samples.items():
+            p50, p90, p99 = np.percentile(values, [50, 90, 99])
+            summary[name] = {
+                'count': len(values),
+                'mean': values.mean(),
+                'p50': p50,
+                'p90': p90,
+                'p99': p99,
+                'max': values.max(),
+            }
+        return summary
+
+
+class StatsdSink(object):
+    '''
+    Sends each span as a statsd timer (`<prefix>.<name>:<ms>|ms`) over UDP.
+    Send errors are dropped; the metrics are not worth failing an order.
+    '''
+
+    def __init__(self, host='127.0.0.1', port=8125, prefix='pylivetrader'):
+        self._address = (host, port)
+        self._prefix = prefix
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._socket.setblocking(False)
+
+    def record(self, name, seconds):
+        payload = '{}.{}:{:.3f}|ms'.format(self._prefix, name, seconds * 1e3)
+        try:
+            self._socket.sendto(payload.encode(), self._address)
+        except OSError:
+            pass
+
+    def close(self):
+        self._socket.close()
+
+
+class _ThreadingHTTPServer(socketserver.ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class PrometheusSink(HistogramSink):
+    '''
+    HistogramSink that serves its histograms in the Prometheus text format
+    at http://<addr>:<port>/metrics once `start()` is called. Port 0 picks
+    a free port, see `port`.
+    '''
+
+    METRIC = 'pylivetrader_span_seconds'
+
+    def __init__(self, port=9100, addr='', **kwargs):
+        super().__init__(**kwargs)
+        self.addr = addr
+        self.port = port
+        self._server = None
+
+    def render(self):
+        lines = [
+            '# HELP {} Duration of the order path stages.'.format(
+                self.METRIC),
+            '# TYPE {} histogram'.format(self.METRIC),
+        ]
+        for name, (counts, total, count) in sorted(
+                self.histograms().items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                le = '+Inf' if bound == float('inf') else repr(float(bound))
+                lines.append('{}_bucket{{span="{}",le="{}"}} {}'.format(
+                    self.METRIC, name, le, cumulative))
+            lines.append('{}_sum{{span="{}"}} {!r}'.format(
+                self.METRIC, name, total))
+            lines.append('{}_count{{span="{}"}} {}'.format(
+                self.METRIC, name, count))
+        return '\n'.join(lines) + '\n'
+
+    def start(self):
+        sink = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                payload = sink.render().encode()
+                self.send_response(200)
+                self.send_header('Content-Type',
+                                 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+        self._server = _ThreadingHTTPServer((self.addr, self.port), Handler)
+        self.port = self._server.server_port
+        threading.Thread(target=self._server.serve_forever, daemon=True,
+                         name='pylivetrader-metrics').start()
+        return self
+
+    def close(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+def make_sink(spec):
+    '''
+    spec: 'memory', 'statsd://[host][:port]' or 'prometheus://[addr][:port]'
+    '''
+    url = urlparse(spec if '://' in spec else spec + '://')
+    if url.scheme == 'memory':
+        return HistogramSink()
+    if url.scheme == 'statsd':
+        return StatsdSink(url.hostname or '127.0.0.1', url.port or 8125)
+    if url.scheme == 'prometheus':
+        return PrometheusSink(
+            url.port if url.port is not None else 9100,
+            url.hostname or '').start()
+    raise ValueError('Unknown metrics sink: {}'.format(spec))
@@ -14,8 +14,25 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import atexit
+import hashlib
 import pickle
 import os
+import stat
+import struct
+import tempfile
+import threading
+import time
+import uuid
+
+from logbook import Logger
+
+import numpy as np
+
+from pylivetrader.errors import StateStoreFenced
+
+from .arrays import MappedArray, to_mappable
+from .serializers import DEFAULT_SERIALIZER
 
 try:
     import redis
@@ -25,32 +42,201 @@ except ImportError:
 VERSION_LABEL = '_stateversion_'
 CHECKSUM_KEY = '__state_checksum'
 
+log = Logger('StateStore')
+
+
+def fingerprint(blob):
+    return hashlib.blake2b(blob, digest_size=16).digest()
+
+
+def _fsync_dir(dirname):
+    try:
+        fd = os.open(dirname, os.O_RDONLY)
+    except OSError:
+        # not supported on this platform
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def atomic_write(path, data):
+    '''
+    Replaces the file at path with data, so that it holds either the old
+    or the new content after a crash: data goes to a temporary file in the
+    same directory, which is fsynced and renamed over path.
+    '''
+    dirname = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(
+        dir=dirname, prefix='.{}.'.format(os.path.basename(path)),
+        suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.exists(path):
+            os.chmod(tmp, stat.S_IMODE(os.stat(path).st_mode))
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+    _fsync_dir(dirname)
+
 
 class FileStore(object):
-    def __init__(self, path):
+    '''
+    The state is a snapshot file, plus a journal next to it holding the
+    fields changed since. The journal starts with the fingerprint of the
+    snapshot it applies to, so a journal left behind by a crash between
+    the two writes is ignored, and a record torn by a crash is dropped.
+
+    serializer: PickleSerializer or anything with dumps/loads
+    atomic: True to replace the snapshot with `atomic_write()`, False to
+            rewrite it in place
+    mmap_threshold: when set, ndarray and single dtype DataFrame fields of
+                    at least this many bytes are kept in .npy files in
+                    <path>.arrays, and memory mapped on load
+    '''
+
+    def __init__(self, path, serializer=None, atomic=True,
+                 mmap_threshold=None):
         self.path = path
+        self.journal_path = path + '.journal'
+        self.arrays_path = path + '.arrays'
+        self.serializer = serializer or DEFAULT_SERIALIZER
+        self.atomic = atomic
+        self.mmap_threshold = mmap_threshold
+
+    def write_array(self, filename, values):
+        path = os.path.join(self.arrays_path, filename)
+        if os.path.exists(path):
+            # named after the content, so already written
+            return
+        os.makedirs(self.arrays_path, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.arrays_path, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.save(f, values)
+                if self.atomic:
+                    f.flush()
+                    os.fsync(f.fileno())
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+
+    def collect_arrays(self, keep):
+        '''Removes the array files that are not in keep.'''
+        if not os.path.isdir(self.arrays_path):
+            return
+        keep = set(keep)
+        for filename in os.listdir(self.arrays_path):
+            if filename not in keep:
+                try:
+                    os.unlink(os.path.join(self.arrays_path, filename))
+                except OSError:
+                    pass
+
+    def _restore(self, value):
+        if isinstance(value, MappedArray):
+            return value.restore(self.arrays_path)
+        return value
 
     def save(self, state):
+        self.write_snapshot(self.serializer.dumps(state))
+
+    def write_snapshot(self, data):
+        header = pickle.dumps(fingerprint(data))
+        if self.atomic:
+            atomic_write(self.path, data)
+            atomic_write(self.journal_path, header)
+            return
         with open(self.path, 'wb') as f:
-            pickle.dump(state, f)
+            f.write(data)
+        with open(self.journal_path, 'wb') as f:
+            f.write(header)
+
+    def save_delta(self, changed, deleted):
+        '''
+        changed: dict[field -> pickled value]
+        deleted: list of fields
+        '''
+        with open(self.journal_path, 'ab') as f:
+            pickle.dump((changed, deleted), f)
+
+    def _read_journal(self, snapshot_fingerprint):
+        if not os.path.exists(self.journal_path):
+            return
+        with open(self.journal_path, 'rb') as f:
+            try:
+                if pickle.load(f) != snapshot_fingerprint:
+                    log.warn('ignoring stale journal {}'.format(
+                        self.journal_path))
+                    return
+                while True:
+                    yield pickle.load(f)
+            except EOFError:
+                return
+            except (pickle.UnpicklingError, IndexError, ValueError):
+                log.warn('ignoring torn record in {}'.format(
+                    self.journal_path))
 
     def load(self):
         with open(self.path, 'rb') as f:
-            try:
-                loaded_state = pickle.load(f)
-            except (pickle.UnpicklingError, IndexError):
-                raise ValueError("Corrupt state file: {}".format(self.path))
+            # writable, so that arrays restored from it are as well
+            data = bytearray(os.fstat(f.fileno()).st_size)
+            data = data[:f.readinto(data)]
+        try:
+            loaded_state = self.serializer.loads(data)
+        except (pickle.UnpicklingError, IndexError, EOFError, struct.error):
+            raise ValueError("Corrupt state file: {}".format(self.path))
+
+        for changed, deleted in self._read_journal(fingerprint(data)):
+            for k, v in changed.items():
+                loaded_state[k] = self.serializer.loads(v)
+            for k in deleted:
+                loaded_state.pop(k, None)
 
-        return loaded_state
+        return {k: self._restore(v) for k, v in loaded_state.items()}
 
     def can_load(self):
         return os.path.exists(self.path) and os.stat(self.path).st_size
 
 
 class RedisStore(object):
+    '''
+    Keeps each context field in a hash under the `algoname`, so that
+    several algorithms can share one redis, and writes the changed fields
+    with one pipelined round trip.
+
+    url: defaults to REDIS_URL, or redis://localhost:6379
+    connection_pool: redis.ConnectionPool to use instead of one for url
+    client: redis.Redis to use instead of either of the above
+    fencing: True to make the latest instance of the algorithm the only
+             one that can write. Writes WATCH an owner key that every
+             instance claims on its first save, and raise
+             StateStoreFenced once another one claimed it.
+
+    The single key of previous versions is still loaded when the hash
+    doesn't exist yet.
+    '''
+
     REDIS_STATE_KEY = 'pylivetrader_redis_state'
 
-    def __init__(self):
+    KEY_PREFIX = 'pylivetrader'
+
+    def __init__(self, algoname='algo', url=None, connection_pool=None,
+                 client=None, serializer=None, fencing=False):
         try:
             redis
         except NameError:
@@ -58,27 +244,103 @@ class RedisStore(object):
                 "Redis was not installed, please install the redis module."
             )
 
-        self.redis = redis.from_url(
-            os.getenv('REDIS_URL', 'redis://localhost:6379')
-        )
+        if client is not None:
+            self.redis = client
+        elif connection_pool is not None:
+            self.redis = redis.Redis(connection_pool=connection_pool)
+        else:
+            self.redis = redis.from_url(
+                url or os.getenv('REDIS_URL', 'redis://localhost:6379')
+            )
+        self.algoname = algoname
+        self.fields_key = '{}:{}:fields'.format(self.KEY_PREFIX, algoname)
+        self.owner_key = '{}:{}:owner'.format(self.KEY_PREFIX, algoname)
+        self.serializer = serializer or DEFAULT_SERIALIZER
+        self.fencing = fencing
+        self._token = uuid.uuid4().hex.encode() if fencing else None
+        self._claimed = False
 
     def save(self, state):
-        self.redis.set(self.REDIS_STATE_KEY, pickle.dumps(state))
+        self.write_fields(
+            {k: self.serializer.dumps(v) for k, v in state.items()})
+
+    def write_fields(self, blobs):
+        '''Replaces all the fields with blobs (dict[field -> bytes]).'''
+        def write(pipe):
+            pipe.delete(self.fields_key)
+            for k, v in blobs.items():
+                pipe.hset(self.fields_key, k, v)
+
+        if self.fencing and not self._claimed:
+            self.redis.set(self.owner_key, self._token)
+            self._claimed = True
+        self._write(write)
+
+    def save_delta(self, changed, deleted):
+        def write(pipe):
+            for k, v in changed.items():
+                pipe.hset(self.fields_key, k, v)
+            if deleted:
+                pipe.hdel(self.fields_key, *deleted)
+
+        self._write(write)
+
+    def _write(self, write):
+        with self.redis.pipeline() as pipe:
+            if self.fencing:
+                pipe.watch(self.owner_key)
+                if pipe.get(self.owner_key) != self._token:
+                    raise StateStoreFenced(algoname=self.algoname)
+                pipe.multi()
+            write(pipe)
+            try:
+                pipe.execute()
+            except redis.WatchError:
+                raise StateStoreFenced(algoname=self.algoname)
 
     def load(self):
+        fields = self.redis.hgetall(self.fields_key)
+        if not fields:
+            return self._load_legacy()
+        try:
+            return {k.decode(): self.serializer.loads(v)
+                    for k, v in fields.items()}
+        except (pickle.UnpicklingError, IndexError, EOFError, struct.error):
+            raise ValueError("Corrupt state in redis: {}".format(
+                self.fields_key))
+
+    def _load_legacy(self):
         try:
-            loaded_state = pickle.loads(self.redis.get(self.REDIS_STATE_KEY))
-            return loaded_state
+            return self.serializer.loads(self.redis.get(self.REDIS_STATE_KEY))
         except pickle.UnpicklingError:
             raise ValueError("Corrupt state file in redis")
 
     def can_load(self):
-        return self.redis.exists(self.REDIS_STATE_KEY)
+        return self.redis.exists(self.fields_key) or \
+            self.redis.exists(self.REDIS_STATE_KEY)
 
 
 class StateStore:
+    '''
+    Saves the context fields to the storage engine.
+
+    When the engine supports `save_delta()`, each field is fingerprinted
+    and only the ones changed since the last save are written. Once the
+    deltas outweigh `compact_ratio` times the snapshot, a full snapshot is
+    written instead, which also discards them. The first save after
+    startup is always a snapshot. Engines with `write_fields()` keep each
+    field under its own key and have nothing to compact.
 
-    def __init__(self, path=None, storage_engine=None):
+    With write_behind, `save()` only takes the field references and a
+    background thread pickles and writes them. Snapshots that arrive while
+    one is being written replace each other, so only the latest is
+    written. The caller must not mutate the context until
+    `wait_serialized()` returns; `flush()` waits until everything is
+    written.
+    '''
+
+    def __init__(self, path=None, storage_engine=None, compact_ratio=1.,
+                 write_behind=False):
         if path:
             self.storage_engine = FileStore(path)
         elif storage_engine:
@@ -86,6 +348,34 @@ class StateStore:
         else:
             raise ValueError("path or storage_engine arg is required")
 
+        self.compact_ratio = compact_ratio
+        self._fingerprints = None
+        self._snapshot_size = 0
+        self._delta_size = 0
+
+        self.write_behind = write_behind
+        self._cond = threading.Condition()
+        self._pending = None
+        self._serializing = False
+        self._busy = False
+        self._stopped = False
+        self._unpersisted_since = None
+        self._saves = 0
+        self._persisted = 0
+        self._coalesced = 0
+        self._errors = 0
+        self._last_lag = None
+        self._worker = None
+        if write_behind:
+            if not hasattr(self.storage_engine, 'save_delta'):
+                raise ValueError(
+                    "write_behind needs a storage engine with save_delta")
+            self._worker = threading.Thread(
+                target=self._run_worker, daemon=True,
+                name='pylivetrader-state-writer')
+            self._worker.start()
+            atexit.register(self.close)
+
     def save(self, context, checksum, exclude_list):
         state = {}
         fields_to_store = list(set(context.__dict__.keys()) -
@@ -96,7 +386,178 @@ class StateStore:
 
         state[CHECKSUM_KEY] = checksum
 
-        self.storage_engine.save(state)
+        if not hasattr(self.storage_engine, 'save_delta'):
+            self.storage_engine.save(state)
+            return
+
+        if not self.write_behind:
+            job = self._serialize(state)
+            if job is not None:
+                self._persist(job)
+            return
+
+        with self._cond:
+            now = time.time()
+            self._saves += 1
+            if self._pending is not None:
+                self._coalesced += 1
+            if self._unpersisted_since is None:
+                self._unpersisted_since = now
+            self._pending = state
+            self._cond.notify_all()
+
+    def _serialize(self, state):
+        '''
+        Pickles what needs to be written.
+
+        return: snapshot or delta job for `_persist()`, None if nothing
+                changed
+        '''
+        serializer = getattr(
+            self.storage_engine, 'serializer', DEFAULT_SERIALIZER)
+        threshold = getattr(self.storage_engine, 'mmap_threshold', None)
+
+        # large arrays go to their own files, and the pickled state only
+        # refers to them
+        arrays = {}
+        if threshold is not None:
+            state = dict(state)
+            for k, v in state.items():
+                mapped = to_mappable(k, v, threshold)
+                if mapped is not None:
+                    state[k], arrays[k] = mapped
+
+        blobs = {k: serializer.dumps(v) for k, v in state.items()}
+        fingerprints = {k: fingerprint(v) for k, v in blobs.items()}
+        # the array files count, so that the files deltas supersede are
+        # collected by the snapshot they bring about
+        size = sum(len(v) for v in blobs.values()) + \
+            sum(v.nbytes for v in arrays.values())
+
+        previous = self._fingerprints or {}
+        changed = {k: blobs[k] for k in blobs
+                   if previous.get(k) != fingerprints[k]}
+        deleted = [k for k in previous if k not in blobs]
+        if self._fingerprints is not None and not changed and not deleted:
+            return None
+
+        new_arrays = {
+            state[k].filename: np.array(v, copy=self.write_behind)
+            for k, v in arrays.items() if k in changed
+        }
+        keep = [state[k].filename for k in arrays]
+
+        delta_size = sum(len(v) for v in changed.values()) + \
+            sum(v.nbytes for v in new_arrays.values())
+        if hasattr(self.storage_engine, 'write_fields'):
+            # fields are overwritten in place, nothing to compact
+            if self._fingerprints is None:
+                return 'fields', blobs, size, fingerprints, new_arrays, keep
+        elif self._fingerprints is None or \
+                self._delta_size + delta_size > \
+                self.compact_ratio * self._snapshot_size:
+            return ('snapshot', serializer.dumps(state), size, fingerprints,
+                    new_arrays, keep)
+        return ('delta', (changed, deleted), delta_size, fingerprints,
+                new_arrays, keep)
+
+    def _persist(self, job):
+        kind, payload, size, fingerprints, arrays, keep = job
+        for filename, values in arrays.items():
+            self.storage_engine.write_array(filename, values)
+        if kind == 'fields':
+            self.storage_engine.write_fields(payload)
+        elif kind == 'snapshot':
+            self.storage_engine.write_snapshot(payload)
+            self._snapshot_size = size
+            self._delta_size = 0
+            if hasattr(self.storage_engine, 'collect_arrays'):
+                self.storage_engine.collect_arrays(keep)
+        else:
+            try:
+                self.storage_engine.save_delta(*payload)
+            except Exception:
+                # a partial record may have been written; start over
+                self._fingerprints = None
+                raise
+            self._delta_size += size
+        self._fingerprints = fingerprints
+
+    def _run_worker(self):
+        while True:
+            with self._cond:
+                while self._pending is None and not self._stopped:
+                    self._cond.wait()
+                if self._pending is None:
+                    return
+                state, self._pending = self._pending, None
+                taken_at = self._unpersisted_since
+                self._serializing = self._busy = True
+
+            try:
+                try:
+                    job = self._serialize(state)
+                finally:
+                    del state
+                    with self._cond:
+                        self._serializing = False
+                        self._cond.notify_all()
+                if job is not None:
+                    self._persist(job)
+                with self._cond:
+                    self._persisted += 1
+                    self._last_lag = time.time() - taken_at
+                    if self._pending is None:
+                        self._unpersisted_since = None
+            except Exception as e:
+                log.exception('could not save state: {}'.format(e))
+                with self._cond:
+                    self._errors += 1
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self._cond.notify_all()
+
+    def wait_serialized(self, timeout=None):
+        '''Waits until the worker no longer reads the saved context.'''
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: self._pending is None and not self._serializing,
+                timeout)
+
+    def flush(self, timeout=None):
+        '''Waits until the saved state is written.'''
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: self._pending is None and not self._busy, timeout)
+
+    def close(self):
+        if self._worker is None:
+            return
+        self.flush()
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        self._worker.join()
+        self._worker = None
+
+    def metrics(self):
+        '''
+        Return: dict with saves, persisted, coalesced and errors counts,
+                lag (seconds the oldest unwritten save has waited, 0 when
+                everything is written) and last_lag (seconds from save to
+                written of the last write)
+        '''
+        with self._cond:
+            since = self._unpersisted_since
+            return {
+                'saves': self._saves,
+                'persisted': self._persisted,
+                'coalesced': self._coalesced,
+                'errors': self._errors,
+                'lag': time.time() - since if since is not None else 0.,
+                'last_lag': self._last_lag,
+            }
 
     def load(self, context, checksum):
         if not self.storage_engine.can_load():
@@ -115,3 +576,6 @@ class StateStore:
 
         for k, v in loaded_state.items():
             setattr(context, k, v)
+
+        # the next save rewrites the snapshot
+        self._fingerprints = None
@@ -0,0 +1,77 @@
+#
+# Copyright 2018 Alpaca
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+
+# dtype kinds that np.save writes as raw data
+MAPPABLE_KINDS = 'biufcmM'
+
+
+class MappedArray(object):
+    '''
+    Stands in for an ndarray or DataFrame field in the pickled state. The
+    data is in a .npy file next to the state file, named after its
+    fingerprint, so a file is never rewritten once it exists.
+
+    kind: 'array' or 'frame'
+    meta: None for arrays, (index, columns) for frames
+    '''
+
+    def __init__(self, filename, kind, meta=None):
+        self.filename = filename
+        self.kind = kind
+        self.meta = meta
+
+    def restore(self, dirname):
+        '''
+        Maps the file copy-on-write: pages are read when first touched,
+        and writes to the restored value stay in memory.
+        '''
+        values = np.load(os.path.join(dirname, self.filename), mmap_mode='c')
+        if self.kind == 'frame':
+            index, columns = self.meta
+            return pd.DataFrame(values, index=index, columns=columns,
+                                copy=False)
+        return values
+
+
+def to_mappable(field, value, threshold):
+    '''
+    return: tuple(MappedArray, ndarray to write) when value is an ndarray,
+            or a DataFrame of a single numeric dtype, of at least
+            threshold bytes. None otherwise.
+    '''
+    if type(value) in (np.ndarray, np.memmap):
+        kind, meta, values = 'array', None, value
+    elif isinstance(value, pd.DataFrame) and len(set(value.dtypes)) == 1:
+        kind, meta = 'frame', (value.index, value.columns)
+        values = value.values
+    else:
+        return None
+
+    if values.dtype.kind not in MAPPABLE_KINDS or values.nbytes < threshold:
+        return None
+
+    values = np.ascontiguousarray(values)
+    h = hashlib.blake2b(digest_size=16)
+    h.update(pickle.dumps((kind, meta, values.dtype.str, values.shape)))
+    h.update(values.reshape(-1).view(np.uint8))
+    filename = '{}-{}.npy'.format(field, h.hexdigest())
+    return MappedArray(filename, kind, meta), values
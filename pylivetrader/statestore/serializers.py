@@ -0,0 +1,160 @@
+#
+# Copyright 2018 Alpaca
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pickle
+import struct
+
+try:
+    # the protocol 5 backport for python < 3.8
+    import pickle5
+except ImportError:
+    pickle5 = pickle if pickle.HIGHEST_PROTOCOL >= 5 else None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
+
+MAGIC = b'PLTS'
+VERSION = 1
+
+_HEADER = struct.Struct('<4sBBI')
+_LENGTH = struct.Struct('<Q')
+
+
+def _zstd():
+    return (zstandard.ZstdCompressor().compress,
+            zstandard.ZstdDecompressor().decompress)
+
+
+def _lz4():
+    return lz4_frame.compress, lz4_frame.decompress
+
+
+# codec id in the header -> (name, module, factory)
+CODECS = {
+    1: ('zstd', zstandard, _zstd),
+    2: ('lz4', lz4_frame, _lz4),
+}
+
+
+class PickleSerializer(object):
+    '''
+    Pickles the state for the storage engines.
+
+    protocol: pickle protocol, defaults to the highest available. With 5
+              (python 3.8+, or the pickle5 package), numpy and pandas
+              buffers are taken out of band, so they are not copied into
+              the pickle stream and are restored from the read buffer
+              without a copy when uncompressed.
+    compression: None, 'zstd' (zstandard package) or 'lz4' (lz4 package)
+
+    Output other than plain pickle is framed with a small header, and
+    `loads()` reads plain pickles as well, so states written before stay
+    readable.
+    '''
+
+    def __init__(self, protocol=None, compression=None):
+        if protocol is None:
+            protocol = 5 if pickle5 is not None else pickle.HIGHEST_PROTOCOL
+        if protocol >= 5 and pickle5 is None:
+            raise ValueError(
+                "pickle protocol 5 needs python 3.8 or the pickle5 module.")
+        self.protocol = protocol
+
+        self.codec = 0
+        self._compress = None
+        if compression is not None:
+            for codec, (name, module, factory) in CODECS.items():
+                if name == compression:
+                    break
+            else:
+                raise ValueError(
+                    "Unknown compression: {}".format(compression))
+            if module is None:
+                raise ValueError(
+                    "{} was not installed, please install the module.".format(
+                        compression))
+            self.codec = codec
+            self._compress = factory()[0]
+
+    def dumps(self, obj):
+        buffers = []
+        if self.protocol >= 5:
+            data = pickle5.dumps(
+                obj, protocol=self.protocol, buffer_callback=buffers.append)
+            buffers = [b.raw() for b in buffers]
+        else:
+            data = pickle.dumps(obj, protocol=self.protocol)
+
+        if not buffers and not self.codec:
+            return data
+
+        chunks = [data] + buffers
+        if self.codec:
+            chunks = [self._compress(c) for c in chunks]
+        header = _HEADER.pack(MAGIC, VERSION, self.codec, len(buffers))
+        lengths = b''.join(_LENGTH.pack(len(c)) for c in chunks)
+        return b''.join([header, lengths] + chunks)
+
+    def loads(self, data):
+        '''
+        data: bytes-like. Out of band buffers are restored as views of
+              it, so pass a bytearray for writable arrays.
+        '''
+        view = memoryview(data)
+        if bytes(view[:len(MAGIC)]) != MAGIC:
+            return pickle.loads(data)
+
+        _, version, codec, num_buffers = _HEADER.unpack_from(view)
+        if version != VERSION:
+            raise pickle.UnpicklingError(
+                "Unknown state format version {}".format(version))
+        if num_buffers and not codec and view.readonly:
+            view = memoryview(bytearray(view))
+
+        offset = _HEADER.size
+        chunks = []
+        lengths = [_LENGTH.unpack_from(view, offset + i * _LENGTH.size)[0]
+                   for i in range(num_buffers + 1)]
+        offset += len(lengths) * _LENGTH.size
+        for length in lengths:
+            chunks.append(view[offset:offset + length])
+            offset += length
+
+        if codec:
+            name, module, factory = CODECS.get(codec, (None, None, None))
+            if module is None:
+                raise ValueError(
+                    "{} was not installed, please install the module.".format(
+                        name or 'codec {}'.format(codec)))
+            decompress = factory()[1]
+            chunks = [bytearray(decompress(c)) for c in chunks]
+
+        if num_buffers:
+            if pickle5 is None:
+                raise ValueError(
+                    "pickle protocol 5 needs python 3.8 or the pickle5 "
+                    "module.")
+            return pickle5.loads(chunks[0], buffers=chunks[1:])
+        return pickle.loads(chunks[0])
+
+
+DEFAULT_SERIALIZER = PickleSerializer()
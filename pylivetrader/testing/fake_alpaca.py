@@ -0,0 +1,654 @@
+#
+# Copyright 2018 Alpaca
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+'''A local stand-in for the Alpaca trading and market data APIs.
+
+One port serves the REST endpoints that the alpaca backend uses, the
+trade update stream (`/stream`) and the market data stream
+(`/v2/<feed>`), plus `GET /_stats` and `POST /_reset` for the request
+counts (see FakeAlpacaServer.stats()). Every REST request waits
+`latency` seconds, give or take `jitter`, and answers 429 past
+`rate_limit` requests per minute.
+
+    server = FakeAlpacaServer(symbols=500, latency=0.02, jitter=0.005)
+    server.start()
+    os.environ.update(server.environ())
+    backend = alpaca.Backend('key-id', 'secret-key', server.url)
+
+Or in a separate process, printing its url on the first line:
+
+    python -m pylivetrader.testing.fake_alpaca --symbols 500 --latency 0.02
+'''
+
+import argparse
+import asyncio
+import collections
+import itertools
+import json
+import random
+import threading
+import uuid
+
+import msgpack
+import numpy as np
+import pandas as pd
+from aiohttp import web, WSMsgType
+from trading_calendars import get_calendar
+
+from pylivetrader.backend.alpaca_async import TokenBucket
+
+from logbook import Logger
+
+log = Logger('FakeAlpaca')
+
+NY = 'America/New_York'
+NS_PER_MINUTE = 60 * 10 ** 9
+# the page size of the bars endpoint, without and with `limit`
+DEFAULT_PAGE_LIMIT = 1000
+MAX_PAGE_LIMIT = 10000
+
+
+def _iso(ns):
+    return pd.Timestamp(ns, tz='UTC').strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+
+
+def _error(status, code, message):
+    return web.json_response(
+        {'code': code, 'message': message}, status=status)
+
+
+class FakeAlpacaServer:
+    '''
+    Serves `symbols` tradable assets ('S0000', 'S0001', ...) whose prices
+    are a deterministic function of the symbol and the minute, so the
+    bars, latest trades and fills agree with each other.
+
+    Market orders, and limit orders at a better price than the current
+    one, fill `fill_delay` seconds after they are accepted, with a `new`
+    then a `fill` trade update. Other orders stay open until canceled.
+
+    symbols: the number of assets
+    latency: mean seconds before answering a REST request
+    jitter: standard deviation of that wait
+    rate_limit: REST requests per minute on the trading API, None for no
+                limit. The data API has its own `data_rate_limit`.
+    fill_delay: seconds from accepting an order to filling it, defaults
+                to latency
+    stream_interval: seconds between the trades pushed on the data stream
+    '''
+
+    def __init__(self, symbols=100, latency=0., jitter=0., rate_limit=None,
+                 data_rate_limit=None, cash=1e6, fill_delay=None,
+                 stream_interval=1., seed=None, host='127.0.0.1', port=0):
+        self.symbols = ['S{:04d}'.format(i) for i in range(symbols)]
+        self._index = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self._base_prices = 10. + np.arange(symbols) % 490
+        self.latency = latency
+        self.jitter = jitter
+        self.fill_delay = latency if fill_delay is None else fill_delay
+        self.stream_interval = stream_interval
+        self.host = host
+        self.port = port
+        self._rate_limit = rate_limit
+        self._data_rate_limit = data_rate_limit
+        self._random = random.Random(seed)
+        self._cash = cash
+
+        cal = get_calendar('NYSE')
+        # bars are labeled by their start, a minute before the calendar's
+        self._minute_starts = cal.all_minutes.asi8 - NS_PER_MINUTE
+        sessions = cal.all_sessions
+        self._session_starts = sessions.tz_localize(None).tz_localize(
+            NY).tz_convert('UTC').asi8
+
+        self.reset()
+        self._loop = None
+        self._runner = None
+        self._thread = None
+        self._trade_clients = set()
+
+    def reset(self):
+        '''Clears the request counts, the orders and the positions.'''
+        self.requests = collections.Counter()
+        self.rate_limited = collections.Counter()
+        self._buckets = {
+            'trading': TokenBucket(self._rate_limit)
+            if self._rate_limit else None,
+            'data': TokenBucket(self._data_rate_limit)
+            if self._data_rate_limit else None,
+        }
+        self.cash = self._cash
+        self.orders = collections.OrderedDict()
+        self._by_client_id = {}
+        # symbol -> [qty, cost]
+        self.positions = {}
+        self._trade_ids = itertools.count(1)
+
+    def stats(self):
+        '''
+        return: dict of the request counts by route, the 429 answers by
+                route, and the orders submitted and filled
+        '''
+        return {
+            'requests': dict(self.requests),
+            'rate_limited': dict(self.rate_limited),
+            'orders': len(self.orders),
+            'fills': sum(o['status'] == 'filled'
+                         for o in self.orders.values()),
+        }
+
+    @property
+    def url(self):
+        return 'http://{}:{}'.format(self.host, self.port)
+
+    def environ(self):
+        '''The environment variables pointing the alpaca data clients
+        here.'''
+        return {
+            'APCA_API_BASE_URL': self.url,
+            'APCA_API_DATA_URL': self.url,
+            'APCA_API_STREAM_URL': self.url,
+        }
+
+    # prices
+
+    def _prices(self, indexes, ns):
+        '''Prices of the symbols at indexes (array) at the times ns
+        (array), as a (symbols, times) array.'''
+        minutes = np.asarray(ns, dtype=np.int64) // NS_PER_MINUTE
+        phase = minutes[None, :] / 37. + np.asarray(indexes)[:, None]
+        return self._base_prices[indexes][:, None] * (
+            1 + 0.02 * np.sin(phase))
+
+    def _price(self, symbol, ns=None):
+        ns = pd.Timestamp.utcnow().value if ns is None else ns
+        return float(self._prices([self._index[symbol]], [ns])[0, 0])
+
+    # the app
+
+    def make_app(self):
+        app = web.Application(middlewares=[self._middleware])
+        app.router.add_routes([
+            web.get('/v2/account', self._account),
+            web.get('/v2/assets', self._assets),
+            web.get('/v2/positions', self._positions),
+            web.get('/v2/positions/{symbol}', self._position),
+            web.get('/v2/orders', self._list_orders),
+            web.post('/v2/orders', self._submit_order),
+            web.get('/v2/orders:by_client_order_id', self._order_by_client_id),
+            web.get('/v2/orders/{order_id}', self._get_order),
+            web.delete('/v2/orders/{order_id}', self._cancel_order),
+            web.get('/v2/stocks/bars', self._bars),
+            web.get('/v2/stocks/trades/latest', self._latest_trades),
+            web.get('/v2/stocks/{symbol}/trades/latest', self._latest_trade),
+            web.get('/stream', self._trade_stream),
+            web.get('/stream/', self._trade_stream),
+            web.get('/v2/iex', self._data_stream),
+            web.get('/v2/sip', self._data_stream),
+            web.get('/_stats', self._stats),
+            web.post('/_reset', self._reset),
+        ])
+        return app
+
+    @web.middleware
+    async def _middleware(self, request, handler):
+        route = request.match_info.route.resource
+        if route is None or request.path.startswith(('/_', '/stream',
+                                                     '/v2/iex', '/v2/sip')):
+            return await handler(request)
+
+        name = '{} {}'.format(request.method, route.canonical)
+        self.requests[name] += 1
+        bucket = self._buckets[
+            'data' if request.path.startswith('/v2/stocks') else 'trading']
+        wait = bucket.try_acquire() if bucket is not None else 0
+        if self.latency or self.jitter:
+            await asyncio.sleep(max(
+                0., self._random.gauss(self.latency, self.jitter)))
+        if wait:
+            self.rate_limited[name] += 1
+            response = _error(429, 42910000, 'rate limit exceeded')
+            response.headers['Retry-After'] = str(int(np.ceil(wait)))
+            return response
+        return await handler(request)
+
+    async def _stats(self, request):
+        return web.json_response(self.stats())
+
+    async def _reset(self, request):
+        self.reset()
+        return web.Response(status=204)
+
+    # trading api
+
+    def _positions_value(self):
+        return sum(qty * self._price(symbol)
+                   for symbol, (qty, _) in self.positions.items())
+
+    async def _account(self, request):
+        value = self._positions_value()
+        return web.json_response({
+            'id': 'fake-account',
+            'status': 'ACTIVE',
+            'currency': 'USD',
+            'cash': str(self.cash),
+            'portfolio_value': str(self.cash + value),
+            'equity': str(self.cash + value),
+            'long_market_value': str(value),
+            'buying_power': str(max(0., self.cash + value) * 2),
+            'pattern_day_trader': False,
+            'trading_blocked': False,
+        })
+
+    async def _assets(self, request):
+        return web.json_response([{
+            'id': 'asset-{}'.format(symbol),
+            'class': 'us_equity',
+            'exchange': 'NASDAQ',
+            'symbol': symbol,
+            'name': symbol,
+            'status': 'active',
+            'tradable': True,
+            'marginable': True,
+            'shortable': True,
+            'easy_to_borrow': True,
+            'fractionable': False,
+        } for symbol in self.symbols])
+
+    def _position_entity(self, symbol):
+        qty, cost = self.positions[symbol]
+        price = self._price(symbol)
+        return {
+            'asset_id': 'asset-{}'.format(symbol),
+            'symbol': symbol,
+            'exchange': 'NASDAQ',
+            'asset_class': 'us_equity',
+            'qty': str(qty),
+            'side': 'long' if qty > 0 else 'short',
+            'avg_entry_price': str(cost / qty),
+            'cost_basis': str(cost),
+            'current_price': str(price),
+            'market_value': str(qty * price),
+        }
+
+    async def _positions(self, request):
+        return web.json_response(
+            [self._position_entity(symbol) for symbol in self.positions])
+
+    async def _position(self, request):
+        symbol = request.match_info['symbol']
+        if symbol not in self.positions:
+            return _error(404, 40410000, 'position does not exist')
+        return web.json_response(self._position_entity(symbol))
+
+    async def _list_orders(self, request):
+        status = request.query.get('status', 'open')
+        limit = int(request.query.get('limit') or 50)
+        until = request.query.get('until')
+        until = pd.Timestamp(until).value if until else None
+        orders = []
+        for order in reversed(self.orders.values()):
+            is_open = order['status'] in ('new', 'accepted')
+            if status == 'open' and not is_open or \
+                    status == 'closed' and is_open:
+                continue
+            if until is not None and order['_submitted'] >= until:
+                continue
+            orders.append(order)
+            if len(orders) >= limit:
+                break
+        return web.json_response([self._public(o) for o in orders])
+
+    @staticmethod
+    def _public(order):
+        return {k: v for k, v in order.items() if not k.startswith('_')}
+
+    async def _submit_order(self, request):
+        params = await request.json()
+        symbol = params.get('symbol')
+        if symbol not in self._index:
+            return _error(422, 40010001,
+                          'asset "{}" not found'.format(symbol))
+        client_order_id = params.get('client_order_id') or uuid.uuid4().hex
+        if client_order_id in self._by_client_id:
+            return _error(422, 40010001, 'client_order_id must be unique')
+        try:
+            qty = int(float(params['qty']))
+        except (KeyError, TypeError, ValueError):
+            qty = 0
+        if qty <= 0 or params.get('side') not in ('buy', 'sell'):
+            return _error(422, 40010001, 'invalid order')
+
+        now = pd.Timestamp.utcnow().value
+        order = {
+            'id': uuid.uuid4().hex,
+            'client_order_id': client_order_id,
+            'created_at': _iso(now),
+            'updated_at': _iso(now),
+            'submitted_at': _iso(now),
+            'filled_at': None,
+            'expired_at': None,
+            'canceled_at': None,
+            'failed_at': None,
+            'asset_id': 'asset-{}'.format(symbol),
+            'symbol': symbol,
+            'asset_class': 'us_equity',
+            'qty': str(qty),
+            'filled_qty': '0',
+            'filled_avg_price': None,
+            'order_class': '',
+            'order_type': params.get('type', 'market'),
+            'type': params.get('type', 'market'),
+            'side': params['side'],
+            'time_in_force': params.get('time_in_force', 'day'),
+            'limit_price': params.get('limit_price'),
+            'stop_price': params.get('stop_price'),
+            'status': 'accepted',
+            'extended_hours': False,
+            '_submitted': now,
+        }
+        self.orders[order['id']] = order
+        self._by_client_id[client_order_id] = order
+        asyncio.ensure_future(self._accept(order))
+        return web.json_response(self._public(order))
+
+    async def _accept(self, order):
+        if self.fill_delay:
+            await asyncio.sleep(self.fill_delay)
+        if order['status'] != 'accepted':
+            return
+        order['status'] = 'new'
+        await self._trade_update('new', order)
+
+        price = self._price(order['symbol'])
+        buy = order['side'] == 'buy'
+        limit = order['limit_price']
+        if order['stop_price'] is not None or limit is not None and (
+                price > float(limit) if buy else price < float(limit)):
+            return
+
+        qty = int(order['qty'])
+        signed = qty if buy else -qty
+        held, cost = self.positions.get(order['symbol'], (0, 0.))
+        held += signed
+        cost += signed * price
+        if held:
+            self.positions[order['symbol']] = (held, cost)
+        else:
+            self.positions.pop(order['symbol'], None)
+        self.cash -= signed * price
+
+        now = _iso(pd.Timestamp.utcnow().value)
+        order.update(status='filled', filled_at=now, updated_at=now,
+                     filled_qty=str(qty), filled_avg_price=str(price))
+        await self._trade_update('fill', order, price=str(price),
+                                 qty=str(qty), position_qty=str(held))
+
+    async def _order_by_client_id(self, request):
+        order = self._by_client_id.get(
+            request.query.get('client_order_id'))
+        if order is None:
+            return _error(404, 40410000, 'order not found')
+        return web.json_response(self._public(order))
+
+    async def _get_order(self, request):
+        order = self.orders.get(request.match_info['order_id'])
+        if order is None:
+            return _error(404, 40410000, 'order not found')
+        return web.json_response(self._public(order))
+
+    async def _cancel_order(self, request):
+        order = self.orders.get(request.match_info['order_id'])
+        if order is None:
+            return _error(404, 40410000, 'order not found')
+        if order['status'] not in ('new', 'accepted'):
+            return _error(422, 42210000, 'order is not cancelable')
+        now = _iso(pd.Timestamp.utcnow().value)
+        order.update(status='canceled', canceled_at=now, updated_at=now)
+        await self._trade_update('canceled', order)
+        return web.Response(status=204)
+
+    async def _trade_update(self, event, order, **fields):
+        if not self._trade_clients:
+            return
+        data = dict(fields, event=event, order=self._public(order),
+                    timestamp=order['updated_at'])
+        message = json.dumps({'stream': 'trade_updates', 'data': data})
+        for ws in list(self._trade_clients):
+            try:
+                await ws.send_str(message)
+            except ConnectionError:
+                self._trade_clients.discard(ws)
+
+    async def _trade_stream(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        try:
+            async for msg in ws:
+                if msg.type != WSMsgType.TEXT:
+                    continue
+                action = json.loads(msg.data).get('action')
+                if action == 'authenticate':
+                    await ws.send_str(json.dumps({
+                        'stream': 'authorization',
+                        'data': {'status': 'authorized',
+                                 'action': 'authenticate'},
+                    }))
+                elif action == 'listen':
+                    self._trade_clients.add(ws)
+                    await ws.send_str(json.dumps({
+                        'stream': 'listening',
+                        'data': {'streams': ['trade_updates']},
+                    }))
+        finally:
+            self._trade_clients.discard(ws)
+        return ws
+
+    # market data api
+
+    def _symbols(self, request):
+        return [s for s in request.query.get('symbols', '').split(',')
+                if s in self._index]
+
+    async def _bars(self, request):
+        query = request.query
+        symbols = sorted(self._symbols(request))
+        daily = 'Day' in query.get('timeframe', '1Min')
+        starts = self._session_starts if daily else self._minute_starts
+        lo = pd.Timestamp(query['start'])
+        hi = pd.Timestamp(query.get('end') or pd.Timestamp.utcnow())
+        labels = starts[
+            starts.searchsorted(
+                (lo.tz_localize('UTC') if lo.tz is None else lo).value):
+            starts.searchsorted(
+                (hi.tz_localize('UTC') if hi.tz is None else hi).value,
+                side='right')]
+
+        # the bars are paged through symbol by symbol, like the real api
+        limit = min(int(query.get('limit') or DEFAULT_PAGE_LIMIT),
+                    MAX_PAGE_LIMIT)
+        offset = int(query.get('page_token') or 0)
+        total = len(symbols) * len(labels)
+        stop = min(offset + limit, total)
+        bars = {}
+        if stop > offset:
+            first, last = offset // len(labels), (stop - 1) // len(labels)
+            page = symbols[first:last + 1]
+            times = [_iso(ns) for ns in labels]
+            close = self._prices([self._index[s] for s in page], labels)
+            for row, symbol in enumerate(page):
+                a = max(offset - (first + row) * len(labels), 0)
+                b = min(stop - (first + row) * len(labels), len(labels))
+                c = close[row]
+                bars[symbol] = [{
+                    't': times[i], 'o': c[i - 1] if i else c[i],
+                    'h': c[i] * 1.001, 'l': c[i] * 0.999, 'c': c[i],
+                    'v': 1000, 'n': 10, 'vw': c[i],
+                } for i in range(a, b)]
+        return web.json_response({
+            'bars': bars,
+            'next_page_token': str(stop) if stop < total else None,
+        })
+
+    def _trade(self, symbol, ns):
+        return {
+            't': _iso(ns), 'x': 'V', 'p': self._price(symbol, ns), 's': 100,
+            'c': ['@'], 'i': next(self._trade_ids), 'z': 'C',
+        }
+
+    async def _latest_trades(self, request):
+        now = pd.Timestamp.utcnow().value
+        return web.json_response({'trades': {
+            symbol: self._trade(symbol, now)
+            for symbol in self._symbols(request)
+        }})
+
+    async def _latest_trade(self, request):
+        symbol = request.match_info['symbol']
+        if symbol not in self._index:
+            return _error(404, 40410000, 'symbol not found')
+        return web.json_response({
+            'symbol': symbol,
+            'trade': self._trade(symbol, pd.Timestamp.utcnow().value),
+        })
+
+    async def _data_stream(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        await ws.send_bytes(msgpack.packb(
+            [{'T': 'success', 'msg': 'connected'}]))
+        subscribed = set()
+        pusher = asyncio.ensure_future(self._push_data(ws, subscribed))
+        try:
+            async for msg in ws:
+                if msg.type != WSMsgType.BINARY:
+                    continue
+                msg = msgpack.unpackb(msg.data)
+                if msg.get('action') == 'auth':
+                    await ws.send_bytes(msgpack.packb(
+                        [{'T': 'success', 'msg': 'authenticated'}]))
+                elif msg.get('action') == 'subscribe':
+                    subscribed.update(
+                        s for s in msg.get('bars', []) if s in self._index)
+                    await ws.send_bytes(msgpack.packb([{
+                        'T': 'subscription',
+                        'trades': sorted(subscribed),
+                        'quotes': [],
+                        'bars': sorted(subscribed),
+                    }]))
+        finally:
+            pusher.cancel()
+        return ws
+
+    async def _push_data(self, ws, subscribed):
+        '''Pushes a trade of every subscribed symbol each
+        stream_interval, and their bars when a minute ends.'''
+        minute = pd.Timestamp.utcnow().value // NS_PER_MINUTE
+        while not ws.closed:
+            await asyncio.sleep(self.stream_interval)
+            now = pd.Timestamp.utcnow().value
+            symbols = sorted(subscribed)
+            if not symbols:
+                continue
+            msgs = []
+            if now // NS_PER_MINUTE > minute:
+                start = minute * NS_PER_MINUTE
+                minute = now // NS_PER_MINUTE
+                for symbol in symbols:
+                    price = self._price(symbol, start)
+                    msgs.append({
+                        'T': 'b', 'S': symbol,
+                        't': msgpack.Timestamp.from_unix_nano(start),
+                        'o': price, 'h': price * 1.001, 'l': price * 0.999,
+                        'c': price, 'v': 1000, 'n': 10, 'vw': price,
+                    })
+            for symbol in symbols:
+                msgs.append({
+                    'T': 't', 'S': symbol, 'i': next(self._trade_ids),
+                    'x': 'V', 'p': self._price(symbol, now), 's': 100,
+                    't': msgpack.Timestamp.from_unix_nano(now),
+                    'c': ['@'], 'z': 'C',
+                })
+            try:
+                await ws.send_bytes(msgpack.packb(msgs))
+            except ConnectionError:
+                return
+
+    # running
+
+    async def _start(self):
+        self._runner = web.AppRunner(self.make_app())
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = self._runner.addresses[0][1]
+
+    def start(self):
+        '''Serves on a background thread until stop().'''
+        self._loop = asyncio.new_event_loop()
+        self._loop.run_until_complete(self._start())
+        self._thread = threading.Thread(
+            target=self._loop.run_forever, daemon=True,
+            name='pylivetrader-fake-alpaca')
+        self._thread.start()
+        return self
+
+    def stop(self):
+        async def cleanup():
+            for ws in list(self._trade_clients):
+                await ws.close()
+            await self._runner.cleanup()
+        asyncio.run_coroutine_threadsafe(cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+    def call(self, func, *args):
+        '''Runs func on the server's thread, e.g. stats() while it
+        serves.'''
+        async def run():
+            return func(*args)
+        return asyncio.run_coroutine_threadsafe(run(), self._loop).result()
+
+    def serve_forever(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_until_complete(self._start())
+        print(self.url, flush=True)
+        self._loop.run_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Serves a fake Alpaca API, and prints its url.')
+    parser.add_argument('--symbols', type=int, default=100)
+    parser.add_argument('--latency', type=float, default=0.)
+    parser.add_argument('--jitter', type=float, default=0.)
+    parser.add_argument('--rate-limit', type=int, default=None,
+                        help='trading API requests per minute')
+    parser.add_argument('--data-rate-limit', type=int, default=None,
+                        help='data API requests per minute')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--port', type=int, default=0)
+    args = parser.parse_args()
+    FakeAlpacaServer(
+        symbols=args.symbols, latency=args.latency, jitter=args.jitter,
+        rate_limit=args.rate_limit, data_rate_limit=args.data_rate_limit,
+        seed=args.seed, port=args.port,
+    ).serve_forever()
+
+
+if __name__ == '__main__':
+    main()
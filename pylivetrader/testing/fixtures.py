@@ -108,6 +108,9 @@ class Backend:
                 for asset in assets
             ], index=assets)
 
+    def get_tradability(self, assets):
+        return [self._api.get_asset(a.symbol).tradable for a in assets]
+
     def get_bars(self, assets, data_frequency, bar_count=500, end_dt=None):
         assets_is_scalar = not isinstance(assets, (list, set, tuple))
         if assets_is_scalar:
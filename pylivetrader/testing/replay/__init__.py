@@ -0,0 +1,12 @@
+'''Fast-forward replay of an algorithm over historical minute bars.
+
+    from pylivetrader.testing.replay import run_replay
+
+    result = run_replay(functions, 'bars/', '2021-01-04', '2021-06-30')
+    print(result.report())
+'''
+
+from .backend import Backend  # noqa
+from .clock import ReplayClock  # noqa
+from .data import ReplayData, load_bars  # noqa
+from .engine import ReplayResult, run_replay  # noqa
@@ -0,0 +1,130 @@
+#
+# Copyright 2018 Alpaca
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import numpy as np
+from logbook import Logger
+
+from pylivetrader.testing.smoke import backend as smoke
+from pylivetrader.testing.smoke.backend import _check_fill, _count_calls
+
+log = Logger('ReplayBackend')
+
+
+class Backend(smoke.Backend):
+    '''
+    The smoke backend's simulated broker, on historical bars.
+
+    An order fills at the close of the first bar, from the one it was
+    placed at, for which `_check_fill()` passes over the bars so far.
+    Positions are marked to the last close.
+    '''
+
+    def __init__(self, data, cash=1e6, clock=None):
+        '''
+        data: ReplayData
+        cash: initial cash balance
+        clock: ReplayClock
+        '''
+        super().__init__(cash=cash, size=0, clock=clock)
+        self._data = data
+        self._account.cash = cash
+        self._portfolio.starting_cash = cash
+        self._portfolio.portfolio_value = cash
+        # order id -> bars of its window already checked
+        self._checked = {}
+
+        self.orders_placed = 0
+        self.fills = 0
+        self.traded_value = 0.
+
+    def order(self, asset, amount, style, quantopian_compatible=True):
+        order = super().order(asset, amount, style, quantopian_compatible)
+        if order is not None:
+            self.orders_placed += 1
+            self._last_process_time = None
+        return order
+
+    def cancel_order(self, zp_order_id):
+        self._checked.pop(zp_order_id, None)
+        super().cancel_order(zp_order_id)
+
+    def _fill(self, order, price):
+        self._checked.pop(order.id, None)
+        pos = self._positions.get(order.asset)
+        if (pos.amount if pos is not None else 0) + order.amount < 0:
+            # the simulator does not short
+            log.warn('not enough shares to fill {}, canceled'.format(order))
+            self.cancel_order(order.id)
+            return
+        self.fills += 1
+        self.traded_value += abs(order.amount) * price
+        super()._fill(order, price)
+
+    def _process_orders(self):
+        now = self.now
+        if self._last_process_time == now:
+            return
+        for order in list(self._orders.values()):
+            window = self._data.window(order.asset, order.dt, now)
+            if window is None:
+                continue
+            # the first bar the order fills at; the window only grows, so
+            # the bars checked before are not checked again
+            checked = self._checked.get(order.id, 0)
+            for k in range(checked + 1, len(window) + 1):
+                if _check_fill(order, window[:k]):
+                    self._fill(order, window.close[k - 1])
+                    break
+            else:
+                self._checked[order.id] = len(window)
+
+        positions_value = 0.
+        for asset, pos in self._positions.items():
+            price = self._data.last_price(asset, now)
+            if not np.isnan(price):
+                pos.last_sale_price = price
+                pos.last_sale_date = now
+            positions_value += pos.amount * (
+                pos.last_sale_price or pos.cost_basis)
+
+        portfolio = self._portfolio
+        portfolio.positions_value = positions_value
+        portfolio.portfolio_value = portfolio.cash + positions_value
+        self._account.total_positions_value = positions_value
+        self._account.net_liquidation = portfolio.portfolio_value
+        self._last_process_time = now
+
+    def get_equities(self):
+        return self._data.get_equities()
+
+    @_count_calls
+    def get_last_traded_dt(self, asset):
+        return self._data.get_last_traded_dt(asset, self.now)
+
+    @_count_calls
+    def get_spot_value(
+            self,
+            assets,
+            field,
+            dt,
+            data_frequency,
+            quantopian_compatible=True):
+        return self._data.get_spot_value(assets, field, self.now)
+
+    @_count_calls
+    def get_bars(self, assets, data_frequency, bar_count=500, end_dt=None):
+        return self._data.get_bars(
+            assets, data_frequency, bar_count,
+            end_dt if end_dt is not None else self.now)
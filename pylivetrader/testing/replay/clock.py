@@ -0,0 +1,125 @@
+#
+# Copyright 2018 Alpaca
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import numpy as np
+import pandas as pd
+from trading_calendars import get_calendar
+
+from pylivetrader.executor.realtimeclock import (
+    BAR, SESSION_START, SESSION_END, MINUTE_END, BEFORE_TRADING_START_BAR,
+)
+
+
+class ReplayClock(object):
+    '''
+    Emits the events of RealtimeClock for the sessions from start to end,
+    without waiting, like smoke.clock.FaketimeClock does.
+
+    The emission times of all the sessions are computed up front, so
+    iterating costs a Timestamp per bar and no calendar query.
+
+    on_session_end: called with the close after each SESSION_END
+    '''
+
+    def __init__(
+        self,
+        start,
+        end,
+        calendar=None,
+        before_trading_start_minute=(
+            pd.Timestamp('8:45').time(),
+            'America/New_York'),
+        minute_emission=True,
+        on_session_end=None,
+    ):
+        if calendar is None:
+            calendar = get_calendar('NYSE')
+        self.calendar = calendar
+        self.before_trading_start_minute = before_trading_start_minute
+        self.minute_emission = minute_emission
+        self.on_session_end = on_session_end
+        self.bars = 0
+
+        self.sessions = calendar.sessions_in_range(
+            pd.Timestamp(start, tz='UTC').normalize(),
+            pd.Timestamp(end, tz='UTC').normalize())
+        if not len(self.sessions):
+            raise ValueError(
+                'no session between {} and {}'.format(start, end))
+
+        start_time, tz = before_trading_start_minute
+        self._before_trading_start = (
+            self.sessions.tz_localize(None).tz_localize(tz) +
+            pd.Timedelta(hours=start_time.hour, minutes=start_time.minute)
+        ).tz_convert('UTC')
+
+        # the bars of a session are its minutes but the close, as with
+        # RealtimeClock
+        self._minutes = calendar.minutes_for_sessions_in_range(
+            self.sessions[0], self.sessions[-1])
+        closes = calendar.schedule.loc[self.sessions, 'market_close']
+        self._bounds = np.searchsorted(
+            self._minutes.asi8,
+            pd.DatetimeIndex(closes.values).tz_localize('UTC').asi8)
+        self._bounds = np.r_[0, self._bounds + 1]
+
+        self._current_time = self._before_trading_start[0] - \
+            pd.Timedelta('1min')
+        self._now = None
+
+    def session_minutes(self, session):
+        '''
+        return: pd.DatetimeIndex (UTC) of the bars of the session
+        '''
+        i = self.sessions.get_loc(session)
+        return self._minutes[self._bounds[i]:self._bounds[i + 1] - 1]
+
+    @property
+    def end_time(self):
+        return self._minutes[-1]
+
+    @property
+    def now(self):
+        if self._now is None:
+            self._now = self._current_time.tz_convert('America/New_York')
+        return self._now
+
+    def _set(self, dt):
+        self._current_time = dt
+        self._now = None
+        return dt
+
+    def __iter__(self):
+        set_time = self._set
+        minute_emission = self.minute_emission
+        for i, session in enumerate(self.sessions):
+            yield set_time(session), SESSION_START
+            yield set_time(self._before_trading_start[i]), \
+                BEFORE_TRADING_START_BAR
+
+            minutes = self._minutes[self._bounds[i]:self._bounds[i + 1]]
+            close = minutes[-1]
+            for dt in minutes[:-1]:
+                self.bars += 1
+                yield set_time(dt), BAR
+                if minute_emission:
+                    yield dt, MINUTE_END
+
+            set_time(close)
+            if minute_emission:
+                yield close, MINUTE_END
+            yield close, SESSION_END
+            if self.on_session_end is not None:
+                self.on_session_end(close)
@@ -0,0 +1,289 @@
+#
+# Copyright 2018 Alpaca
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from pylivetrader.assets import Equity
+
+FIELDS = ('open', 'high', 'low', 'close', 'volume')
+OPEN, HIGH, LOW, CLOSE, VOLUME = range(len(FIELDS))
+
+NY = 'America/New_York'
+
+_READERS = {
+    '.csv': pd.read_csv,
+    '.parquet': pd.read_parquet,
+    '.pq': pd.read_parquet,
+}
+
+
+def _read(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in _READERS:
+        raise ValueError('Unsupported bar file: {}'.format(path))
+    df = _READERS[ext](path)
+    for column in ('timestamp', 'time', 't'):
+        if column in df.columns:
+            df = df.set_index(column)
+            break
+    else:
+        if ext == '.csv':
+            # unnamed first column, as written by DataFrame.to_csv()
+            df = df.set_index(df.columns[0])
+    return df
+
+
+def _normalize(df, label):
+    df = df.rename(columns={
+        'o': 'open', 'h': 'high', 'l': 'low', 'c': 'close', 'v': 'volume'})
+    index = pd.DatetimeIndex(df.index)
+    index = index.tz_localize('UTC') if index.tz is None \
+        else index.tz_convert('UTC')
+    if label == 'start':
+        # a bar is only known once its minute is over
+        index = index + pd.Timedelta('1min')
+    elif label != 'end':
+        raise ValueError("label must be 'start' or 'end'")
+    df = pd.DataFrame(
+        df[list(FIELDS)].values.astype(np.float64), index=index,
+        columns=FIELDS)
+    return df[~df.index.duplicated(keep='last')].sort_index()
+
+
+def load_bars(path, symbols=None, label='start'):
+    '''
+    Reads minute bars from CSV or Parquet files: either a directory with
+    one `<SYMBOL>.csv` or `<SYMBOL>.parquet` per symbol, or a single file
+    with a `symbol` column. The bar times are read from a `timestamp`
+    column (or the first column of a CSV), naive times being UTC.
+
+    symbols: only load these symbols
+    label: 'start' if the bars are labeled with the minute they start at,
+           as Alpaca does, 'end' if with the minute they end at
+    return: dict of symbol -> DataFrame of open, high, low, close and
+            volume, indexed by the (UTC) minute the bar is known at
+    '''
+    if os.path.isdir(path):
+        frames = {}
+        for name in sorted(os.listdir(path)):
+            symbol, ext = os.path.splitext(name)
+            if ext.lower() not in _READERS:
+                continue
+            if symbols is not None and symbol not in symbols:
+                continue
+            frames[symbol] = _read(os.path.join(path, name))
+    else:
+        df = _read(path)
+        if 'symbol' not in df.columns:
+            raise ValueError('{} has no symbol column'.format(path))
+        frames = {
+            symbol: group for symbol, group in df.groupby('symbol')
+            if symbols is None or symbol in symbols
+        }
+    return {
+        symbol: _normalize(df, label) for symbol, df in frames.items()
+    }
+
+
+class _Column(np.ndarray):
+    '''ndarray with the `values` of a Series.'''
+
+    @property
+    def values(self):
+        return self.view(np.ndarray)
+
+
+class BarWindow(object):
+    '''
+    The bars of an asset between two times, with the columns that
+    smoke.backend._check_fill() reads.
+    '''
+
+    __slots__ = ('close', 'high', 'low')
+
+    def __init__(self, values):
+        self.close = values[:, CLOSE].view(_Column)
+        self.high = values[:, HIGH].view(_Column)
+        self.low = values[:, LOW].view(_Column)
+
+    def __len__(self):
+        return len(self.close)
+
+    def __getitem__(self, key):
+        window = object.__new__(BarWindow)
+        window.close = self.close[key]
+        window.high = self.high[key]
+        window.low = self.low[key]
+        return window
+
+
+class _Series(object):
+    '''The minute and daily bars of one symbol, as arrays.'''
+
+    def __init__(self, df):
+        self.minutes = df.index.asi8
+        self.values = np.ascontiguousarray(df.values)
+
+        # daily bars, labeled with the NY midnight of the session
+        days = df.index.tz_convert(NY).normalize().asi8
+        self.day_start, = np.nonzero(np.r_[True, days[1:] != days[:-1]])
+        self.days = days[self.day_start]
+        self.day_of_minute = np.cumsum(
+            np.r_[False, days[1:] != days[:-1]])
+        self.daily = self._aggregate(self.day_start, len(self.minutes))
+
+    def _aggregate(self, starts, stop):
+        if not len(starts):
+            return np.empty((0, len(FIELDS)))
+        values = self.values
+        ends = np.r_[starts[1:], stop] - 1
+        return np.column_stack([
+            values[starts, OPEN],
+            np.maximum.reduceat(values[:, HIGH], starts),
+            np.minimum.reduceat(values[:, LOW], starts),
+            values[ends, CLOSE],
+            np.add.reduceat(values[:, VOLUME], starts),
+        ])
+
+    def daily_until(self, end):
+        '''Daily bars known at end (ns); the last one is partial.'''
+        k = np.searchsorted(self.minutes, end, 'right')
+        if not k:
+            return self.days[:0], self.daily[:0]
+        day = self.day_of_minute[k - 1]
+        start = self.day_start[day]
+        values = self.values
+        today = np.array([[
+            values[start, OPEN],
+            values[start:k, HIGH].max(),
+            values[start:k, LOW].min(),
+            values[k - 1, CLOSE],
+            values[start:k, VOLUME].sum(),
+        ]])
+        return (self.days[:day + 1],
+                np.concatenate([self.daily[:day], today]))
+
+
+class ReplayData(object):
+    '''
+    Historical minute bars held as NumPy arrays, answering the data
+    queries of a backend for any point in time without looking ahead.
+
+    frames: dict of symbol -> DataFrame as returned by load_bars()
+    '''
+
+    def __init__(self, frames):
+        self.symbols = sorted(frames)
+        self._series = {
+            symbol: _Series(frames[symbol]) for symbol in self.symbols
+        }
+
+    def get_equities(self):
+        equities = []
+        for i, symbol in enumerate(self.symbols):
+            minutes = self._series[symbol].minutes
+            start = pd.Timestamp(minutes[0], tz='UTC').normalize() \
+                if len(minutes) else pd.Timestamp('1970-01-01', tz='UTC')
+            equities.append(Equity(
+                sid=i + 1,
+                symbol=symbol,
+                asset_name=symbol,
+                exchange='NYSE',
+                start_date=start,
+                end_date=pd.Timestamp('2050-01-01', tz='utc'),
+            ))
+        return equities
+
+    def _last(self, asset, end):
+        series = self._series.get(asset.symbol)
+        if series is None:
+            return None, -1
+        return series, np.searchsorted(series.minutes, end, 'right') - 1
+
+    def last_price(self, asset, end):
+        series, k = self._last(asset, end.value)
+        return series.values[k, CLOSE] if k >= 0 else np.nan
+
+    def get_last_traded_dt(self, asset, end):
+        series, k = self._last(asset, end.value)
+        return pd.Timestamp(series.minutes[k], tz='UTC') if k >= 0 \
+            else pd.NaT
+
+    def get_spot_value(self, assets, field, end):
+        '''
+        `price` is the last close and `last_traded` the time of the last
+        bar. The other fields are those of the bar of the current minute,
+        NaN (0 volume) if the asset did not trade in it.
+        '''
+        end = end.value
+
+        def value(asset):
+            series, k = self._last(asset, end)
+            if field == 'last_traded':
+                return pd.Timestamp(series.minutes[k], tz='UTC') \
+                    if k >= 0 else pd.NaT
+            if field == 'price':
+                return series.values[k, CLOSE] if k >= 0 else np.nan
+            if k < 0 or series.minutes[k] != end:
+                return 0 if field == 'volume' else np.nan
+            return series.values[k, FIELDS.index(field)]
+
+        if not isinstance(assets, (list, tuple)):
+            return value(assets)
+        return [value(asset) for asset in assets]
+
+    def get_bars(self, assets, data_frequency, bar_count, end):
+        '''
+        return: DataFrame with columns MultiIndex [asset -> OHLCV], indexed
+                by the minute (or day) of the bar in New York time
+        '''
+        end = end.value
+        frames = []
+        for asset in assets:
+            series = self._series.get(asset.symbol)
+            if series is None:
+                index, values = np.empty(0, dtype='i8'), \
+                    np.empty((0, len(FIELDS)))
+            elif 'd' in data_frequency:
+                index, values = series.daily_until(end)
+            else:
+                index, values = series.minutes, series.values
+                index = index[:np.searchsorted(index, end, 'right')]
+            lo = max(0, len(index) - bar_count)
+            frames.append(pd.DataFrame(
+                values[lo:len(index)],
+                index=pd.DatetimeIndex(index[lo:]).tz_localize(
+                    'UTC').tz_convert(NY),
+                columns=FIELDS,
+            ))
+        return pd.concat(frames, axis=1, keys=list(assets))
+
+    def window(self, asset, start, end):
+        '''
+        return: BarWindow of the bars from start to end inclusive, None
+                if there are none
+        '''
+        series = self._series.get(asset.symbol)
+        if series is None:
+            return None
+        lo = 0 if start is pd.NaT else \
+            np.searchsorted(series.minutes, start.value, 'left')
+        hi = np.searchsorted(series.minutes, end.value, 'right')
+        if hi <= lo:
+            return None
+        return BarWindow(series.values[lo:hi])
@@ -0,0 +1,185 @@
+#
+# Copyright 2018 Alpaca
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import time
+
+import numpy as np
+import pandas as pd
+from logbook import Logger
+
+from pylivetrader.algorithm import Algorithm, noop
+from pylivetrader.executor.executor import AlgorithmExecutor
+from pylivetrader.misc.api_context import LiveTraderAPI
+from pylivetrader.statestore import StateStore
+from pylivetrader.testing.replay.backend import Backend
+from pylivetrader.testing.replay.clock import ReplayClock
+from pylivetrader.testing.replay.data import ReplayData, load_bars
+
+log = Logger('Replay')
+
+TRADING_DAYS = 252
+
+
+class MemoryStore(object):
+    '''Storage engine keeping the last saved state in memory.'''
+
+    def __init__(self):
+        self.state = None
+
+    def save(self, state):
+        self.state = state
+
+    def load(self):
+        return dict(self.state)
+
+    def can_load(self):
+        return False
+
+
+class ReplayResult(object):
+    '''
+    daily: DataFrame indexed by session of the portfolio_value, cash and
+           positions_value at the close, and the daily returns
+    '''
+
+    def __init__(self, daily, capital, orders, fills, traded_value, bars,
+                 seconds):
+        self.daily = daily
+        self.capital = capital
+        self.orders = orders
+        self.fills = fills
+        self.traded_value = traded_value
+        self.bars = bars
+        self.seconds = seconds
+
+    def stats(self):
+        returns = self.daily['returns'].values
+        values = self.daily['portfolio_value'].values
+        std = returns.std(ddof=1) if len(returns) > 1 else np.nan
+        peak = np.maximum.accumulate(np.r_[self.capital, values])
+        total = values[-1] / self.capital - 1 if len(values) else 0.
+        return {
+            'start': self.daily.index[0] if len(values) else None,
+            'end': self.daily.index[-1] if len(values) else None,
+            'sessions': len(values),
+            'ending_value': values[-1] if len(values) else self.capital,
+            'total_return': total,
+            'annual_return': (1 + total) ** (
+                TRADING_DAYS / len(values)) - 1 if len(values) else 0.,
+            'annual_volatility': std * np.sqrt(TRADING_DAYS),
+            'sharpe': returns.mean() / std * np.sqrt(TRADING_DAYS)
+            if std > 0 else np.nan,
+            'max_drawdown': (np.r_[self.capital, values] / peak - 1).min(),
+            'orders': self.orders,
+            'fills': self.fills,
+            'turnover': self.traded_value / self.capital,
+            'bars': self.bars,
+            'seconds': self.seconds,
+            'bars_per_second': self.bars / self.seconds
+            if self.seconds else np.nan,
+        }
+
+    def report(self):
+        s = self.stats()
+        lines = [
+            'sessions           {sessions} ({start:%Y-%m-%d} to '
+            '{end:%Y-%m-%d})'.format(**s) if s['sessions'] else
+            'sessions           0',
+            'ending value       {:,.2f}'.format(s['ending_value']),
+            'total return       {:.2%}'.format(s['total_return']),
+            'annual return      {:.2%}'.format(s['annual_return']),
+            'annual volatility  {:.2%}'.format(s['annual_volatility']),
+            'sharpe             {:.2f}'.format(s['sharpe']),
+            'max drawdown       {:.2%}'.format(s['max_drawdown']),
+            'orders / fills     {} / {}'.format(s['orders'], s['fills']),
+            'turnover           {:.2f}x'.format(s['turnover']),
+            'bars               {} in {:.2f}s ({:,.0f}/s)'.format(
+                s['bars'], s['seconds'], s['bars_per_second']),
+        ]
+        return '\n'.join(lines)
+
+
+def run_replay(algo, bars, start, end, capital=1e6, calendar=None,
+               label='start', retry=False, **kwargs):
+    '''
+    Runs the algorithm over the sessions from start to end on historical
+    minute bars, as fast as it goes, with the orders filled by the smoke
+    backend's rules.
+
+    algo: dict of the initialize, handle_data and before_trading_start
+          functions (see loader.get_api_functions), or an object with them
+    bars: ReplayData, dict of symbol -> DataFrame (see data.load_bars) or
+          the path to load them from
+    label: how the bars read from a path are labeled, see data.load_bars
+    retry: False to stop on the first exception of the algorithm
+    kwargs: passed to Algorithm
+    return: ReplayResult
+    '''
+    if isinstance(bars, str):
+        bars = load_bars(bars, label=label)
+    data = bars if isinstance(bars, ReplayData) else ReplayData(bars)
+
+    daily = []
+    clock = ReplayClock(start, end, calendar=calendar)
+    backend = Backend(data, cash=capital, clock=clock)
+
+    def record(close):
+        portfolio = backend.portfolio
+        daily.append((close.normalize(), portfolio.portfolio_value,
+                      portfolio.cash, portfolio.positions_value))
+    clock.on_session_end = record
+
+    def function(name):
+        if isinstance(algo, dict):
+            return algo.get(name, noop)
+        return getattr(algo, name, noop)
+
+    a = Algorithm(
+        initialize=function('initialize'),
+        handle_data=function('handle_data'),
+        before_trading_start=function('before_trading_start'),
+        backend=backend,
+        trading_calendar=clock.calendar,
+        **kwargs
+    )
+    # the replay has nothing to resume from
+    a._state_store = StateStore(storage_engine=MemoryStore())
+
+    started = time.perf_counter()
+    try:
+        with LiveTraderAPI(a):
+            a._assets_from_source = \
+                a.asset_finder.retrieve_all(a.asset_finder.sids)
+            a.initialize()
+            a.executor = AlgorithmExecutor(a, a.data_portal)
+            a.executor.clock = clock
+            a.executor.run(retry=retry)
+    finally:
+        a._state_store.close()
+        a._shutdown_thread_pool()
+        a._shutdown_tracer()
+    seconds = time.perf_counter() - started
+
+    daily = pd.DataFrame(
+        daily, columns=['session', 'portfolio_value', 'cash',
+                        'positions_value']).set_index('session')
+    values = np.r_[capital, daily['portfolio_value'].values]
+    daily['returns'] = values[1:] / values[:-1] - 1
+
+    result = ReplayResult(
+        daily, capital, backend.orders_placed, backend.fills,
+        backend.traded_value, clock.bars, seconds)
+    log.info('replay done\n{}'.format(result.report()))
+    return result
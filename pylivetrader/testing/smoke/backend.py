@@ -10,7 +10,10 @@ from pylivetrader.finance.order import (
 from pylivetrader.backend.base import BaseBackend
 import pandas as pd
 import numpy as np
+import os
 import string
+from collections import Counter
+from functools import wraps
 from trading_calendars import get_calendar
 
 from logbook import Logger
@@ -64,18 +67,30 @@ def _check_fill(order, price_df):
     return False
 
 
+def _count_calls(func):
+    '''Count the calls to a backend method in `self.calls`.'''
+    @wraps(func)
+    def wrapper(self, *args, **kwargs):
+        self.calls[func.__name__] += 1
+        return func(self, *args, **kwargs)
+    return wrapper
+
+
 class Backend(BaseBackend):
     '''This backend is a minimal simulator with
     naive order filling for mainly smoke testing.
     The price data is supplied by fake data generator.
     '''
 
-    def __init__(self, cash=1e6, size=50, clock=None):
+    def __init__(self, cash=1e6, size=50, clock=None, seed=None,
+                 mmap_dir=None):
         '''
         paramters:
             cash: initial cash balance
             size: the number of stocks in universe
             clock: soft clock
+            seed: seed of random walk prices, see FakeDataBackend
+            mmap_dir: directory to memory-map the fake bars in
         '''
         self._account = zp.Account()
         self._account.buying_power = cash
@@ -89,7 +104,11 @@ class Backend(BaseBackend):
         self._last_process_time = None
         self._closed_orders = {}
 
-        self._data_proxy = FakeDataBackend(size=size, clock=clock)
+        # number of data calls per method name, for benchmarks
+        self.calls = Counter()
+
+        self._data_proxy = FakeDataBackend(
+            size=size, clock=clock, seed=seed, mmap_dir=mmap_dir)
 
     @property
     def now(self):
@@ -222,9 +241,11 @@ class Backend(BaseBackend):
     def get_equities(self):
         return self._data_proxy.get_equities()
 
+    @_count_calls
     def get_last_traded_dt(self, asset):
         return self._data_proxy.get_last_traded_dt(asset)
 
+    @_count_calls
     def get_spot_value(
             self,
             assets,
@@ -235,62 +256,113 @@ class Backend(BaseBackend):
         return self._data_proxy.get_spot_value(
             assets, field, dt, data_frequency)
 
+    @_count_calls
     def get_bars(self, assets, data_frequency, bar_count=500, end_dt=None):
-        return self._data_proxy.get_bars(assets, data_frequency, bar_count)
+        return self._data_proxy.get_bars(
+            assets, data_frequency, bar_count, end_dt)
 
     def initialize_data(self, context):
         pass
 
 
+FIELDS = ('open', 'high', 'low', 'close', 'volume')
+
+
 class FakeDataBackend:
-    '''A data backend that generates synthesic sin wave price data
-    for a synthesically generated fixed universe.
+    '''A data backend that generates synthetic price data for a
+    synthetically generated fixed universe.
+
+    The bars of all the assets are generated at once, into one array of
+    shape (assets, bars, fields) per frequency, optionally memory-mapped
+    to `<mmap_dir>/<frequency>.npy`. `bars_view()` and single asset
+    `get_bars()` read them without a copy.
+
+    Without a seed, the prices are the sin wave `|sin(x)| + 1` scaled by
+    the asset's sid. With one, they are random walks from that seed.
     '''
 
-    def __init__(self, size=50, clock=None):
+    def __init__(self, size=50, clock=None, seed=None, mmap_dir=None,
+                 dtype=np.float64):
         self._size = size
         self._clock = clock
+        self._seed = seed
+        self._mmap_dir = mmap_dir
+        self._dtype = dtype
         self._cal = get_calendar('NYSE')
-        self._fake_bars = {
-            '1d': {}, '1m': {},
-        }
-
-    def _populate_missing(self, assets, data_frequency):
-        '''Populates cache bars that are not filled yet.'''
-        missing = []
-        for asset in assets:
-            if asset not in self._fake_bars[data_frequency]:
-                missing.append(asset)
-
-        if len(missing) == 0:
-            return
-
-        fake_end = self._clock.end_time
-        for asset in missing:
-            if data_frequency == '1m':
-                mask = self._cal.all_minutes
-                end = fake_end
-            else:
-                mask = self._cal.all_sessions
-                end = fake_end.floor('1D')
-        mask = mask[mask <= end]
-        if len(mask) >= MAX_FAKE_BARS:
-            mask = mask[-MAX_FAKE_BARS:]
-        mask = mask.tz_convert('America/New_York')
-
-        for asset in missing:
-            scale = asset.sid
-            x = np.linspace(0, len(mask), len(mask))
-            ts = np.abs(np.sin(x)) + 1.0
-            df = pd.DataFrame({
-                'open': ts * scale,
-                'high': ts * scale + 0.5,
-                'low': ts * scale - 0.5,
-                'close': ts * scale + 0.1,
-                'volume': (ts * scale * 1e6).astype(int),
-            }, index=mask)
-
-            self._fake_bars[data_frequency][asset] = df
+        # frequency -> (UTC ns index, NY DatetimeIndex, bars)
+        self._fake_bars = {}
+
+    def _populate(self, data_frequency):
+        '''Generates the bars of the frequency for all the assets.'''
+        bars = self._fake_bars.get(data_frequency)
+        if bars is not None:
+            return bars
+
+        fake_end = self._clock.end_time if self._clock is not None \
+            else self.now
+        if data_frequency == '1m':
+            index = self._cal.all_minutes
+            end = fake_end
+        else:
+            index = self._cal.all_sessions
+            end = fake_end.floor('1D')
+        stop = index.searchsorted(end, side='right')
+        index = index[max(0, stop - MAX_FAKE_BARS):stop]
+
+        shape = (self._size, len(index), len(FIELDS))
+        if self._mmap_dir is not None:
+            values = np.lib.format.open_memmap(
+                os.path.join(self._mmap_dir, data_frequency + '.npy'),
+                mode='w+', dtype=self._dtype, shape=shape)
+        else:
+            values = np.empty(shape, dtype=self._dtype)
+        self._generate(values)
+
+        bars = self._fake_bars[data_frequency] = (
+            index.asi8, index.tz_convert('America/New_York'), values)
+        return bars
+
+    def _generate(self, values):
+        size, n = values.shape[:2]
+        scale = np.arange(1, size + 1, dtype=np.float64)[:, None]
+        if self._seed is None:
+            x = np.linspace(0, n, n)
+            ts = (np.abs(np.sin(x)) + 1.0)[None, :] * scale
+            close = ts + 0.1
+            values[:, :, 0] = ts
+            values[:, :, 1] = ts + 0.5
+            values[:, :, 2] = ts - 0.5
+            values[:, :, 4] = (ts * 1e6).astype(int)
+        else:
+            rng = np.random.RandomState(self._seed)
+            close = 10 * scale * np.exp(np.cumsum(
+                rng.normal(0, 0.001, (size, n)), axis=1))
+            open_ = np.concatenate([close[:, :1], close[:, :-1]], axis=1)
+            spread = np.abs(rng.normal(0, 0.0005, (size, n))) * close
+            values[:, :, 0] = open_
+            values[:, :, 1] = np.maximum(open_, close) + spread
+            values[:, :, 2] = np.minimum(open_, close) - spread
+            values[:, :, 4] = rng.randint(100, 10000, (size, n))
+        values[:, :, 3] = close
+
+    def _rows(self, assets):
+        '''The rows of the assets, as a slice when they are in order.'''
+        rows = np.array([asset.sid - 1 for asset in assets], dtype=int)
+        if len(rows) and (np.diff(rows) == 1).all():
+            return slice(rows[0], rows[-1] + 1)
+        return rows
+
+    def bars_view(self, assets, data_frequency, bar_count=500, end_dt=None):
+        '''
+        return: tuple(NY DatetimeIndex, array of shape (assets, bars,
+                fields)). The array is a view when the assets are a range
+                of consecutive sids
+        '''
+        ns, index, values = self._populate(data_frequency)
+        end = end_dt if end_dt is not None else self.now
+        stop = ns.searchsorted(end.value, side='right')
+        start = max(0, stop - bar_count)
+        return index[start:stop], values[self._rows(assets), start:stop]
 
     def get_equities(self):
         return [
@@ -314,38 +386,43 @@ class FakeDataBackend:
             dt,
             data_frequency,
             quantopian_compatible=True):
-        now = self.now
+        '''
+        return: the value of the last bar, and for a list of assets an
+                array of them, a view when the assets are consecutive.
+                NaN (NaT for last_traded) before the first bar.
+        '''
+        ns, index, values = self._populate('1m')
+        last = ns.searchsorted(self.now.value, side='right') - 1
 
-        def _get_for_symbol(df, field):
-            _field = field
+        single = isinstance(assets, Asset)
+        if last < 0:
             if field == 'last_traded':
-                return df.index[-1]
-            elif field == 'price':
-                _field = 'close'
-            return df[_field].values[-1]
-
-        if isinstance(assets, Asset):
-            df = self.get_bars([assets], '1m')[assets][:now]
-            return _get_for_symbol(df, field)
-
-        dfs = self.get_bars(assets, '1m')
-        return [
-            _get_for_symbol(dfs[asset][:now], field) for asset in assets
-        ]
+                return pd.NaT if single else [pd.NaT] * len(assets)
+            return np.nan if single else np.full(len(assets), np.nan)
+        rows = assets.sid - 1 if single else self._rows(assets)
+        if field == 'last_traded':
+            dt = index[last]
+            return dt if single else [dt] * len(assets)
+        column = FIELDS.index('close' if field == 'price' else field)
+        return values[rows, last, column]
 
     def get_bars(self, assets, data_frequency, bar_count=500, end_dt=None):
-        now = self.now
-
-        self._populate_missing(assets, data_frequency)
-
-        items = []
-        for asset in assets:
-            df = self._fake_bars[data_frequency][asset]
-            df = df[df.index <= now]
-            df = df.iloc[-bar_count:]
-            df.columns = pd.MultiIndex.from_product([[asset, ], df.columns])
-            items.append(df)
-        return pd.concat(items, axis=1)
+        '''
+        The frame of a single asset is a view of the bars. The bars of
+        several assets are concatenated into one frame.
+        '''
+        index, values = self.bars_view(
+            assets, data_frequency, bar_count, end_dt)
+        frames = [
+            pd.DataFrame(values[i], index=index, columns=FIELDS, copy=False)
+            for i in range(len(values))
+        ]
+        if len(frames) == 1:
+            frame = frames[0]
+            frame.columns = pd.MultiIndex.from_product(
+                [list(assets), FIELDS])
+            return frame
+        return pd.concat(frames, axis=1, keys=list(assets))
 
     @property
     def now(self):
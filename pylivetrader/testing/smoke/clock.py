@@ -70,6 +70,14 @@ class FaketimeClock(object):
         if current_time is not None:
             self._current_time = current_time
 
+    def session_minutes(self, session):
+        '''
+        return: pd.DatetimeIndex (UTC) of the bars of the session
+        '''
+        return pd.date_range(self.calendar.session_open(session),
+                             self.calendar.session_close(session),
+                             freq='min')
+
     @property
     def end_time(self):
         return self._fake_end
@@ -15,6 +15,7 @@
 # limitations under the License.
 #
 
+import numpy as np
 import pytest
 import pandas as pd
 
@@ -28,11 +29,13 @@ import pylivetrader.protocol as proto
 from pylivetrader.misc import events
 from pylivetrader.algorithm import Algorithm
 from pylivetrader.executor.executor import AlgorithmExecutor
+from pylivetrader.finance.controls import TradingControl
 from pylivetrader.misc.api_context import LiveTraderAPI
 from pylivetrader.loader import get_functions
+from pylivetrader.misc.tracing import HistogramSink
 
 
-from unittest.mock import Mock
+from unittest.mock import Mock, patch
 
 
 def get_algo(script, **kwargs):
@@ -378,3 +381,278 @@ def test_open_orders():
 
     a0 = algo.symbol('ASSET0')
     assert len(algo.get_open_orders(a0)) == 0
+
+
+def test_algorithm_thread_pool():
+    from pylivetrader.misc import parallel_utils
+
+    algo = get_algo('', num_workers=3)
+    assert algo._thread_pool.workers == 3
+    assert parallel_utils.get_shared_thread_pool() is algo._thread_pool
+
+    algo._shutdown_thread_pool()
+    assert parallel_utils.get_shared_thread_pool() is None
+
+
+def test_state_write_behind(tmpdir):
+    from pylivetrader.executor.realtimeclock import BAR
+
+    statefile = str(tmpdir.join('algo-state.pkl'))
+    script = '''
+def handle_data(ctx, data):
+    ctx.value = getattr(ctx, 'value', 0) + 1
+'''
+    algo = get_algo(script, statefile=statefile, state_write_behind=True)
+    algo._assets_from_source = []
+    algo.initialize()
+    algo.executor = AlgorithmExecutor(algo, algo.data_portal)
+    dt = pd.Timestamp('2018/08/13 9:31', tz='America/New_York')
+    algo.executor.clock = [(dt, BAR), (dt + pd.Timedelta('1min'), BAR)]
+    algo.executor.run()
+    algo._state_store.close()
+
+    assert algo._state_store.metrics()['errors'] == 0
+
+    algo = get_algo(script, statefile=statefile)
+    algo.initialize()
+    assert algo.value == 2
+
+
+class SessionClock:
+    '''Emits the bars of one session, without waiting.'''
+
+    def __init__(self, calendar, session):
+        self.calendar = calendar
+        self.session = session
+
+    def session_minutes(self, session):
+        return self.calendar.minutes_for_session(session)[:-1]
+
+    def __iter__(self):
+        from pylivetrader.executor.realtimeclock import BAR, SESSION_START
+
+        yield self.session, SESSION_START
+        for dt in self.session_minutes(self.session):
+            yield dt, BAR
+
+
+def test_skip_idle_bars(tmpdir):
+    algo = get_algo('''
+def rebalance(context, data):
+    context.rebalanced = context.get_datetime()
+
+def initialize(context):
+    schedule_function(rebalance, date_rules.every_day(),
+                      time_rules.market_open(minutes=10))
+''', statefile=str(tmpdir.join('algo-state.pkl')))
+    assert algo.handle_data_is_noop
+    algo._assets_from_source = []
+    algo.initialize()
+
+    bars = []
+    algo.data_portal.cache_clear = lambda: bars.append(1)
+    saves = []
+    save = algo._state_store.save
+    algo._state_store.save = lambda *args: (saves.append(1), save(*args))
+
+    session = pd.Timestamp('2018-08-13', tz='UTC')
+    algo.executor = AlgorithmExecutor(algo, algo.data_portal)
+    algo.executor.clock = SessionClock(algo.trading_calendar, session)
+    algo.executor.run()
+
+    # only the bar with something to run
+    rebalanced = pd.Timestamp('2018-08-13 13:40', tz='UTC')
+    assert len(bars) == 1
+    assert algo.rebalanced == rebalanced
+    assert len(saves) == 1
+
+    # with handle_data, every bar runs
+    algo = get_algo('''
+def handle_data(context, data):
+    context.bars = getattr(context, 'bars', 0) + 1
+''', statefile=str(tmpdir.join('algo-state-2.pkl')))
+    assert not algo.handle_data_is_noop
+    algo._assets_from_source = []
+    algo.initialize()
+    algo.executor = AlgorithmExecutor(algo, algo.data_portal)
+    algo.executor.clock = SessionClock(algo.trading_calendar, session)
+    algo.executor.run()
+    assert algo.bars == 389
+
+
+def test_order_target_percent_batch():
+    algo = get_algo('''
+def initialize(ctx):
+    set_max_order_size(max_notional=5000)
+    ''')
+
+    simulate_init_and_handle(algo)
+
+    assets = [algo.sid('asset-0'), algo.sid('asset-1'), algo.sid('asset-2')]
+    prices = algo.executor.current_data.current(assets, 'price')
+
+    class portfolio:
+        portfolio_value = 100000.0
+        positions = proto.Positions()
+
+    position = proto.Position(assets[1])
+    position.amount = 5
+    portfolio.positions[assets[1]] = position
+
+    class order:
+        def __init__(self, asset):
+            self.id = 'oid-' + asset.symbol
+
+    submitted = []
+
+    def batch_order(args):
+        submitted.extend(args)
+        return [order(asset) for asset, _, _, _ in args]
+
+    algo._backend.portfolio = portfolio()
+    algo._backend.batch_order = batch_order
+    algo._backend.order = Mock()
+    algo.executor.current_data.current = Mock(
+        side_effect=lambda assets, field: prices[assets])
+
+    weights = pd.Series([0.02, 0.0, 0.03], index=assets)
+    res = algo.order_target_percent_batch(weights)
+
+    # prices are fetched once for the batch, controls included
+    assert algo.executor.current_data.current.call_count == 1
+    algo._backend.order.assert_not_called()
+
+    amounts = {asset: amount for asset, amount, _, _ in submitted}
+    assert amounts == {
+        assets[0]: int(2000 / prices[assets[0]]),
+        assets[1]: -5,
+        assets[2]: int(3000 / prices[assets[2]]),
+    }
+    assert res == {asset: 'oid-' + asset.symbol for asset in assets}
+
+    with pytest.raises(TradingControlViolation):
+        algo.order_target_percent_batch(pd.Series([0.2], index=assets[:1]))
+
+
+def test_order_target_percent_batch_zero_price():
+    algo = get_algo('')
+
+    simulate_init_and_handle(algo)
+
+    assets = [algo.sid('asset-0'), algo.sid('asset-1')]
+    prices = pd.Series([10.0, 0.0], index=assets)
+
+    class portfolio:
+        portfolio_value = 1000.0
+        positions = proto.Positions()
+
+    position = proto.Position(assets[1])
+    position.amount = 5
+    portfolio.positions[assets[1]] = position
+
+    class order:
+        id = 'oid'
+
+    submitted = []
+
+    def record_order(asset, amount, style, quantopian_compatible):
+        submitted.append((asset, amount))
+        return order()
+
+    algo._backend.portfolio = portfolio()
+    algo._backend.order = record_order
+    algo._backend.batch_order = lambda args: [
+        record_order(*order_args) for order_args in args]
+    algo.executor.current_data.current = Mock(
+        side_effect=lambda assets, field: prices[assets])
+
+    # no price to infer the target from: both paths target no shares
+    algo.order_target_percent(assets[1], 0.5)
+    single = submitted[:]
+    del submitted[:]
+    algo.order_target_percent_batch(pd.Series([0.5], index=assets[1:]))
+    assert submitted == single == [(assets[1], -5)]
+
+
+def test_validate_order_params_batch():
+    algo = get_algo('''
+def initialize(ctx):
+    set_max_order_count(3, on_error='log')
+    set_long_only()
+    ''')
+
+    simulate_init_and_handle(algo)
+
+    assets = [algo.sid('asset-0'), algo.sid('asset-1'), algo.sid('asset-2')]
+    prices = np.array([10.0, 10.0, 10.0])
+    count, long_only = algo.trading_controls
+
+    # the count takes the whole batch at once, leaving out the amounts of 0
+    algo.validate_order_params_batch(
+        assets, np.array([1, 0, 1]), prices, None, None, None,
+        positions=np.zeros(3))
+    assert count.orders_placed == 2
+
+    # a failed batch isn't counted
+    with pytest.raises(TradingControlViolation):
+        algo.validate_order_params_batch(
+            assets[:1], np.array([-1]), prices[:1], None, None, None,
+            positions=np.zeros(1))
+    assert count.orders_placed == 2
+
+    # one over the count is only logged, and placed, so it is counted
+    with patch.object(count, 'handle_violation') as handle_violation:
+        algo.validate_order_params_batch(
+            assets, np.array([1, 1, 1]), prices, None, None, None,
+            positions=np.zeros(3))
+    assert handle_violation.call_count == 3
+    assert count.orders_placed == 5
+
+    # controls without validate_batch() validate the batches no other
+    # control failed
+    class CountingControl(TradingControl):
+        validated = 0
+
+        def validate(self, asset, amount, portfolio, algo_datetime,
+                     algo_current_data):
+            self.validated += 1
+
+    class portfolio:
+        positions = proto.Positions()
+
+    algo._backend.portfolio = portfolio()
+    counting = CountingControl('fail')
+    algo.trading_controls.append(counting)
+    with pytest.raises(TradingControlViolation):
+        algo.validate_order_params_batch(
+            assets[:1], np.array([-1]), prices[:1], None, None, None,
+            positions=np.zeros(1))
+    assert counting.validated == 0
+    algo.validate_order_params_batch(
+        assets, np.array([1, 1, 0]), prices, None, None, None,
+        positions=np.zeros(3))
+    assert counting.validated == 2
+
+
+def test_order_spans():
+    sink = HistogramSink()
+    algo = get_algo('', metrics_sinks=[sink])
+
+    simulate_init_and_handle(algo)
+
+    class order:
+        id = 'oid'
+
+    class portfolio:
+        portfolio_value = 1000.0
+        positions = proto.Positions()
+
+    algo._backend.portfolio = portfolio()
+    algo._backend.order = lambda *args: order()
+    try:
+        algo.order(algo.sid('asset-1'), 1)
+    finally:
+        algo._shutdown_tracer()
+
+    assert set(sink.histograms()) == {
+        'order', 'order.can_order_asset', 'order.controls', 'order.backend'}
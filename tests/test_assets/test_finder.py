@@ -63,3 +63,40 @@ def test_finder():
 
     # sids
     assert finder.sids == ['asset-id']
+
+
+def test_finder_symbol_indexes():
+    brk = Equity('brk-b', 'NYSE', symbol='BRK.B')
+    aapl = Equity('aapl', 'NSDQ', symbol='AAPL')
+    universe = [brk, aapl]
+
+    class DummyBroker:
+        calls = 0
+
+        def get_equities(self):
+            self.calls += 1
+            return list(universe)
+
+    broker = DummyBroker()
+    finder = AssetFinder(broker)
+
+    # delimiter variants resolve through the same index
+    assert finder.lookup_symbol('BRK.B') == brk
+    assert finder.lookup_symbol('BRK/B') == brk
+    assert finder.lookup_symbol('brkb', fuzzy=True) == brk
+
+    # indexes are reused between lookups
+    indexes = finder._symbol_indexes
+    finder.lookup_symbols(['AAPL', 'BRK.B'])
+    assert finder._symbol_indexes is indexes
+    assert broker.calls == 1
+
+    # and rebuilt after the asset cache is cleared
+    msft = Equity('msft', 'NSDQ', symbol='MSFT')
+    universe.append(msft)
+    with pytest.raises(SymbolNotFound):
+        finder.lookup_symbol('MSFT')
+
+    finder.clear_cache()
+    assert finder.lookup_symbol('MSFT') == msft
+    assert broker.calls == 2
@@ -1,11 +1,18 @@
 from pylivetrader.backend import alpaca
 from unittest.mock import Mock, patch
 from requests.exceptions import HTTPError
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+from threading import Lock, Thread
+import json
+import time
+import pandas as pd
 import pytest
 
-from alpaca_trade_api.entity import Asset, Account, Position, Order
+from alpaca_trade_api.entity import Asset, Account, Entity, Position, Order
 from alpaca_trade_api.rest import APIError
 
+from pylivetrader.assets import Equity
 from pylivetrader.misc.api_context import LiveTraderAPI
 from pylivetrader.finance.execution import (
     MarketOrder,
@@ -224,3 +231,356 @@ def test_orders():
             _api.submit_order.side_effect = APIError({'message': 'test'})
             res = backend.order(aapl, -1, MarketOrder())
             assert res is None
+
+
+class _StubBarsHandler(BaseHTTPRequestHandler):
+    '''Serves /v2/stocks/bars in two pages, grouped by symbol.'''
+
+    requests = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        self.requests.append((url.path, query))
+
+        def bar(day, price):
+            return {'t': '2021-03-0{}T05:00:00Z'.format(day),
+                    'o': price, 'h': price, 'l': price, 'c': price,
+                    'v': 100, 'n': 1, 'vw': price}
+
+        if 'page_token' not in query:
+            body = {
+                'bars': {'AAPL': [bar(d, 100 + d) for d in range(1, 6)]},
+                'next_page_token': 'page-2',
+            }
+        else:
+            body = {
+                'bars': {'MSFT': [bar(d, 200 + d) for d in range(4, 6)]},
+                'next_page_token': None,
+            }
+
+        payload = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+@pytest.fixture
+def stub_data_server(monkeypatch):
+    server = HTTPServer(('127.0.0.1', 0), _StubBarsHandler)
+    thread = Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setenv(
+        'APCA_API_DATA_URL', 'http://127.0.0.1:{}'.format(server.server_port))
+    _StubBarsHandler.requests = []
+    yield _StubBarsHandler
+    server.shutdown()
+    server.server_close()
+
+
+def test_fetch_bars_batched(stub_data_server):
+    backend = alpaca.Backend('key-id', 'secret-key', 'http://127.0.0.1:1')
+
+    df = backend._fetch_bars_from_api_internal({
+        'symbols': ['AAPL', 'MSFT', 'GOOG'],
+        '_from': pd.Timestamp('2021-03-01', tz='America/New_York'),
+        'to': pd.Timestamp('2021-03-05', tz='America/New_York'),
+        'size': 'day',
+        'limit': 3,
+    })
+
+    # one multi-symbol request, paged once
+    assert len(stub_data_server.requests) == 2
+    path, query = stub_data_server.requests[0]
+    assert path == '/v2/stocks/bars'
+    assert query['symbols'] == ['AAPL,MSFT,GOOG']
+
+    # symbols without bars are left out
+    assert list(df.columns.levels[0]) == ['AAPL', 'MSFT']
+    assert str(df.index.tz) == 'UTC'
+
+    # limit is applied per symbol, keeping the latest bars
+    assert df['AAPL']['close'].dropna().tolist() == [103, 104, 105]
+    assert df['MSFT']['close'].dropna().tolist() == [204, 205]
+
+
+def test_fetch_bars_keeps_symbol_order(stub_data_server):
+    backend = alpaca.Backend('key-id', 'secret-key', 'http://127.0.0.1:1')
+
+    df = backend._fetch_bars_from_api_internal({
+        'symbols': ['MSFT', 'GOOG', 'AAPL'],
+        '_from': pd.Timestamp('2021-03-01', tz='America/New_York'),
+        'to': pd.Timestamp('2021-03-05', tz='America/New_York'),
+        'size': 'day',
+        'limit': 3,
+    })
+    assert list(df.columns.get_level_values(0).unique()) == ['MSFT', 'AAPL']
+
+
+def test_get_tradability():
+    backend = alpaca.Backend('key-id', 'secret-key')
+    with patch.object(backend, '_api') as _api:
+        _api.list_assets.return_value = [
+            Asset({'symbol': 'AAPL', 'exchange': 'NASDAQ',
+                   'status': 'active', 'tradable': True}),
+            Asset({'symbol': 'VXX', 'exchange': 'ARCA',
+                   'status': 'active', 'tradable': False}),
+        ]
+        assets = [Mock(symbol='AAPL'), Mock(symbol='VXX'),
+                  Mock(symbol='NONE')]
+
+        tradable = backend.get_tradability(assets)
+        assert list(tradable) == [True, False, False]
+        assert _api.list_assets.call_count == 1
+
+        # answered from the snapshot until it goes stale
+        backend.get_tradability(assets)
+        assert _api.list_assets.call_count == 1
+
+        backend._tradability_updated_at -= pd.Timedelta(days=1)
+        backend.get_tradability(assets)
+        assert _api.list_assets.call_count == 2
+        _api.get_asset.assert_not_called()
+
+    backend = alpaca.Backend('key-id', 'secret-key',
+                             tradability_refresh_interval=0)
+    with patch.object(backend, '_api') as _api:
+        _api.list_assets.return_value = []
+        backend.get_tradability(assets)
+        backend.get_tradability(assets)
+        assert _api.list_assets.call_count == 2
+
+
+@pytest.mark.parametrize('mode', ['thread', 'asyncio', 'process'])
+def test_fetch_executor(stub_data_server, mode):
+    backend = alpaca.Backend('key-id', 'secret-key', 'http://127.0.0.1:1',
+                             fetch_executor=mode, fetch_workers=2)
+    # asyncio requests the bars on the async data client
+    assert (backend._bars_data is not None) == (mode == 'asyncio')
+    try:
+        df = backend._fetch_bars_from_api(
+            ['AAPL', 'MSFT'], 'day',
+            _from=pd.Timestamp('2021-03-01', tz='America/New_York'),
+            to=pd.Timestamp('2021-03-05', tz='America/New_York'),
+            limit=3,
+        )
+    finally:
+        backend.close()
+
+    assert list(df.columns.levels[0]) == ['AAPL', 'MSFT']
+    assert df['AAPL']['close'].dropna().tolist() == [103, 104, 105]
+
+
+def test_fetch_executor_unknown_mode():
+    with pytest.raises(ValueError):
+        alpaca.Backend('key-id', 'secret-key', fetch_executor='fork')
+
+
+def test_position_ledger():
+    backend = alpaca.Backend('key-id', 'secret-key', position_ledger=True)
+    with patch.object(backend, '_api') as _api:
+        _api.list_assets.return_value = [
+            Asset({'id': '93f58d0b-6c53-432d-b8ce-2bad264dbd94',
+                   'symbol': 'AAPL', 'exchange': 'NASDAQ',
+                   'status': 'active', 'tradable': True}),
+            Asset({'id': '8688f60a-04c9-4740-8468-c0b994499f41',
+                   'symbol': 'BAC', 'exchange': 'NYSE',
+                   'status': 'active', 'tradable': True}),
+        ]
+        _api.get_account.return_value = Account({'cash': '1000'})
+        _api.list_positions.return_value = [
+            Position({'symbol': 'AAPL', 'qty': '10', 'cost_basis': '2000',
+                      'current_price': '210'}),
+        ]
+
+        algo = Mock()
+        algo._backend = backend
+        algo.symbol = lambda x: backend._symbols2assets([x])[0]
+        with LiveTraderAPI(algo):
+            portfolio = backend.portfolio
+            assert portfolio.cash == 1000
+            assert portfolio.positions_value == 2100
+            assert portfolio.portfolio_value == 3100
+            aapl = algo.symbol('AAPL')
+            assert portfolio.positions[aapl].cost_basis == 200
+
+            # answered from the ledger until the reconcile interval passes
+            backend.positions
+            backend.portfolio
+            assert _api.list_positions.call_count == 1
+
+            def fill(symbol, side, qty, price, position_qty):
+                backend._on_trade_update(Entity({
+                    'event': 'fill',
+                    'price': str(price),
+                    'qty': str(qty),
+                    'position_qty': str(position_qty),
+                    'timestamp': '2021-03-01T15:00:00Z',
+                    'order': {'symbol': symbol, 'side': side,
+                              'client_order_id': 'id-' + symbol},
+                }))
+
+            fill('AAPL', 'buy', 10, 220, 20)
+            fill('BAC', 'buy', 5, 30, 5)
+            positions = backend.positions
+            assert positions[aapl].amount == 20
+            assert positions[aapl].cost_basis == 210
+            assert positions[aapl].last_sale_price == 220
+            assert positions[algo.symbol('BAC')].amount == 5
+            assert backend.portfolio.cash == 1000 - 2200 - 150
+
+            fill('AAPL', 'sell', 20, 230, 0)
+            assert aapl not in backend.positions
+
+            # the quantopian compatible position check uses the ledger
+            _api.submit_order.side_effect = APIError({'message': 'test'})
+            backend.order(aapl, -1, MarketOrder())
+            assert _api.submit_order.call_args[1]['qty'] == 1
+            assert _api.list_positions.call_count == 1
+            _api.get_position.assert_not_called()
+
+            # a stream reconnect reconciles on the next read
+            backend._ledger.invalidate()
+            assert backend.positions[aapl].amount == 10
+            assert _api.list_positions.call_count == 2
+
+
+class _StubOrderApi:
+    '''
+    submit_order() with a fixed latency, answering 429 to the first
+    submission of the throttled symbols.
+    '''
+
+    def __init__(self, latency, throttled=()):
+        self.latency = latency
+        self.throttled = set(throttled)
+        self.submitted = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = Lock()
+
+    def submit_order(self, symbol, qty, side, client_order_id, **kwargs):
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            time.sleep(self.latency)
+            with self._lock:
+                self.submitted.append(symbol)
+                if symbol in self.throttled:
+                    self.throttled.discard(symbol)
+                    raise APIError(
+                        {'message': 'rate limit exceeded'},
+                        HTTPError(response=Mock(status_code=429)))
+            return Order({
+                'client_order_id': client_order_id,
+                'symbol': symbol,
+                'qty': str(qty),
+                'side': side,
+                'stop_price': None,
+                'limit_price': None,
+                'submitted_at': '2018-08-29T13:31:01.710651Z',
+                'canceled_at': None,
+                'failed_at': None,
+                'filled_at': None,
+            })
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+def test_batch_order():
+    backend = alpaca.Backend('key-id', 'secret-key', order_workers=4)
+    backend._order_retry_wait = 0.01
+    stub = backend._api = _StubOrderApi(0.05, throttled=['S1', 'S5'])
+
+    algo = Mock()
+    algo.symbol = lambda s: Equity(s, symbol=s, exchange='NYSE')
+    assets = [algo.symbol('S{}'.format(i)) for i in range(12)]
+
+    with LiveTraderAPI(algo):
+        started = time.monotonic()
+        orders = backend.batch_order([
+            (asset, i + 1, MarketOrder(), False)
+            for i, asset in enumerate(assets)
+        ])
+        elapsed = time.monotonic() - started
+
+    # in the order of the arguments, the throttled ones included
+    assert [o.asset.symbol for o in orders] == [a.symbol for a in assets]
+    assert [o.amount for o in orders] == list(range(1, 13))
+    assert len(stub.submitted) == 14
+
+    assert stub.max_in_flight == 4
+    assert elapsed < 14 * 0.05
+
+    latencies = backend.last_batch_latencies
+    assert len(latencies) == 12
+    assert min(latencies) >= 0.05
+    # the retried orders waited for two submissions
+    assert latencies[1] >= 0.1 and latencies[5] >= 0.1
+
+    # 429 is given up on after order_max_retries
+    backend._order_max_retries = 1
+    stub.throttled = {'S0'}
+    with LiveTraderAPI(algo):
+        assert backend.batch_order([(assets[0], 1, MarketOrder(), False)])
+        stub.throttled = {'S0'}
+        backend._order_max_retries = 0
+        assert backend.batch_order(
+            [(assets[0], 1, MarketOrder(), False)]) == [None]
+
+
+def test_batch_order_failure():
+    backend = alpaca.Backend('key-id', 'secret-key', order_workers=2)
+    stub = backend._api = _StubOrderApi(0.02)
+    submit_order = stub.submit_order
+
+    def failing_submit_order(symbol, *args, **kwargs):
+        if symbol == 'S1':
+            raise ConnectionError('connection reset')
+        return submit_order(symbol, *args, **kwargs)
+
+    stub.submit_order = failing_submit_order
+
+    algo = Mock()
+    algo.symbol = lambda s: Equity(s, symbol=s, exchange='NYSE')
+    assets = [algo.symbol('S{}'.format(i)) for i in range(6)]
+
+    with LiveTraderAPI(algo):
+        with pytest.raises(ConnectionError):
+            backend.batch_order([
+                (asset, 1, MarketOrder(), False) for asset in assets])
+
+    # raised once the other orders were submitted
+    assert sorted(stub.submitted) == ['S0', 'S2', 'S3', 'S4', 'S5']
+    assert None not in backend.last_batch_latencies
+
+    backend.close()
+    with pytest.raises(RuntimeError):
+        backend._order_pool.map(len, [('a',)])
+
+
+def test_order_rate_limit():
+    backend = alpaca.Backend('key-id', 'secret-key', order_workers=8,
+                             order_rate_limit=60)
+    backend._order_rate = alpaca.BlockingTokenBucket(60, per=1., capacity=2)
+    backend._api = _StubOrderApi(0)
+
+    algo = Mock()
+    algo.symbol = lambda s: Equity(s, symbol=s, exchange='NYSE')
+    with LiveTraderAPI(algo):
+        started = time.monotonic()
+        backend.batch_order([
+            (algo.symbol('S{}'.format(i)), 1, MarketOrder(), False)
+            for i in range(8)
+        ])
+        elapsed = time.monotonic() - started
+
+    # 2 at once, then one every 1/60s
+    assert elapsed >= 5 / 60.
@@ -0,0 +1,173 @@
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from socketserver import ThreadingMixIn
+from threading import Thread
+from urllib.parse import urlparse, parse_qs
+import json
+
+import pandas as pd
+import pytest
+from requests.exceptions import HTTPError
+
+from pylivetrader.backend import alpaca
+from pylivetrader.backend.alpaca_async import AsyncDataClient, TokenBucket
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    '''Serves bars, latest trades and assets. The first request to each
+    path is answered with a 429.'''
+
+    requests = []
+    throttled = set()
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body, headers=()):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for k, v in headers:
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        self.requests.append((url.path, query))
+
+        if url.path not in self.throttled:
+            self.throttled.add(url.path)
+            return self._send(429, {'message': 'too many requests'},
+                              [('Retry-After', '0')])
+
+        if url.path == '/v2/stocks/bars':
+            symbols = query['symbols'][0].split(',')
+            days = range(1, 4) if 'page_token' not in query else range(4, 6)
+            bars = {
+                symbol: [{'t': '2021-03-0{}T05:00:00Z'.format(d),
+                          'o': i + d, 'h': i + d, 'l': i + d, 'c': i + d,
+                          'v': 100, 'n': 1, 'vw': i + d} for d in days]
+                for i, symbol in enumerate(symbols) if symbol != 'NONE'
+            }
+            token = 'page-2' if 'page_token' not in query else None
+            return self._send(200, {'bars': bars, 'next_page_token': token})
+        if url.path == '/v2/stocks/trades/latest':
+            symbols = query['symbols'][0].split(',')
+            return self._send(200, {'trades': {
+                symbol: {'t': '2021-03-05T20:59:59.5Z', 'p': 10. + i,
+                         's': 100, 'x': 'V', 'i': i, 'c': ['@'], 'z': 'C'}
+                for i, symbol in enumerate(symbols) if symbol != 'NONE'
+            }})
+        if url.path == '/v2/assets':
+            return self._send(200, [
+                {'id': 'aapl-id', 'symbol': 'AAPL', 'exchange': 'NASDAQ',
+                 'status': 'active', 'tradable': True},
+                {'id': 'vxx-id', 'symbol': 'VXX', 'exchange': 'ARCA',
+                 'status': 'active', 'tradable': False},
+            ])
+        return self._send(404, {'message': 'not found'})
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+@pytest.fixture
+def stub_server(monkeypatch):
+    server = _ThreadingHTTPServer(('127.0.0.1', 0), _StubHandler)
+    thread = Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    url = 'http://127.0.0.1:{}'.format(server.server_port)
+    monkeypatch.setenv('APCA_API_DATA_URL', url)
+    _StubHandler.requests = []
+    _StubHandler.throttled = set()
+    yield url
+    server.shutdown()
+    server.server_close()
+
+
+def test_token_bucket():
+    now = [0.]
+    bucket = TokenBucket(rate=60, per=60., capacity=2, clock=lambda: now[0])
+
+    assert bucket.try_acquire() == 0
+    assert bucket.try_acquire() == 0
+    # one token a second once the burst is spent
+    assert bucket.try_acquire() == pytest.approx(1.)
+
+    now[0] += 0.5
+    assert bucket.try_acquire() == pytest.approx(0.5)
+    now[0] += 0.5
+    assert bucket.try_acquire() == 0
+
+    now[0] += 100
+    assert bucket.try_acquire() == 0
+    assert bucket.try_acquire() == 0
+    assert bucket.try_acquire() > 0
+
+
+def test_async_data_client(stub_server):
+    client = AsyncDataClient('key-id', 'secret-key', stub_server)
+    try:
+        bars, trades, assets = client.run_all([
+            client.get_bars(['AAPL', 'MSFT'], '1Day'),
+            client.get_latest_trades(['AAPL', 'MSFT', 'NONE']),
+            client.list_assets(asset_class='us_equity'),
+        ])
+
+        # bars are paged through and laid out like REST.get_bars().df
+        assert len(bars) == 10
+        assert set(bars['symbol']) == {'AAPL', 'MSFT'}
+        assert bars.index.name == 'timestamp'
+        assert {'open', 'close', 'volume'} <= set(bars.columns)
+
+        assert set(trades) == {'AAPL', 'MSFT'}
+        assert trades['MSFT'].price == 11.
+        assert trades['MSFT'].timestamp.year == 2021
+
+        assert [a.symbol for a in assets] == ['AAPL', 'VXX']
+
+        # the first request to each endpoint was throttled and retried,
+        # all of them on the same keep-alive session
+        paths = [path for path, _ in _StubHandler.requests]
+        assert paths.count('/v2/assets') == 2
+        assert paths.count('/v2/stocks/trades/latest') == 2
+
+        with pytest.raises(HTTPError) as e:
+            client.run(client._get(stub_server + '/v2/unknown'))
+        assert e.value.response.status_code == 404
+        assert client.run_all(
+            [client._get(stub_server + '/v2/unknown')],
+            skip_statuses=(404,)) == [None]
+    finally:
+        client.close()
+
+
+def test_backend_async_data_client(stub_server):
+    backend = alpaca.Backend('key-id', 'secret-key', stub_server,
+                             data_client='async')
+    try:
+        df = backend._fetch_bars_from_api(
+            ['AAPL', 'MSFT', 'NONE'], 'day',
+            _from=pd.Timestamp('2021-03-01', tz='America/New_York'),
+            to=pd.Timestamp('2021-03-05', tz='America/New_York'),
+            limit=3,
+        )
+        assert list(df.columns.levels[0]) == ['AAPL', 'MSFT']
+        assert df['MSFT']['close'].tolist() == [4, 5, 6]
+
+        trades = backend._get_symbols_last_trade_value(['AAPL', 'NONE'])
+        assert list(trades) == ['AAPL']
+
+        tradable = backend.get_tradability([
+            alpaca.Equity(1, 'NASDAQ', symbol='AAPL'),
+            alpaca.Equity(2, 'ARCA', symbol='VXX'),
+        ])
+        assert list(tradable) == [True, False]
+    finally:
+        backend._data.close()
+
+    with pytest.raises(ValueError):
+        alpaca.Backend('key-id', 'secret-key', data_client='grpc')
@@ -0,0 +1,166 @@
+from threading import Thread, Timer
+from unittest.mock import patch
+import asyncio
+import time
+
+import msgpack
+import pandas as pd
+import pytest
+import websockets
+
+from pylivetrader.backend import alpaca
+from pylivetrader.backend.alpaca_stream import MarketDataStream
+from pylivetrader.data.bar_store import StreamingBarStore
+
+NOW = pd.Timestamp('2021-03-05 15:00:30', tz='UTC')
+
+
+class FakeDataStreamServer:
+    '''Speaks enough of the Alpaca data stream protocol to authenticate,
+    acknowledge subscriptions and push the messages given to `send()`.'''
+
+    def __init__(self):
+        self.subscriptions = []
+        self.connections = 0
+        self._clients = set()
+        self._loop = asyncio.new_event_loop()
+        self._server = self._loop.run_until_complete(
+            websockets.serve(self._handler, '127.0.0.1', 0, loop=self._loop))
+        self.port = self._server.sockets[0].getsockname()[1]
+        Thread(target=self._loop.run_forever, daemon=True).start()
+
+    async def _handler(self, ws, path):
+        self.connections += 1
+        await ws.send(msgpack.packb([{'T': 'success', 'msg': 'connected'}]))
+        await ws.recv()  # auth
+        await ws.send(msgpack.packb(
+            [{'T': 'success', 'msg': 'authenticated'}]))
+        self._clients.add(ws)
+        try:
+            async for message in ws:
+                msg = msgpack.unpackb(message)
+                self.subscriptions.append(msg)
+                await ws.send(msgpack.packb([{
+                    'T': 'subscription',
+                    'bars': msg['bars'],
+                    'trades': msg['trades'],
+                }]))
+        finally:
+            self._clients.discard(ws)
+
+    def send(self, *msgs):
+        async def send():
+            for ws in list(self._clients):
+                await ws.send(msgpack.packb(list(msgs)))
+        asyncio.run_coroutine_threadsafe(send(), self._loop).result()
+
+    def disconnect(self):
+        async def close():
+            for ws in list(self._clients):
+                await ws.close()
+        asyncio.run_coroutine_threadsafe(close(), self._loop).result()
+
+    def close(self):
+        async def close():
+            self._server.close()
+            await self._server.wait_closed()
+        asyncio.run_coroutine_threadsafe(close(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition():
+        if time.time() > deadline:
+            raise AssertionError('timed out')
+        time.sleep(0.01)
+
+
+def bar(symbol, start, price):
+    return {'T': 'b', 'S': symbol,
+            't': msgpack.Timestamp.from_unix_nano(pd.Timestamp(start).value),
+            'o': price, 'h': price, 'l': price, 'c': price,
+            'v': 100, 'n': 1, 'vw': price}
+
+
+def rest_bars(symbols, end, count):
+    index = pd.date_range(end=end, periods=count, freq='min').tz_convert(
+        'America/New_York')
+    return pd.concat({
+        symbol: pd.DataFrame({
+            'open': 1., 'high': 1., 'low': 1., 'close': 1., 'volume': 10,
+        }, index=index, columns=['open', 'high', 'low', 'close', 'volume'])
+        for symbol in symbols
+    }, axis=1)
+
+
+@pytest.fixture
+def server():
+    server = FakeDataStreamServer()
+    yield server
+    server.close()
+
+
+def test_streamed_minute_bars(server):
+    backend = alpaca.Backend('key-id', 'secret-key', 'http://127.0.0.1:1')
+    store = StreamingBarStore(backend._cal, clock=lambda: NOW)
+    stream = MarketDataStream(
+        store, 'key-id', 'secret-key',
+        stream_url='http://127.0.0.1:{}'.format(server.port),
+        reconnect_wait=0.05)
+    backend._bar_store = store
+    backend._data_stream = stream
+    stream.start()
+
+    rest_calls = []
+
+    def fetch_bars_from_api(symbols, size, to=None, limit=None):
+        rest_calls.append(symbols)
+        end = pd.Timestamp(to).floor('min')
+        return rest_bars(symbols, end, limit)
+
+    try:
+        with patch.object(backend, '_fetch_bars_from_api',
+                          side_effect=fetch_bars_from_api):
+            # unknown to the store: fetched over REST, which seeds it
+            df = backend._fetch_minute_bars(['AAPL'], 5, NOW)
+            assert rest_calls == [['AAPL']]
+            assert len(df) == 5
+            wait_for(lambda: server.subscriptions)
+            assert server.subscriptions[0]['bars'] == ['AAPL']
+
+            # asked for right as 15:01 is emitted, the window waits for
+            # the 15:00-15:01 bar to stream in instead of going to REST
+            server.send(bar('AAPL', '2021-03-05 14:59', 1.))
+            wait_for(lambda: store._watermark is not None)
+            Timer(0.1, server.send, args=(
+                bar('AAPL', '2021-03-05 15:00', 2.),
+                bar('MSFT', '2021-03-05 15:00', 9.))).start()
+            end_dt = pd.Timestamp('2021-03-05 15:01', tz='UTC')
+            df = backend._fetch_minute_bars(['AAPL'], 5, end_dt)
+            assert len(rest_calls) == 1
+            assert df['AAPL']['close'].tolist() == [1., 1., 1., 1., 2.]
+            assert df.index[-1] == pd.Timestamp(
+                '2021-03-05 10:01', tz='America/New_York')
+
+            # last trades come from the stream as well
+            server.send({'T': 't', 'S': 'AAPL', 'p': 2.5, 's': 10,
+                         't': msgpack.Timestamp.from_unix_nano(
+                             pd.Timestamp('2021-03-05 15:01:02').value)})
+            wait_for(lambda: store.last_trade('AAPL') is not None)
+            with patch.object(
+                    backend, '_get_symbols_last_trade_value_from_api',
+                    side_effect=AssertionError('no REST expected')):
+                assert backend._get_spot_trade(['AAPL'], 'price') == [2.5]
+                assert backend.get_last_traded_dt(
+                    alpaca.Equity(1, 'NASDAQ', symbol='AAPL')
+                ) == pd.Timestamp('2021-03-05 15:01:02', tz='UTC')
+
+            # after a reconnect the store isn't trusted until reseeded
+            server.disconnect()
+            wait_for(lambda: server.connections == 2 and
+                     len(server.subscriptions) == 2)
+            df = backend._fetch_minute_bars(['AAPL'], 5, end_dt)
+            assert len(rest_calls) == 2
+    finally:
+        stream.stop()
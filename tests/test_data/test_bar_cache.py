@@ -0,0 +1,66 @@
+import pandas as pd
+
+from pylivetrader.data.bar_cache import RollingBarCache
+from pylivetrader.testing.fixtures import Backend
+
+
+class CountingBackend(Backend):
+    '''Serves the fixture bars that end at end_dt and records requests.'''
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.requests = []
+
+    def get_bars(self, assets, data_frequency, bar_count=500, end_dt=None):
+        self.requests.append((tuple(assets), bar_count))
+        return self.expected_bars(assets, data_frequency, bar_count, end_dt)
+
+    def expected_bars(self, assets, data_frequency, bar_count, end_dt=None):
+        df = super().get_bars(assets, data_frequency, bar_count=10000)
+        if end_dt is not None:
+            df = df[df.index <= end_dt]
+        return df[-bar_count:]
+
+
+def test_rolling_bar_cache():
+    backend = CountingBackend()
+    cache = RollingBarCache(backend, backend._calendar)
+    assets = backend.get_equities()[:2]
+
+    end_dt = pd.Timestamp('2018-08-14 15:00', tz='UTC')
+    df = cache.get_bars(assets, '1m', 30, end_dt)
+    assert len(df) == 30
+    assert backend.requests == [(tuple(assets), 30)]
+
+    # same bar: served from the cache
+    cache.get_bars(assets, '1m', 30, end_dt)
+    assert len(backend.requests) == 1
+
+    # next bar: only the tail (the new bar plus the last cached one)
+    cache.invalidate()
+    end_dt += pd.Timedelta('1min')
+    df = cache.get_bars(assets, '1m', 30, end_dt)
+    assert backend.requests[-1] == (tuple(assets), 2)
+    assert len(df) == 30
+    assert df.index[-1] == end_dt
+    expected = backend.expected_bars(assets, '1m', 30, end_dt)
+    pd.testing.assert_frame_equal(df, expected, check_names=False)
+
+    # five bars later
+    cache.invalidate()
+    end_dt += pd.Timedelta('5min')
+    cache.get_bars(assets, '1m', 30, end_dt)
+    assert backend.requests[-1] == (tuple(assets), 6)
+
+    # window growth refetches the whole window
+    df = cache.get_bars(assets, '1m', 60, end_dt)
+    assert backend.requests[-1] == (tuple(assets), 60)
+    assert len(df) == 60
+
+    # and the larger window is kept for smaller requests
+    cache.invalidate()
+    end_dt += pd.Timedelta('1min')
+    df = cache.get_bars(assets, '1m', 30, end_dt)
+    assert backend.requests[-1] == (tuple(assets), 2)
+    assert len(df) == 30
+    assert len(cache._entries[(assets[0], '1m')].bars) == 60
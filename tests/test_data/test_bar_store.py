@@ -0,0 +1,84 @@
+import threading
+
+import numpy as np
+import pandas as pd
+from trading_calendars import get_calendar
+
+from pylivetrader.data.bar_store import StreamingBarStore
+
+
+def ns(ts):
+    return pd.Timestamp(ts, tz='UTC').value
+
+
+def test_streaming_bar_store():
+    now = [pd.Timestamp('2021-03-05 14:59:30', tz='UTC')]
+    store = StreamingBarStore(get_calendar('NYSE'), capacity=3,
+                              clock=lambda: now[0], bar_wait=0)
+    store.track(['A', 'B'])
+
+    # nothing is served before the subscription is confirmed
+    store.on_bar('A', ns('2021-03-05 14:59'), (1, 1, 1, 1, 10, 1, 1))
+    df, missing = store.get_bars(['A'], 1)
+    assert df is None and missing == ['A']
+
+    store.on_subscribed(['A', 'B'])
+    for minute in range(4):
+        now[0] = pd.Timestamp('2021-03-05 15:0{}:01'.format(minute + 1),
+                              tz='UTC')
+        store.on_bar('A', ns('2021-03-05 15:0{}'.format(minute)),
+                     (minute,) * 4 + (10, 1, minute))
+    df, missing = store.get_bars(['A', 'B'], 2)
+    assert missing == []
+    assert df['A']['close'].tolist() == [2, 3]
+    # B had no trades in those minutes
+    assert np.isnan(df['B']['close']).all()
+    assert str(df.index.tz) == 'America/New_York'
+
+    # windows starting before the subscription are not complete
+    df, missing = store.get_bars(['A'], 6)
+    assert missing == ['A']
+
+    # nor are minutes the stream hasn't delivered yet
+    now[0] = pd.Timestamp('2021-03-05 15:05:01', tz='UTC')
+    df, missing = store.get_bars(['A'], 1)
+    assert missing == ['A']
+
+    # a minute without any bar breaks the coverage
+    store.on_bar('A', ns('2021-03-05 15:05'), (5,) * 4 + (10, 1, 5))
+    now[0] = pd.Timestamp('2021-03-05 15:06:01', tz='UTC')
+    assert store.get_bars(['A'], 1)[1] == []
+    assert store.get_bars(['A'], 2)[1] == ['A']
+
+    # older bars are trimmed beyond twice the capacity
+    assert store._symbols['A'].size <= 2 * store.capacity
+
+    store.reset()
+    assert store.get_bars(['A'], 1)[1] == ['A']
+
+
+def test_streaming_bar_store_waits_for_the_emitted_minute():
+    now = [pd.Timestamp('2021-03-05 14:59:30', tz='UTC')]
+    store = StreamingBarStore(get_calendar('NYSE'), clock=lambda: now[0],
+                              bar_wait=5)
+    store.track(['A'])
+    store.on_subscribed(['A'])
+    store.on_bar('A', ns('2021-03-05 15:00'), (1,) * 4 + (10, 1, 1))
+
+    # asked for right at 15:02, the 15:01-15:02 bar is still on its way
+    end_dt = pd.Timestamp('2021-03-05 15:02', tz='UTC')
+    threading.Timer(0.1, store.on_bar, args=(
+        'A', ns('2021-03-05 15:01'), (2,) * 4 + (10, 1, 2))).start()
+    df, missing = store.get_bars(['A'], 2, end_dt)
+    assert missing == []
+    assert df['A']['close'].tolist() == [1, 2]
+
+    # it gives up after bar_wait seconds
+    store.bar_wait = 0.05
+    end_dt = pd.Timestamp('2021-03-05 15:03', tz='UTC')
+    assert store.get_bars(['A'], 1, end_dt)[1] == ['A']
+
+    # and doesn't wait for minutes after a gap in the stream
+    store.bar_wait = 60
+    end_dt = pd.Timestamp('2021-03-05 15:10', tz='UTC')
+    assert store.get_bars(['A'], 1, end_dt)[1] == ['A']
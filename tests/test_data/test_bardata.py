@@ -78,3 +78,55 @@ def test_bardata():
     # assert not data.can_trade(asset_to_check)
     # when asset is not tradable, return false
     assert not data.is_stale(asset_to_check)
+
+
+def test_bardata_current_batches_by_field():
+    portal = get_fixture_data_portal()
+    assets = portal.asset_finder.retrieve_all(portal.asset_finder.sids)
+
+    calls = []
+    get_spot_value = portal.backend.get_spot_value
+
+    def counting_get_spot_value(assets, field, *args, **kwargs):
+        calls.append((assets, field))
+        return get_spot_value(assets, field, *args, **kwargs)
+
+    portal.backend.get_spot_value = counting_get_spot_value
+    data = BarData(portal, 'minute')
+
+    o = data.current(assets, ['open', 'close', 'volume'])
+    assert len(calls) == 3
+    assert all(a == assets for a, _ in calls)
+    assert list(o.columns) == ['open', 'close', 'volume']
+    assert list(o.index) == assets
+    assert o['close'][assets[1]] == 780 + 10
+
+    del calls[:]
+    o = data.current(assets, 'price')
+    assert len(calls) == 1
+    assert list(o.index) == assets
+    assert o.name == 'price'
+
+
+def test_bardata_can_trade_in_one_pass():
+    portal = get_fixture_data_portal()
+    assets = portal.asset_finder.retrieve_all(portal.asset_finder.sids)
+
+    calls = []
+
+    def get_tradability(assets):
+        calls.append(assets)
+        return [a.symbol != 'ASSET1' for a in assets]
+
+    portal.backend.get_tradability = get_tradability
+    data = BarData(portal, 'minute')
+    data.datetime = pd.Timestamp('2018-08-13', tz='UTC')
+
+    o = data.can_trade(assets)
+    assert len(calls) == 1
+    assert o.dtype == bool
+    assert list(o.index) == assets
+    assert list(o) == [a.symbol != 'ASSET1' for a in assets]
+
+    assert data.can_trade(assets[0]) is True
+    assert data.can_trade(assets[1]) is False
@@ -38,7 +38,10 @@ def test_data_portal():
         assert type(v) == pd.Series
         assert v[asset] == last_in_fields[f]
 
-    # cache_clear
-    assert data_portal._get_realtime_bars.cache_info().currsize > 0
+    # rolling bar cache survives cache_clear
+    end_dt = pd.Timestamp('2018-08-14 15:00', tz='UTC')
+    data_portal.get_history_window(
+        [asset], end_dt, 10, '1m', 'price', 'minute')
+    assert len(data_portal._bar_cache) == 1
     data_portal.cache_clear()
-    assert data_portal._get_realtime_bars.cache_info().currsize == 0
+    assert len(data_portal._bar_cache) == 1
@@ -0,0 +1,88 @@
+import pandas as pd
+
+from pylivetrader.executor.profiler import BarProfiler
+
+
+class Clock:
+
+    def __init__(self, now):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+class Backend:
+
+    def __init__(self):
+        self.orders = []
+
+    @property
+    def portfolio(self):
+        return 'portfolio'
+
+    def order(self, asset, amount):
+        self.orders.append((asset, amount))
+        return 'order-id'
+
+
+class Algo:
+
+    def __init__(self):
+        self._backend = Backend()
+        self.data_portal = type('DataPortal', (), {})()
+        self.data_portal.backend = self._backend
+        self.data_portal._bar_cache = type('BarCache', (), {})()
+        self.data_portal._bar_cache.backend = self._backend
+
+
+def test_bar_profiler():
+    dt = pd.Timestamp('2021-03-08 14:31', tz='UTC')
+    clock = Clock(dt.value / 1e9 + 0.5)
+    profiler = BarProfiler(window=2, wall_time=clock.time)
+    algo = Algo()
+    profiler.instrument(algo)
+    backend = algo._backend
+
+    def rebalance(context, data):
+        backend.portfolio
+        backend.order('asset', 10)
+
+    for i in range(3):
+        profiler.start_bar(dt + pd.Timedelta(minutes=i))
+        with profiler.stage('handle_data'):
+            with profiler.callback(rebalance):
+                rebalance(None, None)
+        profiler.end_bar()
+        clock.now += 60
+
+    # calls go through to the backend
+    assert algo.data_portal.backend.orders == [('asset', 10)] * 3
+
+    summary = profiler.summary()
+    assert profiler.bars == 3
+    assert summary['bars'] == 2
+    assert summary['overruns'] == 0
+    assert set(summary['stages']) == {'handle_data'}
+    assert summary['callbacks']['rebalance']['count'] == 2
+    assert summary['backend_calls'] == {
+        'mean': 2.,
+        'max': 2,
+        'methods': {'portfolio': 2, 'order': 2},
+    }
+    assert 'rebalance' in profiler.report()
+
+    # started 59.5s into its minute, so the bar runs into the next one
+    clock.now = dt.value / 1e9 + 59.5
+    profiler.start_bar(dt)
+    clock.now += 1
+    profiler.end_bar()
+    assert profiler.overruns == 1
+    assert profiler.summary()['overruns'] == 1
+
+    # nothing is timed between bars
+    with profiler.stage('handle_data'):
+        backend.order('asset', 1)
+    assert profiler.bars == 4
+    assert profiler.summary()['backend_calls']['methods'] == {
+        'portfolio': 1, 'order': 1}
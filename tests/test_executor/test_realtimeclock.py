@@ -0,0 +1,110 @@
+import datetime
+from itertools import islice
+
+import pandas as pd
+from trading_calendars import get_calendar
+
+from pylivetrader.executor.realtimeclock import (
+    RealtimeClock,
+    BAR, SESSION_START, SESSION_END, MINUTE_END, BEFORE_TRADING_START_BAR,
+)
+
+
+class FakeTime:
+    '''Wall clock that only moves when slept on.'''
+
+    def __init__(self, now):
+        self.now = pd.Timestamp(now).value / 1e9
+        self.sleeps = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def make_clock(fake, time_skew=pd.Timedelta('0s'), minute_emission=True):
+    return RealtimeClock(
+        get_calendar('NYSE'),
+        (datetime.time(8, 45), 'America/New_York'),
+        minute_emission=minute_emission,
+        time_skew=time_skew,
+        wall_time=fake.time,
+        sleep=fake.sleep,
+    )
+
+
+def ts(s):
+    return pd.Timestamp(s, tz='UTC')
+
+
+def test_realtimeclock_session():
+    # Saturday night: sleeps through to Monday without polling
+    fake = FakeTime('2021-03-06 22:00:00')
+    events = iter(make_clock(fake))
+
+    assert next(events) == (ts('2021-03-08'), SESSION_START)
+    assert fake.now == ts('2021-03-08').value / 1e9
+    assert len(fake.sleeps) == 26 * 60
+
+    assert next(events) == (ts('2021-03-08 13:45'), BEFORE_TRADING_START_BAR)
+    assert next(events) == (ts('2021-03-08 14:31'), BAR)
+    assert next(events) == (ts('2021-03-08 14:31'), MINUTE_END)
+    assert fake.now == ts('2021-03-08 14:31').value / 1e9
+
+    # one sleep per bar, right up to the boundary
+    fake.sleeps.clear()
+    assert next(events) == (ts('2021-03-08 14:32'), BAR)
+    assert fake.sleeps == [60.]
+
+    rest = list(islice(events, 1 + 2 * 387 + 3))
+    bars = [dt for dt, action in rest if action == BAR]
+    assert len(bars) == 387
+    assert bars[-1] == ts('2021-03-08 20:59')
+    assert rest[-3:] == [
+        (ts('2021-03-08 21:00'), MINUTE_END),
+        (ts('2021-03-08 21:00'), SESSION_END),
+        (ts('2021-03-09'), SESSION_START),
+    ]
+
+
+def test_realtimeclock_mid_session():
+    fake = FakeTime('2021-03-05 15:00:30')
+    events = make_clock(fake, minute_emission=False)
+    events = iter(events)
+
+    assert list(islice(events, 4)) == [
+        (ts('2021-03-05'), SESSION_START),
+        (ts('2021-03-05 15:00'), BEFORE_TRADING_START_BAR),
+        (ts('2021-03-05 15:00'), BAR),
+        (ts('2021-03-05 15:01'), BAR),
+    ]
+
+    # a slow handler misses bars; only the latest is emitted
+    fake.now += 150
+    assert next(events) == (ts('2021-03-05 15:03'), BAR)
+    assert next(events) == (ts('2021-03-05 15:04'), BAR)
+
+
+def test_realtimeclock_time_skew():
+    # the broker clock is 10 seconds ahead of the local one
+    fake = FakeTime('2021-03-05 15:00:30')
+    events = iter(make_clock(fake, time_skew=pd.Timedelta('10s')))
+    list(islice(events, 4))
+
+    assert next(events) == (ts('2021-03-05 15:01'), BAR)
+    assert fake.now == ts('2021-03-05 15:00:50').value / 1e9
+
+
+def test_realtimeclock_after_close():
+    # started after the close: nothing more of the day but the
+    # before_trading_start bar
+    fake = FakeTime('2021-03-05 22:00:00')
+    events = iter(make_clock(fake))
+    assert list(islice(events, 3)) == [
+        (ts('2021-03-05'), SESSION_START),
+        (ts('2021-03-05 22:00'), BEFORE_TRADING_START_BAR),
+        (ts('2021-03-08'), SESSION_START),
+    ]
@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from pylivetrader.assets import Asset
+from pylivetrader.errors import TradingControlViolation
+from pylivetrader.finance.asset_restrictions import StaticRestrictions
+from pylivetrader.finance.controls import (
+    LongOnly,
+    MaxOrderCount,
+    MaxOrderSize,
+    MaxPositionSize,
+    RestrictedListOrder,
+)
+
+DT = pd.Timestamp('2018-08-13 14:30', tz='UTC')
+
+ASSETS = [Asset('asset-{}'.format(i), 'NYSE', symbol='S{}'.format(i))
+          for i in range(4)]
+
+
+def validate_batch(control, amounts, prices=(10., 10., 10., 10.),
+                   positions=(0, 0, 0, 0), dt=DT):
+    return control.validate_batch(
+        ASSETS, np.array(amounts), np.array(prices), np.array(positions),
+        dt, None)
+
+
+def test_max_order_size():
+    control = MaxOrderSize('fail', max_shares=100, max_notional=1500)
+    np.testing.assert_array_equal(
+        validate_batch(control, [50, -101, 120, 90],
+                       prices=[10., 1., np.nan, 20.]),
+        [False, True, True, True])
+
+    control = MaxOrderSize('fail', asset=ASSETS[1], max_shares=100)
+    np.testing.assert_array_equal(
+        validate_batch(control, [200, 200, 50, 200]),
+        [False, True, False, False])
+
+
+def test_max_position_size():
+    control = MaxPositionSize('fail', max_shares=100, max_notional=1500)
+    np.testing.assert_array_equal(
+        validate_batch(control, [50, -50, 50, 10],
+                       prices=[10., 10., 10., 100.],
+                       positions=[60, 60, -200, 10]),
+        [True, False, True, True])
+
+
+def test_long_only_and_restrictions():
+    np.testing.assert_array_equal(
+        validate_batch(LongOnly('fail'), [-10, -10, 10, -1],
+                       positions=[10, 5, -20, 0]),
+        [False, True, True, True])
+
+    control = RestrictedListOrder(
+        'fail', StaticRestrictions([ASSETS[0], ASSETS[2]]))
+    np.testing.assert_array_equal(
+        validate_batch(control, [1, 1, 1, 1]),
+        [True, False, True, False])
+
+
+def test_max_order_count_batch():
+    control = MaxOrderCount('fail', max_count=6)
+
+    assert not validate_batch(control, [1, 1, 1, 1]).any()
+    control.record_batch(ASSETS, np.array([1, 1, 1, 1]), DT)
+    assert control.orders_placed == 4
+
+    # the whole batch fails, and isn't counted
+    assert validate_batch(control, [1, 1, 1, 1]).all()
+    with pytest.raises(TradingControlViolation):
+        control.handle_violations(
+            ASSETS, [1, 1, 1, 1], np.ones(4, dtype=bool), DT)
+    assert control.orders_placed == 4
+
+    # a new day
+    assert not validate_batch(control, [1, 1, 1, 1],
+                              dt=DT + pd.Timedelta('1d')).any()
+    assert control.orders_placed == 0
@@ -0,0 +1,153 @@
+import pandas as pd
+from trading_calendars import get_calendar
+
+from pylivetrader.misc.events import (
+    Event,
+    EventManager,
+    EventRule,
+    date_rules,
+    make_eventrule,
+    time_rules,
+)
+
+
+class EveryOtherCall(EventRule):
+    '''Rule whose minutes can't be known in advance.'''
+
+    def __init__(self):
+        self.calls = 0
+
+    def should_trigger(self, dt):
+        self.calls += 1
+        return self.calls % 2 == 0
+
+
+def make_rules(cal):
+    return {
+        'open': (date_rules.every_day(), time_rules.market_open(), True),
+        'open_30': (date_rules.every_day(),
+                    time_rules.market_open(minutes=30), True),
+        'close_5': (date_rules.every_day(),
+                    time_rules.market_close(minutes=5), True),
+        'month_start': (date_rules.month_start(),
+                        time_rules.market_open(hours=1), True),
+        'week_end': (date_rules.week_end(days_offset=1),
+                     time_rules.market_close(), True),
+        'minute': (date_rules.every_day(), time_rules.every_minute(), True),
+        'full_days': (date_rules.every_day(), time_rules.market_close(),
+                      False),
+    }
+
+
+def make_manager(cal, fired):
+    manager = EventManager()
+    for name, (date_rule, time_rule, half_days) in make_rules(cal).items():
+        def callback(context, data, name=name):
+            fired.append((name, data))
+        manager.add_event(Event(
+            make_eventrule(date_rule, time_rule, cal, half_days), callback))
+    return manager
+
+
+def run_sessions(manager, cal, sessions, compile_session, start=0):
+    for session in sessions:
+        minutes = cal.minutes_for_session(session)[:-1]
+        if compile_session:
+            manager.compile_session(minutes)
+        for dt in minutes[start:]:
+            manager.handle_data(None, dt, dt)
+
+
+def test_compiled_schedule_matches_rules():
+    cal = get_calendar('NYSE')
+    # a month start, a week end and a half day (2021-11-26)
+    sessions = cal.sessions_in_range(
+        pd.Timestamp('2021-11-22', tz='UTC'),
+        pd.Timestamp('2021-12-02', tz='UTC'))
+
+    expected = []
+    run_sessions(make_manager(cal, expected), cal, sessions, False)
+    fired = []
+    run_sessions(make_manager(cal, fired), cal, sessions, True)
+
+    assert fired == expected
+    names = {name for name, _ in fired}
+    assert names == set(make_rules(cal))
+    # no full_days callback on the half day
+    assert ('full_days', pd.Timestamp('2021-11-26 18:00', tz='UTC')) \
+        not in fired
+    assert ('close_5', pd.Timestamp('2021-11-26 17:55', tz='UTC')) in fired
+
+
+def test_compiled_schedule_started_mid_session():
+    cal = get_calendar('NYSE')
+    sessions = [pd.Timestamp('2021-03-08', tz='UTC')]
+
+    # the algorithm starts at 10:30 ET
+    expected = []
+    run_sessions(make_manager(cal, expected), cal, sessions, False, 60)
+    fired = []
+    run_sessions(make_manager(cal, fired), cal, sessions, True, 60)
+
+    assert fired == expected
+    # every_minute was due at the open, and fires at the first bar
+    first_bar = pd.Timestamp('2021-03-08 15:31', tz='UTC')
+    assert fired[0] == ('minute', first_bar)
+
+    manager = make_manager(cal, [])
+    manager.compile_session(cal.minutes_for_session(sessions[0])[:-1])
+    assert manager.has_due_events(first_bar)
+
+
+def test_has_due_events():
+    cal = get_calendar('NYSE')
+    session = pd.Timestamp('2021-03-08', tz='UTC')
+    minutes = cal.minutes_for_session(session)[:-1]
+
+    manager = EventManager()
+    rule = make_eventrule(date_rules.every_day(),
+                          time_rules.market_open(minutes=10), cal)
+    manager.add_event(Event(rule, lambda context, data: None))
+    # nothing is known before the session is compiled
+    assert manager.has_due_events(minutes[0])
+
+    manager.compile_session(minutes)
+    assert manager.has_due_events(pd.Timestamp('2021-03-08 14:40', tz='UTC'))
+    assert not manager.has_due_events(minutes[0])
+    assert not manager.has_due_events(minutes[-1])
+
+    # a rule that has to be asked on each bar makes every bar due
+    manager.add_event(Event(EveryOtherCall(), lambda context, data: None))
+    assert manager.has_due_events(minutes[0])
+
+
+def test_event_added_during_session():
+    cal = get_calendar('NYSE')
+    session = pd.Timestamp('2021-03-08', tz='UTC')
+    minutes = cal.minutes_for_session(session)[:-1]
+
+    fired = []
+    manager = EventManager()
+    manager.compile_session(minutes)
+    for dt in minutes[:60]:
+        manager.handle_data(None, dt, dt)
+
+    def callback(name):
+        return lambda context, data: fired.append((name, data))
+
+    # market open is gone for today, the close is still ahead
+    manager.add_event(Event(make_eventrule(
+        date_rules.every_day(), time_rules.market_open(), cal),
+        callback('open')))
+    manager.add_event(Event(make_eventrule(
+        date_rules.every_day(), time_rules.market_close(), cal),
+        callback('close')))
+    manager.add_event(Event(EveryOtherCall(), callback('dynamic')))
+
+    for dt in minutes[60:]:
+        manager.handle_data(None, dt, dt)
+
+    assert ('close', minutes[-1]) in fired
+    assert 'open' not in {name for name, _ in fired}
+    assert len([name for name, _ in fired if name == 'dynamic']) == \
+        len(minutes[60:]) // 2
@@ -0,0 +1,63 @@
+import threading
+
+from pylivetrader.misc.parallel_utils import (
+    ThreadPool,
+    parallelize,
+    set_shared_thread_pool,
+)
+
+
+def test_parallelize_on_shared_thread_pool():
+    pool = ThreadPool(4, name='test')
+    set_shared_thread_pool(pool)
+    try:
+        threads = set()
+
+        def square(x):
+            threads.add(threading.current_thread().name)
+            return x * x
+
+        for _ in range(5):
+            result = parallelize(square)(range(8))
+            assert result == {x: x * x for x in range(8)}
+
+        # the same workers are reused across calls
+        assert all(name.startswith('test') for name in threads)
+        assert len(threads) <= 4
+
+        metrics = pool.metrics()
+        assert metrics['submitted'] == 40
+        assert metrics['completed'] == 40
+        assert metrics['queue_depth'] == 0
+        assert metrics['active_workers'] == 0
+        assert sum(metrics['latency_histogram'].values()) == 40
+
+        assert parallelize(lambda a, b: a + b)([(1, 2), (3, 4)]) == {
+            (1, 2): 3, (3, 4): 7}
+    finally:
+        set_shared_thread_pool(None)
+        pool.shutdown()
+
+
+def test_nested_parallelize_does_not_deadlock():
+    pool = ThreadPool(2, name='test')
+    set_shared_thread_pool(pool)
+    try:
+        def inner(x):
+            return x + 1
+
+        def outer(x):
+            return sum(parallelize(inner)(range(x)).values())
+
+        # every worker is busy with an outer task while inner ones queue
+        result = parallelize(outer)([3, 4, 5, 6])
+        assert result == {3: 6, 4: 10, 5: 15, 6: 21}
+        assert pool.metrics()['completed'] == 4 + 3 + 4 + 5 + 6
+    finally:
+        set_shared_thread_pool(None)
+        pool.shutdown()
+
+
+def test_parallelize_without_shared_thread_pool():
+    result = parallelize(lambda x: x * 2, workers=2)([1, 2, [3]])
+    assert result == {1: 2, 2: 4, '[3]': [3, 3]}
@@ -0,0 +1,91 @@
+import socket
+import urllib.request
+
+from pylivetrader.misc import tracing
+from pylivetrader.misc.tracing import (
+    HistogramSink,
+    PrometheusSink,
+    StatsdSink,
+    Tracer,
+    make_sink,
+    set_tracer,
+    span,
+)
+
+
+def test_span_disabled():
+    set_tracer(None)
+    assert span('order') is span('order.submit')
+    with span('order'):
+        pass
+
+
+def test_histogram_sink():
+    sink = HistogramSink(buckets=(0.01, 0.1, float('inf')))
+    set_tracer(Tracer([sink]))
+    try:
+        with span('order'):
+            pass
+        for seconds in (0.05, 0.05, 0.5):
+            sink.record('order.submit', seconds)
+    finally:
+        set_tracer(None)
+
+    counts, total, count = sink.histograms()['order.submit']
+    assert counts == [0, 2, 1]
+    assert count == 3
+    assert abs(total - 0.6) < 1e-9
+    assert sink.histograms()['order'][0] == [1, 0, 0]
+
+    summary = sink.summary(reset=True)
+    assert summary['order.submit']['count'] == 3
+    assert summary['order.submit']['p50'] == 0.05
+    assert summary['order.submit']['max'] == 0.5
+    # the histograms are kept across summaries
+    assert sink.summary() == {}
+    assert sink.histograms()['order.submit'][2] == 3
+
+
+def test_statsd_sink():
+    server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    server.bind(('127.0.0.1', 0))
+    server.settimeout(5)
+    try:
+        sink = make_sink('statsd://127.0.0.1:{}'.format(
+            server.getsockname()[1]))
+        assert isinstance(sink, StatsdSink)
+        sink.record('order.submit', 0.0125)
+        assert server.recv(1024) == b'pylivetrader.order.submit:12.500|ms'
+        sink.close()
+    finally:
+        server.close()
+
+
+def test_prometheus_sink():
+    sink = make_sink('prometheus://127.0.0.1:0')
+    assert isinstance(sink, PrometheusSink)
+    try:
+        sink.record('order.submit', 0.003)
+        body = urllib.request.urlopen(
+            'http://127.0.0.1:{}/metrics'.format(sink.port)).read().decode()
+    finally:
+        sink.close()
+
+    lines = body.splitlines()
+    assert '# TYPE pylivetrader_span_seconds histogram' in lines
+    assert ('pylivetrader_span_seconds_bucket'
+            '{span="order.submit",le="0.0025"} 0') in lines
+    assert ('pylivetrader_span_seconds_bucket'
+            '{span="order.submit",le="0.005"} 1') in lines
+    assert ('pylivetrader_span_seconds_bucket'
+            '{span="order.submit",le="+Inf"} 1') in lines
+    assert 'pylivetrader_span_seconds_count{span="order.submit"} 1' in lines
+
+
+def test_log_summary():
+    sink = HistogramSink()
+    tracer = Tracer([sink, StatsdSink(port=9)])
+    tracer.record('order', 0.001)
+    tracer.log_summary()
+    assert sink.summary() == {}
+    assert tracing.get_tracer() is tracing.NULL_TRACER
@@ -0,0 +1,326 @@
+import pickle
+import threading
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pylivetrader.statestore import CHECKSUM_KEY, FileStore, StateStore
+from pylivetrader.statestore.serializers import PickleSerializer
+
+
+class CountingFileStore(FileStore):
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.snapshots = 0
+        self.deltas = []
+
+    def write_snapshot(self, data):
+        self.snapshots += 1
+        super().write_snapshot(data)
+
+    def save_delta(self, changed, deleted):
+        self.deltas.append((sorted(changed), deleted))
+        super().save_delta(changed, deleted)
+
+
+def restore(path, checksum='algo'):
+    context = SimpleNamespace()
+    StateStore(path).load(context, checksum)
+    return context
+
+
+def test_statestore_delta(tmpdir):
+    path = str(tmpdir.join('algo-state.pkl'))
+    engine = CountingFileStore(path)
+    store = StateStore(storage_engine=engine)
+
+    context = SimpleNamespace(
+        prices=pd.DataFrame(np.random.randn(1000, 10)),
+        counter=0,
+        note='x',
+        excluded=1,
+    )
+    store.save(context, 'algo', ['excluded'])
+    assert engine.snapshots == 1
+
+    # unchanged fields are not written again
+    context.counter += 1
+    store.save(context, 'algo', ['excluded'])
+    store.save(context, 'algo', ['excluded'])
+    del context.note
+    context.added = [1, 2]
+    store.save(context, 'algo', ['excluded'])
+    assert engine.snapshots == 1
+    assert engine.deltas == [
+        (['counter'], []),
+        (['added'], ['note']),
+    ]
+
+    restored = restore(path)
+    assert restored.counter == 1
+    assert restored.added == [1, 2]
+    assert not hasattr(restored, 'note')
+    assert not hasattr(restored, 'excluded')
+    pd.testing.assert_frame_equal(restored.prices, context.prices)
+
+    # once the journal outgrows the snapshot, it is compacted
+    context.prices.iloc[0, 0] = 1.
+    store.save(context, 'algo', ['excluded'])
+    assert engine.snapshots == 1
+    context.prices.iloc[0, 0] = 2.
+    store.save(context, 'algo', ['excluded'])
+    assert engine.snapshots == 2
+    with open(engine.journal_path, 'rb') as f:
+        pickle.load(f)
+        with pytest.raises(EOFError):
+            pickle.load(f)
+    assert restore(path).prices.iloc[0, 0] == 2.
+
+    with pytest.raises(ValueError):
+        restore(path, checksum='other')
+
+
+def test_statestore_journal_recovery(tmpdir):
+    path = str(tmpdir.join('algo-state.pkl'))
+    store = StateStore(path)
+    context = SimpleNamespace(a=1, b=2)
+    store.save(context, 'algo', [])
+    context.a = 10
+    store.save(context, 'algo', [])
+    context.b = 20
+    store.save(context, 'algo', [])
+
+    # a record torn by a crash is dropped
+    with open(path + '.journal', 'r+b') as f:
+        f.truncate(f.seek(0, 2) - 3)
+    restored = restore(path)
+    assert (restored.a, restored.b) == (10, 2)
+
+    # a journal from before the last snapshot is ignored
+    with open(path + '.journal', 'rb') as f:
+        journal = f.read()
+    store.save(SimpleNamespace(a=1, b=2), 'algo', [])
+    StateStore(path).save(SimpleNamespace(a=3, b=4), 'algo', [])
+    with open(path + '.journal', 'wb') as f:
+        f.write(journal)
+    restored = restore(path)
+    assert (restored.a, restored.b) == (3, 4)
+
+
+def test_statestore_legacy_file(tmpdir):
+    # state files written before the journal existed still load
+    path = str(tmpdir.join('algo-state.pkl'))
+    with open(path, 'wb') as f:
+        pickle.dump({'a': 1, CHECKSUM_KEY: 'algo'}, f)
+    assert restore(path).a == 1
+
+
+class BlockingFileStore(CountingFileStore):
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.unblocked = threading.Event()
+
+    def write_snapshot(self, data):
+        self.unblocked.wait(5)
+        super().write_snapshot(data)
+
+    def save_delta(self, changed, deleted):
+        self.unblocked.wait(5)
+        super().save_delta(changed, deleted)
+
+
+def test_statestore_write_behind(tmpdir):
+    path = str(tmpdir.join('algo-state.pkl'))
+    engine = BlockingFileStore(path)
+    store = StateStore(storage_engine=engine, write_behind=True)
+    try:
+        context = SimpleNamespace(counter=0)
+        store.save(context, 'algo', [])
+        assert store.wait_serialized(timeout=5)
+        # the write is stuck, but the context can be used again
+        assert not store.flush(timeout=0.05)
+        assert store.metrics()['lag'] > 0
+
+        # snapshots queued behind it collapse into the latest
+        for i in range(1, 4):
+            context = SimpleNamespace(counter=i)
+            store.save(context, 'algo', [])
+        engine.unblocked.set()
+        assert store.flush(timeout=5)
+
+        metrics = store.metrics()
+        assert metrics['saves'] == 4
+        assert metrics['coalesced'] == 2
+        assert metrics['persisted'] == 2
+        assert metrics['lag'] == 0.
+        assert metrics['last_lag'] > 0
+        assert engine.snapshots == 1
+        assert engine.deltas == [(['counter'], [])]
+    finally:
+        store.close()
+    assert restore(path).counter == 3
+
+    with pytest.raises(ValueError):
+        StateStore(storage_engine=SimpleNamespace(save=None),
+                   write_behind=True)
+
+
+@pytest.mark.parametrize('compression', [None, 'zstd', 'lz4'])
+def test_statestore_serializer(tmpdir, compression):
+    if compression == 'zstd':
+        pytest.importorskip('zstandard')
+    elif compression == 'lz4':
+        pytest.importorskip('lz4.frame')
+
+    path = str(tmpdir.join('algo-state.pkl'))
+    serializer = PickleSerializer(compression=compression)
+    store = StateStore(storage_engine=FileStore(path, serializer=serializer))
+    context = SimpleNamespace(
+        prices=pd.DataFrame(np.arange(20000.).reshape(2000, 10)),
+        weights=np.ones(100),
+    )
+    store.save(context, 'algo', [])
+    context.weights = context.weights * 2
+    store.save(context, 'algo', [])
+
+    context = SimpleNamespace()
+    StateStore(storage_engine=FileStore(path, serializer=serializer)).load(
+        context, 'algo')
+    assert context.prices.values.sum() == np.arange(20000.).sum()
+    assert (context.weights == 2.).all()
+    # restored arrays can be modified in place
+    context.weights[0] = 0.
+
+    with pytest.raises(ValueError):
+        PickleSerializer(compression='brotli')
+
+
+def test_filestore_atomic(tmpdir, monkeypatch):
+    path = str(tmpdir.join('algo-state.pkl'))
+    store = FileStore(path)
+    store.save({'a': 1, CHECKSUM_KEY: 'algo'})
+
+    # a crash mid-write leaves the previous state in place
+    def crash(*args):
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr('os.fsync', crash)
+    with pytest.raises(KeyboardInterrupt):
+        store.save({'a': 2, CHECKSUM_KEY: 'algo'})
+    monkeypatch.undo()
+
+    assert store.load()['a'] == 1
+    assert sorted(p.basename for p in tmpdir.listdir()) == [
+        'algo-state.pkl', 'algo-state.pkl.journal']
+
+
+def test_filestore_mmap_arrays(tmpdir):
+    path = str(tmpdir.join('algo-state.pkl'))
+    engine = FileStore(path, mmap_threshold=1024)
+    store = StateStore(storage_engine=engine)
+    context = SimpleNamespace(
+        prices=pd.DataFrame(
+            np.random.randn(500, 4), columns=list('abcd'),
+            index=pd.date_range('2021-03-01', periods=500, freq='min')),
+        weights=np.arange(1000.),
+        small=np.arange(3.),
+        mixed=pd.DataFrame({'a': np.arange(500.), 'b': 'x'}),
+    )
+    store.save(context, 'algo', [])
+    context.weights = context.weights + 1
+    store.save(context, 'algo', [])
+
+    files = tmpdir.join('algo-state.pkl.arrays').listdir()
+    names = sorted(p.basename.split('-')[0] for p in files)
+    assert names == ['prices', 'weights', 'weights']
+
+    restored = restore(path)
+    assert isinstance(restored.weights, np.memmap)
+    assert restored.weights[0] == 1.
+    pd.testing.assert_frame_equal(restored.prices, context.prices)
+    assert not restored.prices.values.flags['OWNDATA']
+    assert isinstance(restored.small, np.ndarray)
+    pd.testing.assert_frame_equal(restored.mixed, context.mixed)
+
+    # copy-on-write: changes are not written through to the file
+    restored.weights[0] = -1.
+    assert restore(path).weights[0] == 1.
+
+    # a restart doesn't rewrite the arrays; compaction drops old files
+    store = StateStore(storage_engine=engine)
+    store.save(restored, 'algo', [])
+    files = tmpdir.join('algo-state.pkl.arrays').listdir()
+    assert len(files) == 2
+
+
+def test_filestore_mmap_arrays_collected(tmpdir):
+    path = str(tmpdir.join('algo-state.pkl'))
+    store = StateStore(storage_engine=FileStore(path, mmap_threshold=1024))
+    context = SimpleNamespace(weights=np.zeros(100000),
+                              symbols=['S{}'.format(i) for i in range(5000)])
+    for i in range(50):
+        context.weights = context.weights + 1
+        store.save(context, 'algo', [])
+
+    # the files of the superseded arrays are collected as they pile up
+    assert len(tmpdir.join('algo-state.pkl.arrays').listdir()) <= 3
+    assert restore(path).weights[0] == 50.
+
+
+def test_redisstore():
+    fakeredis = pytest.importorskip('fakeredis')
+    from pylivetrader.errors import StateStoreFenced
+    from pylivetrader.statestore import RedisStore
+
+    server = fakeredis.FakeServer()
+
+    def make_store(algoname='algo', fencing=False):
+        return RedisStore(
+            algoname, client=fakeredis.FakeStrictRedis(server=server),
+            fencing=fencing)
+
+    engine = make_store()
+    store = StateStore(storage_engine=engine)
+    context = SimpleNamespace(a=1, b=[1, 2], c='x')
+    store.save(context, 'algo', [])
+    assert engine.redis.hkeys(engine.fields_key)
+
+    # only the dirty fields are written
+    context.a = 2
+    del context.c
+    with patch.object(engine, '_write', wraps=engine._write) as write:
+        store.save(context, 'algo', [])
+        store.save(context, 'algo', [])
+    assert write.call_count == 1
+    assert sorted(engine.redis.hkeys(engine.fields_key)) == sorted([
+        b'a', b'b', CHECKSUM_KEY.encode()])
+
+    restored = SimpleNamespace()
+    StateStore(storage_engine=make_store()).load(restored, 'algo')
+    assert vars(restored) == {'a': 2, 'b': [1, 2]}
+
+    # other algorithms don't see it
+    assert not make_store('other').can_load()
+
+    # with fencing, the replica started last is the only writer
+    first = StateStore(storage_engine=make_store(fencing=True))
+    first.save(context, 'algo', [])
+    second = StateStore(storage_engine=make_store(fencing=True))
+    second.save(context, 'algo', [])
+    context.a = 3
+    with pytest.raises(StateStoreFenced):
+        first.save(context, 'algo', [])
+    second.save(context, 'algo', [])
+
+    # the single key of previous versions
+    engine = make_store('legacy')
+    engine.redis.set(RedisStore.REDIS_STATE_KEY,
+                     pickle.dumps({'a': 5, CHECKSUM_KEY: 'algo'}))
+    restored = SimpleNamespace()
+    StateStore(storage_engine=engine).load(restored, 'algo')
+    assert vars(restored) == {'a': 5}
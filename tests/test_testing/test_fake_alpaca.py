@@ -0,0 +1,123 @@
+import asyncio
+import json
+import time
+
+import pandas as pd
+import pytest
+import requests
+import websockets
+
+from pylivetrader.backend import alpaca
+from pylivetrader.backend.alpaca_stream import MarketDataStream
+from pylivetrader.data.bar_store import StreamingBarStore
+from pylivetrader.finance.execution import MarketOrder
+from pylivetrader.testing.fake_alpaca import FakeAlpacaServer
+
+
+@pytest.fixture
+def server(monkeypatch):
+    server = FakeAlpacaServer(symbols=300, fill_delay=0.01,
+                              stream_interval=0.01).start()
+    for key, value in server.environ().items():
+        monkeypatch.setenv(key, value)
+    yield server
+    server.stop()
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition():
+        if time.time() > deadline:
+            raise AssertionError('timed out')
+        time.sleep(0.01)
+
+
+def test_market_data(server):
+    backend = alpaca.Backend('key-id', 'secret-key', server.url)
+    assets = backend.get_equities()
+    assert len(assets) == 300
+
+    # 250 symbols take 2 requests of 199, paged by 1000 bars
+    end = pd.Timestamp('2021-03-09 15:00', tz='UTC')
+    df = backend._fetch_bars_from_api(
+        [a.symbol for a in assets[:250]], 'minute', to=end, limit=30)
+    assert df.shape == (30, 250 * 7)
+    # the bar starting at `end` is included, labeled by its end
+    assert df.index[-1] == end + pd.Timedelta('1min')
+    assert df['S0001']['close'].iloc[-1] == pytest.approx(
+        server._price('S0001', end.value))
+    stats = server.call(server.stats)
+    assert stats['requests']['GET /v2/stocks/bars'] == 8
+
+    daily = backend._fetch_bars_from_api(['S0002'], 'day', to=end, limit=5)
+    assert len(daily) == 5
+    assert backend._get_spot_trade(['S0003'], 'price')[0] > 0
+
+
+def test_orders_and_trade_updates(server, monkeypatch):
+    backend = alpaca.Backend('key-id', 'secret-key', server.url)
+    asset, = backend._symbols2assets(['S0005'])
+    monkeypatch.setattr(alpaca, 'symbol_lookup', lambda symbol: asset)
+    loop = asyncio.new_event_loop()
+
+    async def trade_updates():
+        ws = await websockets.connect(server.url.replace('http', 'ws') +
+                                      '/stream/', loop=loop)
+        await ws.send(json.dumps({'action': 'authenticate', 'data': {
+            'key_id': 'key-id', 'secret_key': 'secret-key'}}))
+        assert json.loads(await ws.recv())['data']['status'] == 'authorized'
+        await ws.send(json.dumps({'action': 'listen', 'data': {
+            'streams': ['trade_updates']}}))
+        await ws.recv()
+
+        order = backend.order(asset, 10, MarketOrder())
+        assert order.amount == 10
+
+        events = [json.loads(await ws.recv())['data'] for _ in range(2)]
+        await ws.close()
+        return order, events
+
+    order, events = loop.run_until_complete(trade_updates())
+    loop.close()
+    assert [e['event'] for e in events] == ['new', 'fill']
+    assert events[1]['order']['client_order_id'] == order.id
+    assert events[1]['position_qty'] == '10'
+
+    position, = backend._api.list_positions()
+    assert (position.symbol, position.qty) == ('S0005', '10')
+    account = backend._api.get_account()
+    assert float(account.cash) == pytest.approx(
+        1e6 - 10 * float(events[1]['price']))
+    assert backend._position_amount('S0006') == 0
+
+
+def test_rate_limit():
+    server = FakeAlpacaServer(symbols=1, rate_limit=2).start()
+    try:
+        statuses = [requests.get(server.url + '/v2/account').status_code
+                    for _ in range(3)]
+        resp = requests.get(server.url + '/v2/account')
+        assert statuses == [200, 200, 429]
+        assert resp.headers['Retry-After'] == '30'
+        # the data API has its own limit
+        assert requests.get(server.url + '/v2/stocks/trades/latest',
+                            params={'symbols': 'S0000'}).status_code == 200
+        assert server.call(server.stats)['rate_limited'] == {
+            'GET /v2/account': 2}
+    finally:
+        server.stop()
+
+
+def test_data_stream(server):
+    backend = alpaca.Backend('key-id', 'secret-key', server.url)
+    store = StreamingBarStore(backend._cal)
+    stream = MarketDataStream(store, 'key-id', 'secret-key',
+                              stream_url=server.url)
+    stream.start()
+    try:
+        stream.subscribe(['S0007'])
+        wait_for(lambda: store.last_trade('S0007') is not None)
+        assert store.last_trade('S0007').price == pytest.approx(
+            server._price('S0007'), rel=1e-3)
+    finally:
+        stream.stop()
@@ -0,0 +1,112 @@
+import numpy as np
+import pandas as pd
+from trading_calendars import get_calendar
+
+from pylivetrader.api import date_rules, time_rules
+from pylivetrader.testing.replay import (
+    ReplayClock, ReplayData, load_bars, run_replay,
+)
+from pylivetrader.executor.realtimeclock import (
+    BAR, SESSION_START, SESSION_END, BEFORE_TRADING_START_BAR,
+)
+
+
+def make_bars(start, end, price):
+    '''Minute bars labeled by their start, at `price` plus the session
+    number, and 1 higher in the last half hour.'''
+    cal = get_calendar('NYSE')
+    sessions = cal.sessions_in_range(pd.Timestamp(start, tz='UTC'),
+                                     pd.Timestamp(end, tz='UTC'))
+    frames = []
+    for i, session in enumerate(sessions):
+        minutes = cal.minutes_for_session(session) - pd.Timedelta('1min')
+        close = np.full(len(minutes), price + i, dtype=float)
+        close[-30:] += 1
+        frames.append(pd.DataFrame({
+            'open': close, 'high': close + 0.5, 'low': close - 0.5,
+            'close': close, 'volume': 100,
+        }, index=minutes.tz_localize(None)))
+    df = pd.concat(frames)
+    df.index.name = 'timestamp'
+    return df
+
+
+def test_replay_clock():
+    clock = ReplayClock('2021-03-08', '2021-03-09', minute_emission=False)
+    events = list(clock)
+    bars = [dt for dt, action in events if action == BAR]
+
+    assert events[0] == (pd.Timestamp('2021-03-08', tz='UTC'), SESSION_START)
+    assert events[1] == (pd.Timestamp('2021-03-08 13:45', tz='UTC'),
+                         BEFORE_TRADING_START_BAR)
+    assert bars[0] == pd.Timestamp('2021-03-08 14:31', tz='UTC')
+    assert events[-1] == (pd.Timestamp('2021-03-09 21:00', tz='UTC'),
+                          SESSION_END)
+    assert len(bars) == clock.bars == 2 * 389
+    assert list(clock.session_minutes(pd.Timestamp(
+        '2021-03-09', tz='UTC'))) == bars[389:]
+
+
+def test_replay_data(tmpdir):
+    make_bars('2021-03-08', '2021-03-09', 100).to_csv(
+        str(tmpdir.join('AAA.csv')))
+    data = ReplayData(load_bars(str(tmpdir)))
+    asset, = data.get_equities()
+    assert asset.symbol == 'AAA'
+
+    # the 14:30 bar is known at 14:31
+    now = pd.Timestamp('2021-03-09 14:31', tz='UTC')
+    assert data.get_spot_value(asset, 'price', now) == 101
+    assert data.get_last_traded_dt(asset, now) == now
+    assert np.isnan(data.get_spot_value(
+        asset, 'price', pd.Timestamp('2021-03-08 14:30', tz='UTC')))
+
+    bars = data.get_bars([asset], '1m', 3, now)[asset]
+    assert list(bars.close) == [101, 101, 101]
+    assert bars.index[-1] == now
+
+    # today's daily bar only has the minutes so far
+    daily = data.get_bars([asset], '1d', 5, now)[asset]
+    assert len(daily) == 2
+    assert daily.high.iloc[0] == 101.5
+    assert daily.close.iloc[0] == 101
+    assert daily.volume.iloc[-1] == 100
+
+
+def test_run_replay(tmpdir):
+    make_bars('2021-03-01', '2021-03-05', 100).to_csv(
+        str(tmpdir.join('AAA.csv')))
+    make_bars('2021-03-01', '2021-03-05', 50).to_csv(
+        str(tmpdir.join('BBB.csv')))
+
+    class algo:
+
+        def initialize(context):
+            context.schedule_function(
+                algo.rebalance,
+                date_rules.every_day(),
+                time_rules.market_open(minutes=1),
+            )
+
+        def rebalance(context, data):
+            context.order_target(context.symbol('AAA'), 100)
+            # limit below the day's prices, never fills
+            context.order(context.symbol('BBB'), 10, limit_price=1)
+
+    result = run_replay(algo, str(tmpdir), '2021-03-01', '2021-03-05',
+                        capital=100000)
+
+    stats = result.stats()
+    assert stats['sessions'] == 5
+    assert stats['bars'] == 5 * 389
+    assert stats['orders'] == 6
+    # the market order fills at the first session's open price
+    assert stats['fills'] == 1
+    daily = result.daily
+    assert daily['cash'].iloc[0] == 100000 - 100 * 100
+    # marked to the close, 1 higher in the last half hour
+    assert list(daily['portfolio_value']) == [
+        90000 + 100 * (101 + i) for i in range(5)]
+    assert stats['total_return'] == daily['portfolio_value'].iloc[-1] / \
+        100000 - 1
+    assert 'sharpe' in result.report()
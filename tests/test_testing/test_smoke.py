@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+
+from pylivetrader.testing.smoke.backend import FakeDataBackend
+
+
+class Clock:
+
+    now = pd.Timestamp('2021-03-09 10:00', tz='America/New_York')
+    end_time = pd.Timestamp('2021-03-09 21:00', tz='UTC')
+
+
+def test_fake_data_sin_wave():
+    data = FakeDataBackend(size=3, clock=Clock())
+    asset = data.get_equities()[1]
+
+    bars = data.get_bars([asset], '1m', 2)[asset]
+    assert list(bars.index) == [
+        pd.Timestamp('2021-03-09 09:59', tz='America/New_York'),
+        Clock.now,
+    ]
+    # same as the per asset frames generated before
+    n = len(data._fake_bars['1m'][1])
+    stop = data._fake_bars['1m'][1].get_loc(Clock.now) + 1
+    ts = np.abs(np.sin(np.linspace(0, n, n)[stop - 2:stop])) + 1
+    np.testing.assert_allclose(bars.open, ts * 2)
+    np.testing.assert_allclose(bars.high, ts * 2 + 0.5)
+    np.testing.assert_allclose(bars.close, ts * 2 + 0.1)
+    assert data.get_spot_value(asset, 'price', None, '1m') == \
+        bars.close.iloc[-1]
+
+
+def test_fake_data_seeded(tmpdir):
+    data = FakeDataBackend(size=20, clock=Clock(), seed=42,
+                           mmap_dir=str(tmpdir))
+    assets = data.get_equities()
+
+    index, values = data.bars_view(assets[5:15], '1m', 100)
+    assert values.shape == (10, 100, 5)
+    assert index[-1] == Clock.now
+    assert (values[:, :, 1] >= values[:, :, 3]).all()
+    assert (values[:, :, 2] <= values[:, :, 3]).all()
+
+    bars = data._fake_bars['1m'][2]
+    assert isinstance(bars, np.memmap)
+    assert tmpdir.join('1m.npy').check()
+    assert np.shares_memory(values, bars)
+    frame = data.get_bars([assets[0]], '1m', 100)
+    assert np.shares_memory(frame.values, bars)
+    spot = data.get_spot_value(assets[:5], 'close', None, '1m')
+    assert np.shares_memory(spot, bars)
+
+    other = FakeDataBackend(size=20, clock=Clock(), seed=42)
+    np.testing.assert_array_equal(
+        other.bars_view(assets[5:15], '1m', 100)[1], values)
+    # non consecutive assets are gathered by index
+    np.testing.assert_array_equal(
+        other.get_spot_value(assets[::2], 'price', None, '1m'),
+        [data.get_spot_value(a, 'price', None, '1m') for a in assets[::2]])
+
+
+def test_fake_data_spot_value_before_first_bar():
+    class Early(Clock):
+        now = pd.Timestamp('2000-01-03 10:00', tz='America/New_York')
+
+    data = FakeDataBackend(size=3, clock=Early())
+    assets = data.get_equities()
+    assert np.isnan(data.get_spot_value(assets[0], 'price', None, '1m'))
+    assert np.isnan(
+        data.get_spot_value(assets, 'close', None, '1m')).all()
+    assert data.get_spot_value(
+        assets[0], 'last_traded', None, '1m') is pd.NaT